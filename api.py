@@ -1,39 +1,45 @@
 from flask import Blueprint, jsonify, request, current_app
 from flask_login import current_user, login_required
 from models import Pilgrimage, Review, TravelTip, User, SavedPilgrimage, TripPlan
-from extensions import db, cache
-import requests
+from extensions import db, cache, weather
+from db_routing import read_only
+from http_cache import conditional, catalog_state, pilgrimage_state, api_pilgrimage_state, tips_state
+from listings import paginate_pilgrimages, listing_query, to_rows
+from pagination import Keyset, keyset_paginate
+from search import apply_search
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 import json
 
 api_bp = Blueprint('api', __name__)
 
+REVIEW_KEYSET = Keyset(Review.created_at, Review.id, descending=True)
+
 @api_bp.route('/pilgrimages')
-@cache.cached(timeout=300)  # Cache for 5 minutes
+@read_only
+@conditional(catalog_state)
+@cache.cached(timeout=300)  # Cache for 5 minutes, keyed on the query string
 def get_pilgrimages():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    pilgrimages = Pilgrimage.query.paginate(page=page, per_page=per_page)
+    pilgrimages = paginate_pilgrimages(page=page, per_page=per_page, cursor=request.args.get('cursor'),
+                                       error_out=False)
     
     result = {
-        'items': [{
-            'id': p.id,
-            'name': p.name,
-            'location': p.location,
-            'image_url': p.image_url,
-            'price': p.price,
-            'average_rating': p.average_rating,
-            'reviews_count': p.reviews.count()
-        } for p in pilgrimages.items],
+        'items': [p.to_dict() for p in pilgrimages.items],
         'total': pilgrimages.total,
         'pages': pilgrimages.pages,
-        'current_page': pilgrimages.page
+        'current_page': pilgrimages.page,
+        'next_cursor': pilgrimages.next_cursor,
+        'prev_cursor': pilgrimages.prev_cursor
     }
     
     return jsonify(result)
 
 @api_bp.route('/pilgrimages/<int:id>')
+@read_only
+@conditional(api_pilgrimage_state)
 def get_pilgrimage(id):
     pilgrimage = Pilgrimage.query.get_or_404(id)
     
@@ -64,9 +70,8 @@ def get_pilgrimage(id):
         'longitude': pilgrimage.longitude,
         'price': pilgrimage.price,
         'difficulty_level': pilgrimage.difficulty_level,
-        'virtual_tour_url': pilgrimage.virtual_tour_url,
         'average_rating': pilgrimage.average_rating,
-        'reviews_count': pilgrimage.reviews.count(),
+        'reviews_count': pilgrimage.reviews_count,
         'weather': weather_data,
         'is_saved': is_saved
     }
@@ -74,16 +79,22 @@ def get_pilgrimage(id):
     return jsonify(result)
 
 @api_bp.route('/pilgrimages/<int:id>/reviews')
+@read_only
+@conditional(pilgrimage_state)  # review changes bump Pilgrimage.updated_at
+@cache.cached(timeout=300, tags=lambda id: [f'reviews:{id}'])
 def get_pilgrimage_reviews(id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 5, type=int)
     
-    reviews = Review.query.filter_by(pilgrimage_id=id).order_by(Review.created_at.desc())
-    pagination = reviews.paginate(page, per_page, error_out=False)
-    
-    reviews = Review.query.filter_by(pilgrimage_id=id).order_by(
-        Review.created_at.desc()
-    ).paginate(page=page, per_page=per_page)
+    # Newest first along ix_review_pilgrimage_created; the total is the denormalized review count
+    reviews = keyset_paginate(
+        Review.query.filter_by(pilgrimage_id=id).options(joinedload(Review.author)),
+        REVIEW_KEYSET,
+        cursor=request.args.get('cursor'),
+        page=page,
+        per_page=per_page,
+        total=db.session.query(Pilgrimage.rating_count).filter_by(id=id).scalar() or 0
+    )
     
     result = {
         'items': [{
@@ -101,12 +112,17 @@ def get_pilgrimage_reviews(id):
         } for r in reviews.items],
         'total': reviews.total,
         'pages': reviews.pages,
-        'current_page': reviews.page
+        'current_page': reviews.page,
+        'next_cursor': reviews.next_cursor,
+        'prev_cursor': reviews.prev_cursor
     }
     
     return jsonify(result)
 
 @api_bp.route('/pilgrimages/<int:id>/tips')
+@read_only
+@conditional(tips_state)
+@cache.cached(timeout=3600, tags=lambda id: [f'tips:{id}'])
 def get_pilgrimage_tips(id):
     tips = TravelTip.query.filter_by(pilgrimage_id=id).all()
     
@@ -121,6 +137,8 @@ def get_pilgrimage_tips(id):
     return jsonify(result)
 
 @api_bp.route('/pilgrimages/search')
+@read_only
+@cache.cached(timeout=300)
 def search_pilgrimages():
     query = request.args.get('q', '')
     location = request.args.get('location', '')
@@ -129,14 +147,11 @@ def search_pilgrimages():
     difficulty = request.args.get('difficulty', '')
     
     # Start with base query
-    pilgrimages_query = Pilgrimage.query
+    pilgrimages_query = listing_query()
     
     # Apply filters
     if query:
-        pilgrimages_query = pilgrimages_query.filter(
-            Pilgrimage.name.ilike(f'%{query}%') | 
-            Pilgrimage.description.ilike(f'%{query}%')
-        )
+        pilgrimages_query = apply_search(pilgrimages_query, query, columns=('name', 'description'))
     
     if location:
         pilgrimages_query = pilgrimages_query.filter(
@@ -154,17 +169,9 @@ def search_pilgrimages():
         )
     
     # Execute query
-    pilgrimages = pilgrimages_query.all()
+    pilgrimages = to_rows(pilgrimages_query.all())
     
-    result = [{
-        'id': p.id,
-        'name': p.name,
-        'location': p.location,
-        'image_url': p.image_url,
-        'price': p.price,
-        'average_rating': p.average_rating,
-        'reviews_count': p.reviews.count()
-    } for p in pilgrimages]
+    result = [p.to_dict() for p in pilgrimages]
     
     return jsonify(result)
 
@@ -244,24 +251,5 @@ def get_upcoming_trips():
     return jsonify(result)
 
 def get_weather(lat, lon):
-    """Get current weather data for a location"""
-    api_key = current_app.config['OPENWEATHER_API_KEY']
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-    
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'temperature': data['main']['temp'],
-                'feels_like': data['main']['feels_like'],
-                'description': data['weather'][0]['description'],
-                'icon': data['weather'][0]['icon'],
-                'humidity': data['main']['humidity'],
-                'wind_speed': data['wind']['speed']
-            }
-    except Exception as e:
-        print(f"Error fetching weather data: {e}")
-    
-    return None
-
+    """Get current weather data for a location (cached, never blocks on a warm cache)"""
+    return weather.get(lat, lon)
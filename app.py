@@ -1,7 +1,9 @@
 from flask import Flask
 import os
 from config import Config
-from extensions import db, migrate, login_manager, mail, csrf
+from extensions import db, migrate, login_manager, mail, csrf, weather, cache
+from db_engine import configure_engine_options, init_engines
+from db_routing import init_routing
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -12,11 +14,16 @@ def create_app(config_class=Config):
     os.makedirs(upload_folder, exist_ok=True)
 
     # Initialize extensions
+    configure_engine_options(app)
     db.init_app(app)
+    init_engines(app)
+    init_routing(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     mail.init_app(app)
     csrf.init_app(app)
+    weather.init_app(app)
+    cache.init_app(app)
     
     # Configure CSRF to exempt certain routes if needed
     csrf.exempt("payment.process_payment")
@@ -31,6 +38,26 @@ def create_app(config_class=Config):
         # Create database tables
         db.create_all()
 
+        # Background delivery of queued emails
+        from mail_queue import mail_queue
+        mail_queue.init_app(app)
+
+        # Batched page-view counters
+        from view_counter import view_counter
+        view_counter.init_app(app)
+
+        # In-process pub/sub for the notification stream
+        from broker import broker
+        broker.init_app(app)
+
+        # In-memory deal catalog, reloaded when deals change
+        from deal_catalog import deal_catalog
+        deal_catalog.init_app(app)
+
+        # Full-text search index (FTS5 on SQLite, ILIKE fallback elsewhere)
+        from search import ensure_search_index
+        ensure_search_index()
+
         @login_manager.user_loader
         def load_user(user_id):
             return User.query.get(int(user_id))
@@ -46,12 +73,20 @@ def create_app(config_class=Config):
         from payment import payment_bp
         from trip_management import trip_bp
         from trip_planner import trip_planner_bp
+        from notification_routes import notifications_bp
+        from api import api_bp
 
         app.register_blueprint(main)
         app.register_blueprint(auth)
         app.register_blueprint(payment_bp)
         app.register_blueprint(trip_bp)
         app.register_blueprint(trip_planner_bp)
+        app.register_blueprint(notifications_bp)
+        app.register_blueprint(api_bp, url_prefix='/api')
+
+        # ETag/Last-Modified validators live on the views; this adds Cache-Control
+        from http_cache import init_http_cache
+        init_http_cache(app)
 
     return app
 
@@ -0,0 +1,112 @@
+"""In-process publish/subscribe for server-push endpoints.
+
+LocalBroker fans events out to the subscribers of a channel inside one
+process. It is the stand-in used for development and single-process
+deployments; a networked broker only needs the same publish()/subscribe()
+pair. Subscribers wait on stdlib queues, which gevent's (or eventlet's)
+monkey patching turns into cooperative waits, so under such a worker an
+idle stream costs a greenlet rather than a worker thread.
+cooperative_waits() tells whether that is the case in this process.
+"""
+import queue
+import threading
+
+def cooperative_waits():
+    """True when blocking queue waits yield to other requests (gevent or eventlet monkey patching)"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return True
+    except ImportError:
+        pass
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return True
+    except ImportError:
+        pass
+    return False
+
+class Subscription:
+    """One subscriber's bounded event queue; use as a context manager to unsubscribe"""
+
+    def __init__(self, broker, channel, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_pending)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # A consumer this far behind must resync from the database
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class LocalBroker:
+    """Channel -> subscribers fan-out within the current process; configure with init_app()"""
+
+    def __init__(self, app=None):
+        self.max_pending = 100
+        self._channels = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_pending = app.config.get('BROKER_MAX_PENDING', 100)
+        app.extensions['broker'] = self
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def publish(self, channel, event):
+        """Deliver event to every current subscriber of channel; returns how many received it"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+        return len(subscribers)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+broker = LocalBroker()
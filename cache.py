@@ -0,0 +1,279 @@
+"""Response cache for the JSON API.
+
+`@cache.cached(timeout, tags=...)` stores a view's response under a key
+built from the path and the sorted query string, so ?page=2 and ?page=1 are
+separate entries. Entries record the version of each tag they depend on.
+When a Pilgrimage, Review or TravelTip row is committed, the matching tags
+are bumped, and entries stamped with an older version count as misses.
+Nothing has to enumerate or delete keys to invalidate them.
+
+Views behind @conditional (http_cache.py) also stamp entries with the
+request's ETag, computed from the database. An entry stored under another
+ETag is a miss, so a write committed by a different process is never
+answered with an older body.
+
+Backends are chosen with CACHE_BACKEND:
+- 'lru': a bounded in-process LRU. Each worker process has its own copy, and
+  another process's writes only show up once an entry times out.
+- 'redis': any Redis-compatible server at CACHE_REDIS_URL. The cache and the
+  tag versions are shared by every process. Requires the redis package.
+
+Hits, misses and stores are counted per endpoint; see Cache.stats(). Cached
+responses carry an X-Cache: HIT or MISS header.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import g, request, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class LRUBackend:
+    """Thread-safe bounded LRU of (value, expires_at) pairs, plus tag versions"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Kept apart from the entries so an eviction never resets a version
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+class RedisBackend:
+    """Entries and tag versions in a Redis-compatible server, shared across processes"""
+
+    def __init__(self, url, prefix='sj-cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND = 'redis' requires the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(timeout), 1))
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        values = self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump_tags(self, tags):
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"{self.prefix}tag:{tag}")
+        pipeline.execute()
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+class _CachedResponse:
+    __slots__ = ('data', 'status', 'mimetype', 'tag_versions', 'validator')
+
+    def __init__(self, data, status, mimetype, tag_versions, validator=None):
+        self.data = data
+        self.status = status
+        self.mimetype = mimetype
+        self.tag_versions = tag_versions
+        self.validator = validator
+
+    def __getstate__(self):
+        return (self.data, self.status, self.mimetype, self.tag_versions, self.validator)
+
+    def __setstate__(self, state):
+        # Entries pickled before validators were stored have no fifth field
+        self.data, self.status, self.mimetype, self.tag_versions, self.validator = (tuple(state) + (None,))[:5]
+
+class Cache:
+    """Pluggable view cache with tag invalidation and hit/miss metrics; configure with init_app()"""
+
+    def __init__(self, app=None):
+        self.backend = LRUBackend()
+        self.default_timeout = 300
+        self.enabled = True
+        self._metrics = {}
+        self._invalidations = 0
+        self._metrics_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        backend = config.get('CACHE_BACKEND', 'lru')
+        if backend == 'lru':
+            self.backend = LRUBackend(config.get('CACHE_MAX_ENTRIES', 2048))
+        elif backend == 'redis':
+            self.backend = RedisBackend(config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+                                        config.get('CACHE_KEY_PREFIX', 'sj-cache:'))
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND {backend!r}; expected 'lru' or 'redis'")
+        self.default_timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        self.enabled = config.get('CACHE_ENABLED', True)
+        self.reset_stats()
+        app.extensions['cache'] = self
+
+    # Keys and tags
+
+    @staticmethod
+    def request_key():
+        """Cache key for the current request: path plus the query string in a stable order"""
+        args = sorted(request.args.items(multi=True))
+        return f"view:{request.path}?{urlencode(args)}" if args else f"view:{request.path}"
+
+    def invalidate(self, *tags):
+        """Expire every entry that depends on any of tags"""
+        tags = sorted(set(tags))
+        if tags:
+            self.backend.bump_tags(tags)
+            with self._metrics_lock:
+                self._invalidations += len(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+    # Views
+
+    def cached(self, timeout=None, tags=None):
+        """Cache a view's successful GET responses.
+
+        tags is a list of tag names, or a callable receiving the view's
+        keyword arguments and returning one. It defaults to ['pilgrimages'],
+        which every catalog or rating change bumps.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method not in ('GET', 'HEAD'):
+                    return view(*args, **kwargs)
+
+                endpoint = request.endpoint or view.__name__
+                view_tags = tags(**kwargs) if callable(tags) else (tags or ['pilgrimages'])
+                view_tags = sorted(set(view_tags))
+                key = self.request_key()
+
+                versions = self.backend.tag_versions(view_tags)
+                # Set by @conditional: the ETag this response will be sent with
+                validator = g.get('http_validator')
+                entry = self.backend.get(key)
+                if entry is not None and entry.tag_versions == versions and entry.validator == validator:
+                    self._count(endpoint, hits=1)
+                    response = make_response(entry.data, entry.status)
+                    response.mimetype = entry.mimetype
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count(endpoint, misses=1)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    # Stamped with the versions read before the view ran, so a
+                    # write that lands meanwhile leaves this entry already stale
+                    self.backend.set(key, _CachedResponse(response.get_data(), response.status_code,
+                                                          response.mimetype, versions, validator),
+                                     timeout if timeout is not None else self.default_timeout)
+                    self._count(endpoint, stores=1)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    # Metrics
+
+    def _count(self, endpoint, **counts):
+        with self._metrics_lock:
+            metrics = self._metrics.setdefault(endpoint, {'hits': 0, 'misses': 0, 'stores': 0})
+            for name, value in counts.items():
+                metrics[name] += value
+
+    def stats(self):
+        """Per-endpoint counters plus totals and the overall hit ratio (this process only)"""
+        with self._metrics_lock:
+            endpoints = {endpoint: dict(metrics) for endpoint, metrics in self._metrics.items()}
+            invalidations = self._invalidations
+        hits = sum(m['hits'] for m in endpoints.values())
+        misses = sum(m['misses'] for m in endpoints.values())
+        return {
+            'endpoints': endpoints,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+            'invalidated_tags': invalidations
+        }
+
+    def reset_stats(self):
+        with self._metrics_lock:
+            self._metrics = {}
+            self._invalidations = 0
+
+# Tag invalidation: collect tags while flushing, bump them once the commit succeeds
+
+def _tags_for(instance):
+    # Imported here: models imports extensions, which imports this module
+    from models import Pilgrimage, Review, TravelTip
+    if isinstance(instance, Pilgrimage):
+        return ['pilgrimages', f'pilgrimage:{instance.id}']
+    if isinstance(instance, Review):
+        # Reviews also move the pilgrimage's rating aggregates shown in listings
+        return ['pilgrimages', f'pilgrimage:{instance.pilgrimage_id}', f'reviews:{instance.pilgrimage_id}']
+    if isinstance(instance, TravelTip):
+        return [f'tips:{instance.pilgrimage_id}']
+    return []
+
+@event.listens_for(Session, 'after_flush')
+def _collect_cache_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        tags.update(_tags_for(instance))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cache_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        from extensions import cache
+        cache.invalidate(*tags)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_cache_tags(session, previous_transaction):
+    session.info.pop('cache_tags', None)
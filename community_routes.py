@@ -1,18 +1,23 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
-from models import ForumCategory, ForumPost, ForumComment, TravelLog, User, Notification
+from models import ForumCategory, ForumPost, ForumComment, TravelLog, User
 from forms import ForumPostForm, ForumCommentForm, TravelLogForm
 from extensions import db
+from notifications import notify
+from pagination import Keyset, keyset_paginate
+from forum import load_forum_index, category_posts, load_thread
+from view_counter import view_counter
 from datetime import datetime
 import json
 
 community_bp = Blueprint('community', __name__)
 
+TRAVEL_LOG_KEYSET = Keyset(TravelLog.created_at, TravelLog.id, descending=True)
+
 # Forum routes
 @community_bp.route('/forum')
 def forum():
-    categories = ForumCategory.query.all()
-    recent_posts = ForumPost.query.order_by(ForumPost.created_at.desc()).limit(5).all()
+    categories, recent_posts = load_forum_index()
     
     return render_template('community/forum.html', 
                           categories=categories, 
@@ -23,9 +28,7 @@ def forum_category(id):
     category = ForumCategory.query.get_or_404(id)
     page = request.args.get('page', 1, type=int)
     
-    posts = ForumPost.query.filter_by(category_id=id).order_by(
-        ForumPost.created_at.desc()
-    ).paginate(page=page, per_page=10)
+    posts = category_posts(category, cursor=request.args.get('cursor'), page=page)
     
     return render_template('community/category.html', 
                           category=category, 
@@ -33,12 +36,12 @@ def forum_category(id):
 
 @community_bp.route('/forum/post/<int:id>', methods=['GET', 'POST'])
 def forum_post(id):
-    post = ForumPost.query.get_or_404(id)
+    post, comments = load_thread(id, cursor=request.args.get('cursor'), page=request.args.get('page', 1, type=int))
     form = ForumCommentForm()
     
-    # Increment view count
-    post.views += 1
-    db.session.commit()
+    # Counted in memory and written in batches, so viewing a thread stays a pure read
+    if request.method == 'GET':
+        view_counter.hit(ForumPost.views, post.id)
     
     if form.validate_on_submit() and current_user.is_authenticated:
         comment = ForumComment(
@@ -50,26 +53,22 @@ def forum_post(id):
         
         # Create notification for post author
         if post.user_id != current_user.id:
-            notification = Notification(
-                user_id=post.user_id,
-                title='New Comment on Your Post',
-                message=f'{current_user.username} commented on your post "{post.title}"',
+            notify(
+                post.user_id,
+                'New Comment on Your Post',
+                f'{current_user.username} commented on your post "{post.title}"',
                 link=url_for('community.forum_post', id=post.id)
             )
-            db.session.add(notification)
         
         db.session.commit()
         flash('Your comment has been added!', 'success')
         return redirect(url_for('community.forum_post', id=post.id))
     
-    # Get comments
-    comments = ForumComment.query.filter_by(post_id=id).order_by(
-        ForumComment.created_at.asc()
-    ).all()
-    
     return render_template('community/post.html', 
                           post=post, 
-                          comments=comments, 
+                          views=post.views + view_counter.pending(ForumPost.views, post.id),
+                          comments=comments.items, 
+                          comment_page=comments,
                           form=form)
 
 @community_bp.route('/forum/new-post', methods=['GET', 'POST'])
@@ -99,9 +98,10 @@ def travel_logs():
     page = request.args.get('page', 1, type=int)
     
     # Get public travel logs
-    logs = TravelLog.query.filter_by(is_public=True).order_by(
-        TravelLog.created_at.desc()
-    ).paginate(page=page, per_page=6)
+    logs = keyset_paginate(
+        TravelLog.query.filter_by(is_public=True), TRAVEL_LOG_KEYSET,
+        cursor=request.args.get('cursor'), page=page, per_page=6, total='estimate', error_out=True
+    )
     
     return render_template('community/travel_logs.html', logs=logs)
 
@@ -4,6 +4,9 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///pilgrimages.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DB_PROFILE = os.environ.get('DB_PROFILE') or 'development'  # development, production or test; see db_engine.py
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')  # optional read replica
+    REPLICA_STICKY_SECONDS = 10  # after a user's own write, their reads stay on the primary this long
     
     # Mail settings
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -13,12 +16,34 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD') or 'your-password'
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@sacredjourneys.com'
     
+    # Outbound mail queue
+    MAIL_TRANSPORT = os.environ.get('MAIL_TRANSPORT') or 'smtp'  # smtp, file or console
+    MAIL_OUTBOX_DIR = 'outbox'  # under the instance folder, used by the file transport
+    MAIL_QUEUE_AUTOSTART = os.environ.get('MAIL_QUEUE_AUTOSTART', '1') == '1'
+    MAIL_QUEUE_WORKERS = 2
+    MAIL_QUEUE_BATCH_SIZE = 20
+    MAIL_QUEUE_MAX_ATTEMPTS = 5
+    MAIL_QUEUE_RETRY_BASE = 30  # seconds, doubled on every failed attempt
+    MAIL_QUEUE_POLL_INTERVAL = 5
+    
+    # Buffered page-view counters (see view_counter.py)
+    VIEW_COUNTER_AUTOSTART = os.environ.get('VIEW_COUNTER_AUTOSTART', '1') == '1'
+    VIEW_COUNTER_FLUSH_INTERVAL = 10  # seconds; a crash loses at most this much while flushes succeed
+    VIEW_COUNTER_MAX_PENDING = 1000  # flush early once this many views are buffered
+    
     # Stripe settings
     STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY') or 'pk_test_your_stripe_public_key'
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY') or 'sk_test_your_stripe_secret_key'
     
     # OpenWeather API
     OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY') or 'your_openweather_api_key'
+    WEATHER_PROVIDER = os.environ.get('WEATHER_PROVIDER') or 'openweather'  # or 'static' for offline runs
+    WEATHER_CACHE_TTL = 600  # seconds a cached reading is fresh
+    WEATHER_STALE_TTL = 3600  # seconds a stale reading may still be served while refreshing
+    WEATHER_ERROR_TTL = 60  # seconds before retrying a failed lookup
+    WEATHER_COORD_PRECISION = 2  # decimal places (~1 km) used for the cache key
+    WEATHER_CONNECT_TIMEOUT = 1.0
+    WEATHER_READ_TIMEOUT = 2.0
     
     # Google Maps API
     GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY') or 'your_google_maps_api_key'
@@ -26,6 +51,46 @@ class Config:
     # Application settings
     LANGUAGES = ['en', 'es', 'fr', 'de', 'it']
     POSTS_PER_PAGE = 9
+    SEARCH_RESULTS_LIMIT = 20
+    ITINERARY_TIME_BUDGET_MS = 50  # route optimisation budget per generated itinerary
+    DEAL_CACHE_TTL = 300  # seconds before other processes' deal edits are picked up
+    DASHBOARD_PAGE_SIZE = 10  # trips and bookings per dashboard page
+    PAGINATION_COUNT_CAP = 10000  # rows counted for an estimated total before reporting "at least"
     UPLOAD_FOLDER = os.path.join('static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    RECEIPT_STORAGE_DIR = 'receipts'  # under the instance folder
+    RECEIPT_MAX_AGE = 86400
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE') == '1'  # let the front-end server stream stored files
+    
+    # API response cache (see cache.py)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'lru'  # lru (per process) or redis (shared)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    CACHE_MAX_ENTRIES = 2048  # lru backend only
+    CACHE_DEFAULT_TIMEOUT = 300
+    
+    # Cache-Control per endpoint or blueprint (see http_cache.py); endpoint entries win
+    HTTP_CACHE_CONTROL = {
+        'main': 'private, no-cache',  # pages vary per user; revalidate with ETags
+        'api': 'public, max-age=60, stale-while-revalidate=300',
+        'api.get_pilgrimage': 'private, no-cache',  # carries the user's saved flag
+        'api.get_saved_pilgrimages': 'private, no-store',
+        'api.get_upcoming_trips': 'private, no-store',
+        'auth': 'no-store',
+        'payment': 'no-store',
+        'trip': 'private, no-store',
+        'trip_planner': 'private, no-cache',
+        'notifications': 'private, no-store',
+    }
+    
+    # Notification push (in-process broker). Held-open requests need a gevent or eventlet worker;
+    # on a sync or threaded server every waiting tab would occupy a worker thread.
+    # auto: SSE stream and long-poll under such a worker, short polling otherwise
+    # stream: always allow both (the server is known to handle idle connections cheaply)
+    # poll: never open streams; long-poll only under such a worker
+    NOTIFICATION_PUSH = os.environ.get('NOTIFICATION_PUSH') or 'auto'
+    BROKER_MAX_PENDING = 100  # undelivered events per subscriber before it is told to resync
+    NOTIFICATION_STREAM_HEARTBEAT = 15  # seconds between keep-alive comments
+    NOTIFICATION_STREAM_MAX_AGE = 300  # seconds before a stream is closed and the client reconnects
+    NOTIFICATION_POLL_TIMEOUT = 25  # longest wait of the long-poll endpoint
+    NOTIFICATION_POLL_INTERVAL = 20  # seconds between short polls when requests must not wait
 
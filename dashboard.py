@@ -0,0 +1,158 @@
+"""Dashboard read model.
+
+The dashboard page used to load every Booking and TripPlan of the user and
+lazy-load each pilgrimage from the template. Everything here runs in a
+fixed number of queries, whatever the user's history size: one aggregate
+query for the stat counters, one joined query per page of trips, and one
+union query plus two joined fetches per page of bookings.
+"""
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import Booking, Review, TripPlan
+
+class Section:
+    """One page of a dashboard section, with just enough pagination for templates and JSON"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def meta(self):
+        return {'page': self.page, 'per_page': self.per_page, 'total': self.total, 'pages': self.pages}
+
+class BookingEntry:
+    """A row of the bookings table: a Booking or a paid TripPlan"""
+    __slots__ = ('kind', 'record', 'travel_date')
+
+    def __init__(self, kind, record, travel_date):
+        self.kind = kind
+        self.record = record
+        self.travel_date = travel_date
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+def dashboard_counters(user_id, today):
+    """All stat counters of the dashboard in one aggregate query"""
+    row = db.session.execute(select(
+        _count(Booking, Booking.user_id == user_id).label('bookings'),
+        _count(Booking, Booking.user_id == user_id, Booking.travel_date > today).label('upcoming_bookings'),
+        _count(TripPlan, TripPlan.user_id == user_id).label('trips'),
+        _count(TripPlan, TripPlan.user_id == user_id, TripPlan.payment_status == 'paid').label('paid_trips'),
+        _count(Review, Review.user_id == user_id).label('reviews')
+    )).one()
+    counters = dict(row._mapping)
+    counters['completed_bookings'] = counters['bookings'] - counters['upcoming_bookings']
+    counters['pending_trips'] = counters['trips'] - counters['paid_trips']
+    return counters
+
+def _clamp_page(page, per_page, total):
+    pages = max(1, -(-total // per_page))
+    return min(max(page or 1, 1), pages)
+
+def trips_section(user_id, page, per_page, total):
+    """A page of the user's trip plans with their pilgrimages, newest first"""
+    page = _clamp_page(page, per_page, total)
+    trips = TripPlan.query.options(
+        joinedload(TripPlan.pilgrimage)
+    ).filter(
+        TripPlan.user_id == user_id
+    ).order_by(
+        TripPlan.start_date.desc(), TripPlan.id.desc()
+    ).limit(per_page).offset((page - 1) * per_page).all()
+    return Section(trips, page, per_page, total)
+
+def bookings_section(user_id, page, per_page, total):
+    """A page of bookings and paid trips, merged and ordered by travel date"""
+    page = _clamp_page(page, per_page, total)
+    entries = union_all(
+        select(literal('booking').label('kind'), Booking.id.label('id'), Booking.travel_date.label('travel_date'))
+        .where(Booking.user_id == user_id),
+        select(literal('trip').label('kind'), TripPlan.id.label('id'), TripPlan.start_date.label('travel_date'))
+        .where(TripPlan.user_id == user_id, TripPlan.payment_status == 'paid')
+    ).subquery()
+    rows = db.session.execute(
+        select(entries.c.kind, entries.c.id, entries.c.travel_date)
+        .order_by(entries.c.travel_date.desc(), entries.c.kind, entries.c.id.desc())
+        .limit(per_page).offset((page - 1) * per_page)
+    ).all()
+
+    booking_ids = [row.id for row in rows if row.kind == 'booking']
+    trip_ids = [row.id for row in rows if row.kind == 'trip']
+    records = {}
+    if booking_ids:
+        for booking in Booking.query.options(joinedload(Booking.pilgrimage)).filter(Booking.id.in_(booking_ids)):
+            records[('booking', booking.id)] = booking
+    if trip_ids:
+        for trip in TripPlan.query.options(joinedload(TripPlan.pilgrimage)).filter(TripPlan.id.in_(trip_ids)):
+            records[('trip', trip.id)] = trip
+
+    items = [
+        BookingEntry(row.kind, records[(row.kind, row.id)], row.travel_date)
+        for row in rows
+        if (row.kind, row.id) in records
+    ]
+    return Section(items, page, per_page, total)
+
+def load_dashboard(user_id, today, trips_page=1, bookings_page=1, per_page=10):
+    counters = dashboard_counters(user_id, today)
+    return {
+        'counters': counters,
+        'trips': trips_section(user_id, trips_page, per_page, counters['trips']),
+        'bookings': bookings_section(user_id, bookings_page, per_page, counters['bookings'] + counters['paid_trips'])
+    }
+
+# JSON serialization for the lazily loaded sections
+
+def _pilgrimage_dict(pilgrimage):
+    return {
+        'id': pilgrimage.id,
+        'name': pilgrimage.name,
+        'location': pilgrimage.location,
+        'image_url': pilgrimage.image_url,
+        'latitude': pilgrimage.latitude,
+        'longitude': pilgrimage.longitude
+    }
+
+def trip_to_dict(trip):
+    return {
+        'id': trip.id,
+        'pilgrimage': _pilgrimage_dict(trip.pilgrimage),
+        'start_date': trip.start_date.isoformat(),
+        'end_date': trip.end_date.isoformat(),
+        'num_travelers': trip.num_travelers,
+        'total_price': trip.total_price,
+        'payment_status': trip.payment_status
+    }
+
+def booking_entry_to_dict(entry):
+    return {
+        'kind': entry.kind,
+        'id': entry.record.id,
+        'pilgrimage': _pilgrimage_dict(entry.record.pilgrimage),
+        'travel_date': entry.travel_date.isoformat()
+    }
@@ -0,0 +1,124 @@
+"""Database engine configuration.
+
+Config.DB_PROFILE picks a profile (development, production or test), and
+each profile sets the pool options and, for SQLite, the PRAGMAs run on
+every new connection. Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS
+take precedence. When DATABASE_REPLICA_URL is configured, a replica engine
+is created with the same profile; read_engine() is the hook that read-only
+code uses to reach it. The replica is not a Flask-SQLAlchemy bind, so
+create_all() and migrations never touch it.
+"""
+import os
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+from extensions import db
+
+DB_PROFILES = {
+    'development': {
+        'sqlite_pragmas': {
+            # WAL is persistent and keeps -wal/-shm files beside the database; the
+            # tracked instance/pilgrimages.db must stay a single self-contained file.
+            # This also switches a copy that was opened in WAL mode back.
+            'journal_mode': 'DELETE',
+            'busy_timeout': 5000,
+        },
+        'pool': {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 30},
+    },
+    'production': {
+        # WAL lets readers proceed during a write; busy_timeout makes writers wait
+        # for each other instead of failing with "database is locked"
+        'sqlite_pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',  # durable at checkpoints, safe against corruption in WAL mode
+            'busy_timeout': 10000,
+            'cache_size': -64000,  # KiB, i.e. 64 MB per connection
+            'mmap_size': 268435456,  # 256 MB
+            'temp_store': 'MEMORY',
+        },
+        'pool': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10, 'pool_recycle': 1800, 'pool_pre_ping': True},
+    },
+    'test': {
+        # SQLite's default rollback journal: test databases are in memory or throwaway files
+        'sqlite_pragmas': {
+            'synchronous': 'OFF',
+            'busy_timeout': 5000,
+        },
+        'pool': {'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 5},
+    },
+}
+
+def get_profile(name):
+    try:
+        return DB_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}; expected one of {', '.join(DB_PROFILES)}")
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(uri, profile_name):
+    """create_engine() keyword arguments for uri under a profile"""
+    profile = get_profile(profile_name)
+    url = make_url(uri)
+    if _is_memory_sqlite(url):
+        # A single shared in-memory connection; pooling does not apply
+        return {}
+
+    options = dict(profile['pool'])
+    if url.get_backend_name() == 'sqlite':
+        # SQLite connections are cheap and never go stale
+        options.pop('pool_pre_ping', None)
+        options.pop('pool_recycle', None)
+        busy_timeout = profile['sqlite_pragmas'].get('busy_timeout', 5000)
+        options['connect_args'] = {'timeout': busy_timeout / 1000, 'check_same_thread': False}
+    return options
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Run pragmas on every new DBAPI connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def configure_engine_options(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS from the profile; call before db.init_app()"""
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('DB_PROFILE', 'development'))
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+def init_engines(app):
+    """Install the profile's SQLite PRAGMAs and create the replica engine; call after db.init_app()"""
+    profile_name = app.config.get('DB_PROFILE', 'development')
+    pragmas = get_profile(profile_name)['sqlite_pragmas']
+    with app.app_context():
+        for engine in db.engines.values():
+            install_sqlite_pragmas(engine, pragmas)
+
+    replica_uri = app.config.get('DATABASE_REPLICA_URL')
+    if replica_uri:
+        url = make_url(replica_uri)
+        if url.get_backend_name() == 'sqlite' and not _is_memory_sqlite(url) and not os.path.isabs(url.database):
+            # Relative SQLite paths live in the instance folder, as Flask-SQLAlchemy does for the primary
+            url = url.set(database=os.path.join(app.instance_path, url.database))
+        replica_uri = url.render_as_string(hide_password=False)
+    app.extensions['db_replica'] = create_configured_engine(replica_uri, profile_name) if replica_uri else None
+
+def read_engine():
+    """Engine for read-only work: the replica when one is configured, else the primary"""
+    return current_app.extensions.get('db_replica') or db.engine
+
+def create_configured_engine(uri, profile_name):
+    """Standalone engine with a profile applied, for scripts and benchmarks"""
+    engine = create_engine(uri, **engine_options(uri, profile_name))
+    install_sqlite_pragmas(engine, get_profile(profile_name)['sqlite_pragmas'])
+    return engine
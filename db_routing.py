@@ -0,0 +1,116 @@
+"""Read/write routing for db.session.
+
+Views marked with @read_only (or every view of a blueprint passed to
+read_only_blueprint()) run their SELECTs against the replica engine that
+db_engine.init_engines() creates from DATABASE_REPLICA_URL. Everything else
+uses the primary, as do flushes and INSERT/UPDATE/DELETE statements, so a
+read-only view that happens to write still writes to the primary, and reads
+after that write in the same request stay on the primary too.
+
+Replicas lag, so a user who just wrote is pinned to the primary for
+REPLICA_STICKY_SECONDS through a cookie set on the response of the request
+that committed. Code that must see the latest data regardless (cache
+reloads, for instance) can wrap its queries in use_primary().
+
+To try it locally, point DATABASE_REPLICA_URL at a second SQLite file and
+copy the primary into it with `flask sync_replica`.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+STICKY_COOKIE = 'db_primary_until'
+_READ_METHODS = ('GET', 'HEAD')
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads of read-only views to the replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) and _use_replica():
+            replica = current_app.extensions.get('db_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _use_replica():
+    if not has_request_context():
+        return False
+    return g.get('db_read_only', False) and not g.get('db_use_primary', False)
+
+def _sticky(now=None):
+    try:
+        until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > (now or time.time())
+
+def read_only(view):
+    """Route the view's safe-method (GET/HEAD) queries to the replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        _mark_read_only()
+        return view(*args, **kwargs)
+    return wrapper
+
+def read_only_blueprint(blueprint):
+    """Mark every view of blueprint read-only"""
+    blueprint.before_request(_mark_read_only)
+    return blueprint
+
+def _mark_read_only():
+    if request.method in _READ_METHODS and not _sticky():
+        g.db_read_only = True
+
+@contextmanager
+def use_primary():
+    """Send queries inside the block to the primary, even in a read-only view"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_use_primary', False)
+    g.db_use_primary = True
+    try:
+        yield
+    finally:
+        g.db_use_primary = previous
+
+# Writes: pin the rest of the request, and the user's next requests, to the primary
+
+def _note_write(session):
+    if has_request_context():
+        session.info['routing_wrote'] = True
+        # Later reads in this request must see what was just written
+        g.db_use_primary = True
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    _note_write(session)
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _do_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _note_write(orm_execute_state.session)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('routing_wrote', False) and has_request_context():
+        g.db_committed_write = True
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('routing_wrote', None)
+
+def _set_sticky_cookie(response):
+    if g.get('db_committed_write') and current_app.extensions.get('db_replica') is not None:
+        seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+        response.set_cookie(STICKY_COOKIE, f"{time.time() + seconds:.3f}", max_age=seconds,
+                            httponly=True, samesite='Lax')
+    return response
+
+def init_routing(app):
+    """Install the stickiness cookie hook; call after init_engines()"""
+    app.after_request(_set_sticky_cookie)
@@ -0,0 +1,165 @@
+"""Process-local catalog of active deals.
+
+Deals change rarely but are consulted on every planner page load, so each
+process keeps an in-memory copy indexed by code, by pilgrimage and as a
+global list. Each list is sorted by valid_from so a date lookup is a
+bisect. Any committed Deal write bumps a version counter that forces a
+reload on the next lookup, and a TTL bounds how long other processes' writes
+can go unnoticed.
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import date
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from db_routing import use_primary
+from models import Deal, Pilgrimage
+
+class CachedDeal:
+    """Detached, read-only copy of a Deal row, safe to share across requests"""
+    __slots__ = ('id', 'title', 'description', 'discount_percentage', 'valid_from', 'valid_to', 'code',
+                 'image_url', 'pilgrimage_id', 'pilgrimage_name', 'min_travelers', 'min_days')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def is_valid_on(self, day):
+        return self.valid_from <= day <= self.valid_to
+
+    def applies_to(self, num_travelers, trip_duration):
+        return (self.min_travelers or 1) <= num_travelers and (self.min_days or 1) <= trip_duration
+
+class _Snapshot:
+    """Immutable set of indexes built from one load"""
+
+    def __init__(self, deals, version, loaded_on):
+        self.version = version
+        self.loaded_on = loaded_on
+        self.loaded_at = time.monotonic()
+        self.by_code = {deal.code: deal for deal in deals}
+
+        self.by_pilgrimage = {}
+        self.global_deals = []
+        for deal in sorted(deals, key=lambda d: (d.valid_from, d.id)):
+            if deal.pilgrimage_id is None:
+                self.global_deals.append(deal)
+            else:
+                self.by_pilgrimage.setdefault(deal.pilgrimage_id, []).append(deal)
+        self._starts = {key: [deal.valid_from for deal in deals] for key, deals in self.by_pilgrimage.items()}
+        self._global_starts = [deal.valid_from for deal in self.global_deals]
+
+    @staticmethod
+    def _valid(deals, starts, day):
+        # Everything after the bisect point starts in the future
+        return [deal for deal in deals[:bisect_right(starts, day)] if deal.valid_to >= day]
+
+    def valid_on(self, day, pilgrimage_id=None):
+        """Deals valid on day: global ones, plus those specific to pilgrimage_id if given"""
+        deals = self._valid(self.global_deals, self._global_starts, day)
+        if pilgrimage_id is not None and pilgrimage_id in self.by_pilgrimage:
+            deals += self._valid(self.by_pilgrimage[pilgrimage_id], self._starts[pilgrimage_id], day)
+        return deals
+
+    def all_valid_on(self, day):
+        deals = self._valid(self.global_deals, self._global_starts, day)
+        for pilgrimage_id, pilgrimage_deals in self.by_pilgrimage.items():
+            deals += self._valid(pilgrimage_deals, self._starts[pilgrimage_id], day)
+        return deals
+
+class DealCatalog:
+    """In-memory deal indexes, reloaded when deals change; configure with init_app()"""
+
+    def __init__(self, app=None):
+        self.ttl = 300
+        self._version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DEAL_CACHE_TTL', 300)
+        self._snapshot = None
+        app.extensions['deal_catalog'] = self
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def _current(self):
+        snapshot = self._snapshot
+        today = date.today()
+        if (snapshot is None or snapshot.version != self._version or snapshot.loaded_on != today
+                or time.monotonic() - snapshot.loaded_at > self.ttl):
+            with self._lock:
+                snapshot = self._snapshot
+                if (snapshot is None or snapshot.version != self._version or snapshot.loaded_on != today
+                        or time.monotonic() - snapshot.loaded_at > self.ttl):
+                    snapshot = self._snapshot = _Snapshot(self._load(today), self._version, today)
+        return snapshot
+
+    def _load(self, today):
+        # Served by ix_deal_active_validity; expired deals are never needed again.
+        # Always from the primary: a lagging replica would pin stale deals until the next reload
+        with use_primary():
+            rows = db.session.query(Deal, Pilgrimage.name).outerjoin(
+                Pilgrimage, Pilgrimage.id == Deal.pilgrimage_id
+            ).filter(Deal.active == True, Deal.valid_to >= today).all()
+        return [
+            CachedDeal(
+                id=deal.id,
+                title=deal.title,
+                description=deal.description,
+                discount_percentage=deal.discount_percentage,
+                valid_from=deal.valid_from,
+                valid_to=deal.valid_to,
+                code=deal.code,
+                image_url=deal.image_url,
+                pilgrimage_id=deal.pilgrimage_id,
+                pilgrimage_name=pilgrimage_name,
+                min_travelers=deal.min_travelers,
+                min_days=deal.min_days
+            )
+            for deal, pilgrimage_name in rows
+        ]
+
+    def get_by_code(self, code):
+        """Active, not yet expired deal with this code, or None"""
+        return self._current().by_code.get(code)
+
+    def valid_on(self, day=None):
+        """Every deal valid on day (default today), for the deals page"""
+        return self._current().all_valid_on(day or date.today())
+
+    def applicable(self, pilgrimage_id, num_travelers, trip_duration, day=None):
+        """Deals a trip qualifies for on day (default today)"""
+        return [
+            deal for deal in self._current().valid_on(day or date.today(), pilgrimage_id)
+            if deal.applies_to(num_travelers, trip_duration)
+        ]
+
+deal_catalog = DealCatalog()
+
+# Invalidation: note Deal writes during a flush, bump the version once they commit
+
+@event.listens_for(Deal, 'after_insert')
+@event.listens_for(Deal, 'after_update')
+@event.listens_for(Deal, 'after_delete')
+def _deal_changed(mapper, connection, deal):
+    session = Session.object_session(deal)
+    if session is not None:
+        session.info['deals_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _bump_deal_version(session):
+    if session.info.pop('deals_changed', False):
+        deal_catalog.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_deal_changes(session, previous_transaction):
+    session.info.pop('deals_changed', None)
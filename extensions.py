@@ -3,12 +3,17 @@ from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
+from weather import WeatherService
+from db_routing import RoutingSession
+from cache import Cache
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # read-only views read from the replica
 migrate = Migrate()
 login_manager = LoginManager()
 mail = Mail()
 csrf = CSRFProtect()  # Add CSRF protection
+weather = WeatherService()
+cache = Cache()  # API response cache, see cache.py
 
 print("Extensions have been initialized!")
 
@@ -0,0 +1,66 @@
+"""Forum read model.
+
+The forum index used to load every category and then, from the template,
+count each category's posts and fetch its last post and that post's author
+one row at a time. Threads loaded each comment's author lazily as well.
+Here the per-category numbers come from the denormalized post_count,
+last_post_id and last_post_at columns kept up to date by the ForumPost
+listeners in models.py. Everything a page shows is joined into its
+queries: the index takes two queries, a category page two and a thread
+page two, however many posts and comments there are.
+"""
+from sqlalchemy.orm import joinedload
+
+from models import ForumCategory, ForumComment, ForumPost
+from pagination import Keyset, keyset_paginate
+
+RECENT_POSTS = 5
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Category pages list the newest posts first; threads read oldest comment first
+POST_KEYSET = Keyset(ForumPost.created_at, ForumPost.id, descending=True)
+COMMENT_KEYSET = Keyset(ForumComment.created_at, ForumComment.id)
+
+def load_forum_index(recent_limit=RECENT_POSTS):
+    """(categories with last post and its author, newest posts with author and category)"""
+    categories = ForumCategory.query.options(
+        joinedload(ForumCategory.last_post).joinedload(ForumPost.author)
+    ).order_by(ForumCategory.id).all()
+
+    return categories, recent_posts_query(recent_limit).all()
+
+def recent_posts_query(limit=RECENT_POSTS):
+    """Newest posts with author and category; a LIMITed walk down ix_forum_post_created"""
+    return ForumPost.query.options(
+        joinedload(ForumPost.author),
+        joinedload(ForumPost.category)
+    ).order_by(ForumPost.created_at.desc(), ForumPost.id.desc()).limit(limit)
+
+def category_posts(category, cursor=None, page=1, per_page=POSTS_PER_PAGE):
+    """A page of a category's posts with their authors; the total is the category's post_count"""
+    return keyset_paginate(
+        ForumPost.query.filter(ForumPost.category_id == category.id).options(joinedload(ForumPost.author)),
+        POST_KEYSET,
+        cursor=cursor,
+        page=page,
+        per_page=per_page,
+        total=category.post_count,
+        error_out=True
+    )
+
+def load_thread(post_id, cursor=None, page=1, per_page=COMMENTS_PER_PAGE):
+    """(post with author and category, page of comments with their authors); 404s for a missing post"""
+    post = ForumPost.query.options(
+        joinedload(ForumPost.author),
+        joinedload(ForumPost.category)
+    ).filter(ForumPost.id == post_id).first_or_404()
+
+    comments = keyset_paginate(
+        ForumComment.query.filter(ForumComment.post_id == post_id).options(joinedload(ForumComment.author)),
+        COMMENT_KEYSET,
+        cursor=cursor,
+        page=page,
+        per_page=per_page
+    )
+    return post, comments
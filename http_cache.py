@@ -0,0 +1,155 @@
+"""HTTP validators and Cache-Control for catalog and detail endpoints.
+
+@conditional(state) runs a cheap state function before the view. The
+function returns the version columns the response is built from. Their hash
+becomes the ETag and the newest timestamp becomes Last-Modified. When the
+client's If-None-Match (or, without one, If-Modified-Since) still matches,
+a 304 is returned without running the view's queries or rendering.
+
+- Pilgrimage.updated_at changes on every edit of the pilgrimage and of its
+  reviews (see the Review listeners in models.py), so a single primary-key
+  lookup validates detail pages, listings and review pages.
+- TravelTip.updated_at validates the tips endpoint.
+
+The ETag is also left in g.http_validator for the response cache
+(cache.py), which only serves an entry stored under the same validator.
+Its bodies therefore always match the validator they are sent with, even
+when another process changed the database and this process's cache was
+never invalidated.
+
+JSON responses get strong ETags. HTML pages get weak ones because their
+forms carry per-render CSRF tokens, so two renders of the same content are
+not byte-identical. Their ETag also varies with the user, the unread badge
+and the CSRF token lifetime.
+
+init_http_cache() fills in Cache-Control for GET responses from
+HTTP_CACHE_CONTROL, a mapping of endpoint or blueprint name to policy.
+Endpoint entries win over blueprint ones, and a header set by the view
+itself is left alone.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func
+
+from extensions import db, weather
+from models import Pilgrimage, SavedPilgrimage, TravelTip
+
+class ValidatorState:
+    """What a response is built from: hashable parts and, optionally, its Last-Modified time"""
+    __slots__ = ('parts', 'last_modified')
+
+    def __init__(self, parts, last_modified=None):
+        self.parts = parts
+        self.last_modified = last_modified
+
+def _etag(parts):
+    payload = json.dumps([request.endpoint, request.full_path, parts], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def _page_variant():
+    """Per-render inputs of HTML pages: who is looking, their badge and the CSRF token window"""
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    # Half the token lifetime, so a revalidated page still leaves time to submit its forms
+    window = int(time.time()) // max(limit // 2, 1) if limit else 0
+    if current_user.is_authenticated:
+        return [current_user.id, current_user.unread_notifications, window]
+    return [None, 0, window]
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+def conditional(state, html=False):
+    """Answer GETs with 304 when state(**view_kwargs) is unchanged; None from state skips validation"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Flashed messages are shown once, so such a render is never "not modified"
+            if request.method not in ('GET', 'HEAD') or (html and session.get('_flashes')):
+                return view(*args, **kwargs)
+
+            current = state(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+
+            parts = current.parts + _page_variant() if html else current.parts
+            etag = _etag(parts)
+            last_modified = None if html else current.last_modified
+
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                g.http_validator = etag
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=html)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+# State functions for the catalog
+
+def pilgrimage_state(id):
+    updated_at = db.session.query(Pilgrimage.updated_at).filter(Pilgrimage.id == id).scalar()
+    if updated_at is None:
+        # Missing pilgrimage (let the view 404) or a row predating the column
+        return None
+    return ValidatorState([id, updated_at], updated_at)
+
+def catalog_state():
+    # One pass over the narrow ix_pilgrimage_updated_at, never the table; the count catches deletions
+    count, updated_at = db.session.query(func.count(Pilgrimage.id), func.max(Pilgrimage.updated_at)).one()
+    return ValidatorState([count, updated_at], updated_at)
+
+def api_pilgrimage_state(id):
+    row = db.session.query(Pilgrimage.updated_at, Pilgrimage.latitude, Pilgrimage.longitude).filter(
+        Pilgrimage.id == id
+    ).first()
+    if row is None or row.updated_at is None:
+        return None
+
+    # The response also carries the cached weather and the user's saved flag
+    parts = [id, row.updated_at]
+    if row.latitude and row.longitude:
+        parts.append(weather.get(row.latitude, row.longitude))
+    if current_user.is_authenticated:
+        saved = db.session.query(SavedPilgrimage.id).filter_by(
+            user_id=current_user.id, pilgrimage_id=id
+        ).first() is not None
+        parts += [current_user.id, saved]
+    return ValidatorState(parts)
+
+def tips_state(id):
+    count, updated_at = db.session.query(func.count(TravelTip.id), func.max(TravelTip.updated_at)).filter(
+        TravelTip.pilgrimage_id == id
+    ).one()
+    return ValidatorState([id, count, updated_at], updated_at)
+
+# Cache-Control
+
+def _cache_control(response):
+    if request.method not in ('GET', 'HEAD') or response.status_code not in (200, 304):
+        return response
+    if 'Cache-Control' in response.headers:
+        return response
+    policies = current_app.config.get('HTTP_CACHE_CONTROL', {})
+    policy = policies.get(request.endpoint) or policies.get(request.blueprint)
+    if policy:
+        response.headers['Cache-Control'] = policy
+    return response
+
+def init_http_cache(app):
+    """Install the Cache-Control policies"""
+    app.after_request(_cache_control)
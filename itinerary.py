@@ -0,0 +1,274 @@
+"""Itinerary planning and persistence.
+
+plan_itinerary() is pure Python and touches no database state, so it can
+be benchmarked and exercised on its own. persist_itinerary() writes its
+output with set-based deletes and bulk inserts inside the caller's
+transaction. build_snapshot() reads a stored itinerary back for saving on
+the trip.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from itertools import groupby
+
+from flask import current_app
+
+from extensions import db
+from models import Attraction, DailyPlan, DailyPlanAttraction, pack_itinerary
+from route_optimizer import DEFAULT_TIME_BUDGET_MS, plan_routes
+
+MAX_ATTRACTIONS_PER_DAY = 4
+DEFAULT_MEAL_PLAN = "Breakfast, Lunch, Dinner"
+
+def trip_days(start_date, end_date):
+    return (end_date - start_date).days + 1
+
+def day_title(day, duration):
+    if day == 1:
+        return "Arrival & Orientation"
+    if day == duration:
+        return "Farewell & Departure"
+    return f"Day {day} Exploration"
+
+def day_capacity(day, duration, attractions_per_day):
+    """Arrival and departure days get one attraction fewer"""
+    if day == 1 or day == duration:
+        return max(1, attractions_per_day - 1)
+    return attractions_per_day
+
+def day_capacities(duration, num_attractions):
+    """Number of attractions to schedule on each day of the trip"""
+    if not num_attractions:
+        return [0] * duration
+    attractions_per_day = max(1, min(MAX_ATTRACTIONS_PER_DAY, num_attractions // duration))
+    capacities = []
+    remaining = num_attractions
+    for day in range(1, duration + 1):
+        capacity = min(day_capacity(day, duration, attractions_per_day), remaining)
+        capacities.append(capacity)
+        remaining -= capacity
+    return capacities
+
+def plan_itinerary(start_date, end_date, attractions, pilgrimage_name='', accommodation_type='', transportation='',
+                   time_budget_ms=DEFAULT_TIME_BUDGET_MS):
+    """Build a complete itinerary in memory.
+
+    attractions is any sequence of objects exposing id, popularity,
+    latitude, longitude, visit_duration and opening_hours. The most popular
+    ones are kept, grouped into days by proximity and ordered into short
+    routes (see route_optimizer). Returns one dict per day holding the
+    DailyPlan fields plus an 'attractions' list of DailyPlanAttraction fields.
+    """
+    duration = trip_days(start_date, end_date)
+    ranked = sorted(attractions, key=lambda a: a.popularity or 0, reverse=True)
+    capacities = day_capacities(duration, len(ranked))
+    routes = plan_routes(ranked, capacities, time_budget_ms)
+
+    days = []
+    for day, route in enumerate(routes, start=1):
+        days.append({
+            'day_number': day,
+            'date': start_date + timedelta(days=day - 1),
+            'title': day_title(day, duration),
+            'description': f"Explore the wonders of {pilgrimage_name} on day {day} of your journey.",
+            'accommodation': (accommodation_type or '').capitalize(),
+            'transportation': (transportation or '').replace('_', ' ').capitalize(),
+            'meal_plan': DEFAULT_MEAL_PLAN,
+            'attractions': [
+                {'attraction_id': attraction.id, 'start_time': start_time, 'order': order}
+                for order, (attraction, start_time) in enumerate(route)
+            ]
+        })
+    return days
+
+def plan_for_trip(trip, attractions):
+    return plan_itinerary(
+        trip.start_date,
+        trip.end_date,
+        attractions,
+        pilgrimage_name=trip.pilgrimage.name,
+        accommodation_type=trip.accommodation_type,
+        transportation=trip.transportation,
+        time_budget_ms=current_app.config.get('ITINERARY_TIME_BUDGET_MS', DEFAULT_TIME_BUDGET_MS)
+    )
+
+def clear_itinerary(trip_id):
+    """Delete a trip's days and their attractions with two set-based statements"""
+    day_ids = db.session.query(DailyPlan.id).filter(DailyPlan.trip_id == trip_id)
+    DailyPlanAttraction.query.filter(
+        DailyPlanAttraction.daily_plan_id.in_(day_ids.scalar_subquery())
+    ).delete(synchronize_session=False)
+    DailyPlan.query.filter(DailyPlan.trip_id == trip_id).delete(synchronize_session=False)
+
+def persist_itinerary(trip_id, days):
+    """Replace a trip's stored itinerary with the planned days.
+
+    Uses a fixed number of statements regardless of trip length: two
+    deletes, one bulk day insert, one id lookup and one bulk attraction
+    insert. The caller commits.
+    """
+    clear_itinerary(trip_id)
+    if not days:
+        return
+
+    db.session.bulk_insert_mappings(DailyPlan, [
+        dict({key: value for key, value in day.items() if key != 'attractions'}, trip_id=trip_id)
+        for day in days
+    ])
+    day_ids = dict(
+        db.session.query(DailyPlan.day_number, DailyPlan.id).filter(DailyPlan.trip_id == trip_id).all()
+    )
+
+    attraction_rows = [
+        {**item, 'daily_plan_id': day_ids[day['day_number']]}
+        for day in days
+        for item in day['attractions']
+    ]
+    if attraction_rows:
+        db.session.bulk_insert_mappings(DailyPlanAttraction, attraction_rows)
+
+def save_day_stops(daily_plan, pilgrimage_id, submitted):
+    """Bring a day's stops in line with an edited list, touching only what changed.
+
+    submitted is a sequence of (attraction_id, start_time, notes) in the
+    user's order. Attraction ids are validated with a single IN query
+    against the trip's pilgrimage; unknown or foreign ids are dropped.
+    Existing rows are matched by attraction id (in order, so repeated
+    attractions pair up positionally), then the inserts, updates and
+    deletes are applied as three bulk statements at most. The caller
+    commits. Returns (inserted, updated, deleted) counts.
+    """
+    requested = set()
+    for attraction_id, _, _ in submitted:
+        try:
+            requested.add(int(attraction_id))
+        except (TypeError, ValueError):
+            continue
+    valid_ids = set()
+    if requested:
+        valid_ids = {
+            attraction_id for attraction_id, in db.session.query(Attraction.id).filter(
+                Attraction.id.in_(requested),
+                Attraction.pilgrimage_id == pilgrimage_id
+            )
+        }
+
+    existing = {}
+    for stop in db.session.query(
+        DailyPlanAttraction.id,
+        DailyPlanAttraction.attraction_id,
+        DailyPlanAttraction.start_time,
+        DailyPlanAttraction.notes,
+        DailyPlanAttraction.order
+    ).filter(DailyPlanAttraction.daily_plan_id == daily_plan.id).order_by(DailyPlanAttraction.order, DailyPlanAttraction.id):
+        existing.setdefault(stop.attraction_id, []).append(stop)
+
+    inserts, updates = [], []
+    order = 0
+    for attraction_id, start_time, notes in submitted:
+        try:
+            attraction_id = int(attraction_id)
+        except (TypeError, ValueError):
+            continue
+        if attraction_id not in valid_ids:
+            continue
+
+        values = {'start_time': start_time or "09:00", 'notes': notes or "", 'order': order}
+        order += 1
+        matches = existing.get(attraction_id)
+        if matches:
+            stop = matches.pop(0)
+            if (stop.start_time, stop.notes or "", stop.order) != (values['start_time'], values['notes'], values['order']):
+                updates.append(dict(values, id=stop.id))
+        else:
+            inserts.append(dict(values, daily_plan_id=daily_plan.id, attraction_id=attraction_id))
+
+    deletes = [stop.id for stops in existing.values() for stop in stops]
+
+    if deletes:
+        DailyPlanAttraction.query.filter(DailyPlanAttraction.id.in_(deletes)).delete(synchronize_session=False)
+    if updates:
+        db.session.bulk_update_mappings(DailyPlanAttraction, updates)
+    if inserts:
+        db.session.bulk_insert_mappings(DailyPlanAttraction, inserts)
+    return len(inserts), len(updates), len(deletes)
+
+def build_snapshot(trip_id):
+    """A trip's stored itinerary as a list of day dicts, read with one joined query"""
+    rows = db.session.query(
+        DailyPlan.id,
+        DailyPlan.day_number,
+        DailyPlan.date,
+        DailyPlan.title,
+        DailyPlan.description,
+        DailyPlan.accommodation,
+        DailyPlan.transportation,
+        DailyPlan.meal_plan,
+        DailyPlanAttraction.id.label('stop_id'),
+        DailyPlanAttraction.start_time,
+        DailyPlanAttraction.notes,
+        Attraction.id.label('attraction_id'),
+        Attraction.name,
+        Attraction.visit_duration
+    ).outerjoin(
+        DailyPlanAttraction, DailyPlanAttraction.daily_plan_id == DailyPlan.id
+    ).outerjoin(
+        Attraction, Attraction.id == DailyPlanAttraction.attraction_id
+    ).filter(
+        DailyPlan.trip_id == trip_id
+    ).order_by(
+        DailyPlan.day_number, DailyPlan.id, DailyPlanAttraction.order, DailyPlanAttraction.id
+    )
+
+    itinerary = []
+    for _, day_rows in groupby(rows, key=lambda row: row.id):
+        day_rows = list(day_rows)
+        day = day_rows[0]
+        itinerary.append({
+            'day_number': day.day_number,
+            'date': day.date.strftime('%Y-%m-%d'),
+            'title': day.title,
+            'description': day.description,
+            'accommodation': day.accommodation,
+            'transportation': day.transportation,
+            'meal_plan': day.meal_plan,
+            'attractions': [
+                {
+                    'id': row.attraction_id,
+                    'name': row.name,
+                    'start_time': row.start_time,
+                    'duration': row.visit_duration,
+                    'notes': row.notes
+                }
+                for row in day_rows
+                if row.stop_id is not None
+            ]
+        })
+    return itinerary
+
+_snapshot_encoder = json.JSONEncoder(separators=(',', ':'))
+
+def encode_snapshot(itinerary):
+    """Encode a snapshot in the compact stored format, hashing the chunks as they are produced.
+
+    Returns (json_text, sha256 hex digest).
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    for chunk in _snapshot_encoder.iterencode(pack_itinerary(itinerary)):
+        digest.update(chunk.encode('utf-8'))
+        chunks.append(chunk)
+    return ''.join(chunks), digest.hexdigest()
+
+def save_snapshot(trip):
+    """Store the trip's current itinerary on it; returns False if it was unchanged.
+
+    Costs one query to read plus one UPDATE when something changed,
+    whatever the trip length. The caller commits.
+    """
+    text, itinerary_hash = encode_snapshot(build_snapshot(trip.id))
+    if itinerary_hash == trip.itinerary_hash:
+        return False
+    trip.itinerary = text
+    trip.itinerary_hash = itinerary_hash
+    return True
@@ -0,0 +1,79 @@
+from extensions import db
+from models import Pilgrimage
+from pagination import Keyset, keyset_paginate
+
+# Columns needed to render a pilgrimage card; the heavy text columns
+# (description, gallery) are never loaded for listings.
+LISTING_COLUMNS = (
+    Pilgrimage.id,
+    Pilgrimage.name,
+    Pilgrimage.location,
+    Pilgrimage.image_url,
+    Pilgrimage.price,
+    Pilgrimage.rating_count,
+    Pilgrimage.rating_sum
+)
+
+class PilgrimageRow:
+    """Lightweight read-only pilgrimage card shared by templates and JSON views"""
+    __slots__ = ('id', 'name', 'location', 'image_url', 'price', 'rating_count', 'rating_sum')
+
+    def __init__(self, id, name, location, image_url, price, rating_count, rating_sum):
+        self.id = id
+        self.name = name
+        self.location = location
+        self.image_url = image_url
+        self.price = price
+        self.rating_count = rating_count or 0
+        self.rating_sum = rating_sum or 0
+
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return 0
+        return self.rating_sum / self.rating_count
+
+    @property
+    def reviews_count(self):
+        return self.rating_count
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'location': self.location,
+            'image_url': self.image_url,
+            'price': self.price,
+            'average_rating': self.average_rating,
+            'reviews_count': self.reviews_count
+        }
+
+def listing_query():
+    """Base query returning plain column tuples for pilgrimage cards"""
+    return db.session.query(*LISTING_COLUMNS)
+
+def to_rows(results):
+    return [PilgrimageRow(*result) for result in results]
+
+def get_featured_pilgrimages(limit=6):
+    """Featured cards for the home page, falling back to the first pilgrimages"""
+    rows = to_rows(listing_query().filter(Pilgrimage.featured == True).limit(limit).all())
+    if not rows:
+        rows = to_rows(listing_query().order_by(Pilgrimage.id).limit(limit).all())
+    return rows
+
+# Catalog order; the primary key is the whole keyset
+LISTING_KEYSET = Keyset(Pilgrimage.id)
+
+def paginate_pilgrimages(page=None, per_page=9, query=None, error_out=True, cursor=None, total='exact'):
+    """Paginate pilgrimage cards in a fixed number of statements.
+
+    Issues one page SELECT (keyset when a cursor is given, OFFSET for ?page=)
+    and, unless total is None, one COUNT; all per-row stats come from the
+    denormalized rating columns.
+    """
+    query = query if query is not None else listing_query()
+    pagination = keyset_paginate(query, LISTING_KEYSET, cursor=cursor, page=page, per_page=per_page,
+                                 total=total, error_out=error_out)
+    pagination.items = to_rows(pagination.items)
+    return pagination
@@ -0,0 +1,235 @@
+"""Asynchronous outbound email.
+
+Request handlers call enqueue_email(), which only adds an OutboundEmail row
+to the caller's transaction. Background workers claim due rows in batches,
+deliver each batch over a single transport connection and retry failures
+with exponential backoff.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import or_, select
+
+from extensions import db, mail
+from models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+def enqueue_email(subject, recipients, html, sender=None):
+    """Queue an email for delivery; it is sent once the caller's transaction commits"""
+    email = OutboundEmail(
+        subject=subject,
+        recipients=json.dumps(list(recipients)),
+        sender=sender or current_app.config.get('MAIL_DEFAULT_SENDER', 'noreply@sacredjourneys.com'),
+        html_body=html,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(email)
+    return email
+
+# Transports
+
+class SMTPTransport:
+    """Delivers through Flask-Mail, reusing one SMTP connection per batch"""
+
+    @contextmanager
+    def connect(self):
+        with mail.connect() as connection:
+            yield connection
+
+class FileTransport:
+    """Writes each message as an .eml file, for local development and tests"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @contextmanager
+    def connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        yield self
+
+    def send(self, message):
+        filename = f"{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.eml"
+        with open(os.path.join(self.directory, filename), 'w', encoding='utf-8') as f:
+            f.write(message.as_string())
+
+class ConsoleTransport:
+    """Logs each message instead of sending it"""
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+    def send(self, message):
+        logger.info(f"[mail] To: {', '.join(message.recipients)} Subject: {message.subject}")
+
+def get_transport(app):
+    name = app.config.get('MAIL_TRANSPORT', 'smtp')
+    if name == 'file':
+        return FileTransport(os.path.join(app.instance_path, app.config.get('MAIL_OUTBOX_DIR', 'outbox')))
+    if name == 'console':
+        return ConsoleTransport()
+    return SMTPTransport()
+
+# Delivery
+
+def claim_batch(worker_id, batch_size, lease_seconds=300):
+    """Atomically mark up to batch_size due emails as being sent by this worker.
+
+    Rows left in 'sending' by a worker that died are reclaimed once their
+    lease has expired.
+    """
+    now = datetime.utcnow()
+    due_filter = _due_filter(now, lease_seconds)
+    due = db.session.query(OutboundEmail.id).filter(due_filter).order_by(OutboundEmail.id).limit(batch_size).subquery()
+
+    # Re-checking the due condition in the UPDATE means two workers racing
+    # for the same rows can never both claim them
+    OutboundEmail.query.filter(
+        OutboundEmail.id.in_(select(due.c.id)),
+        due_filter
+    ).update({
+        OutboundEmail.status: 'sending',
+        OutboundEmail.claimed_by: worker_id,
+        OutboundEmail.claimed_at: now
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return OutboundEmail.query.filter_by(status='sending', claimed_by=worker_id).order_by(OutboundEmail.id).all()
+
+def _due_filter(now, lease_seconds):
+    return or_(
+        (OutboundEmail.status == 'pending') & (OutboundEmail.next_attempt_at <= now),
+        (OutboundEmail.status == 'sending') & (OutboundEmail.claimed_at < now - timedelta(seconds=lease_seconds))
+    )
+
+def retry_delay(attempts, base_seconds, max_seconds=3600):
+    """Exponential backoff: base, 2*base, 4*base, ... capped at max_seconds"""
+    return min(base_seconds * (2 ** max(attempts - 1, 0)), max_seconds)
+
+def deliver_batch(emails, transport, max_attempts=5, retry_base=30):
+    """Send a claimed batch over one transport connection; returns the number sent"""
+    if not emails:
+        return 0
+
+    sent = 0
+    now = datetime.utcnow()
+    try:
+        with transport.connect() as connection:
+            for email in emails:
+                try:
+                    connection.send(Message(
+                        subject=email.subject,
+                        recipients=email.recipient_list,
+                        html=email.html_body,
+                        sender=email.sender
+                    ))
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+                    sent += 1
+                except Exception as e:
+                    _mark_failed(email, e, now, max_attempts, retry_base)
+    except Exception as e:
+        # Could not open (or cleanly close) the connection: retry everything still unsent
+        for email in emails:
+            if email.status == 'sending':
+                _mark_failed(email, e, now, max_attempts, retry_base)
+
+    for email in emails:
+        email.claimed_by = None
+    db.session.commit()
+    return sent
+
+def _mark_failed(email, error, now, max_attempts, retry_base):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.id} after {email.attempts} attempts: {error}")
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = now + timedelta(seconds=retry_delay(email.attempts, retry_base))
+
+def process_outbox(app, worker_id=None, max_batches=None):
+    """Deliver due emails until none are left (or max_batches is reached)"""
+    worker_id = worker_id or uuid.uuid4().hex
+    config = app.config
+    transport = get_transport(app)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        emails = claim_batch(worker_id, config.get('MAIL_QUEUE_BATCH_SIZE', 20))
+        if not emails:
+            break
+        total += deliver_batch(
+            emails,
+            transport,
+            max_attempts=config.get('MAIL_QUEUE_MAX_ATTEMPTS', 5),
+            retry_base=config.get('MAIL_QUEUE_RETRY_BASE', 30)
+        )
+        batches += 1
+    return total
+
+class MailQueue:
+    """Background worker pool draining the email outbox; configure with init_app()"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._threads = []
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['mail_queue'] = self
+
+        if app.config.get('MAIL_QUEUE_AUTOSTART', False) and not app.testing:
+            # Start lazily so CLI commands (migrations, seeding) don't spawn workers
+            @app.before_request
+            def start_mail_workers():
+                if not self._threads:
+                    self.start()
+
+    def start(self, num_workers=None):
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            num_workers = num_workers or self.app.config.get('MAIL_QUEUE_WORKERS', 2)
+            for i in range(num_workers):
+                thread = threading.Thread(target=self._run, name=f'mail-queue-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        worker_id = f"{os.getpid()}-{threading.current_thread().name}-{uuid.uuid4().hex[:6]}"
+        poll_interval = self.app.config.get('MAIL_QUEUE_POLL_INTERVAL', 5)
+        while not self._stop.is_set():
+            sent = 0
+            try:
+                with self.app.app_context():
+                    sent = process_outbox(self.app, worker_id, max_batches=1)
+            except Exception as e:
+                logger.error(f"Mail queue worker error: {e}")
+            if not sent:
+                self._stop.wait(poll_interval)
+
+mail_queue = MailQueue()
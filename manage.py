@@ -1,6 +1,32 @@
 from flask.cli import FlaskGroup
 from app import create_app, db
-from models import User, Pilgrimage, Booking
+from models import (User, Pilgrimage, Booking, Review, TripPlan, ForumCategory, ForumPost, ForumComment,
+                    reconcile_rating_stats, reconcile_forum_stats)
+from search import rebuild_search_index
+from mail_queue import mail_queue, process_outbox
+from notifications import reconcile_unread_counts
+from receipts import export_receipts as export_receipt_files, receipt_storage_dir
+from itinerary import plan_itinerary, persist_itinerary
+from trip_loader import load_itinerary
+from forum import load_forum_index, category_posts, load_thread
+from listings import paginate_pilgrimages, get_featured_pilgrimages
+from query_plans import check_query_plans as run_query_plan_checks
+from db_engine import create_configured_engine
+from pagination import keyset_paginate
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from contextlib import contextmanager
+from collections import namedtuple
+from flask import current_app
+from datetime import datetime, date, timedelta
+import click
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
 cli = FlaskGroup(create_app=create_app)
 
@@ -9,6 +35,534 @@ def create_db():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    rebuild_search_index()
+
+@cli.command("reconcile_ratings")
+def reconcile_ratings():
+    """Backfill or repair the denormalized pilgrimage rating aggregates"""
+    corrected = reconcile_rating_stats()
+    print(f"Rating aggregates reconciled ({corrected} pilgrimages corrected).")
+
+@cli.command("reconcile_notifications")
+def reconcile_notifications():
+    """Backfill or repair the per-user unread notification counters"""
+    corrected = reconcile_unread_counts()
+    print(f"Unread notification counters reconciled ({corrected} users corrected).")
+
+@cli.command("reconcile_forum")
+def reconcile_forum():
+    """Backfill or repair the denormalized forum category post counts and last posts"""
+    corrected = reconcile_forum_stats()
+    print(f"Forum category stats reconciled ({corrected} categories corrected).")
+
+@cli.command("rebuild_search_index")
+def rebuild_search_index_command():
+    """Re-index every pilgrimage in the full-text search table"""
+    if rebuild_search_index():
+        print("Search index rebuilt.")
+    else:
+        print("Full-text search is not available on this database; using the ILIKE fallback.")
+
+@cli.command("flush_outbox")
+def flush_outbox():
+    """Deliver every queued email that is due, then exit"""
+    sent = process_outbox(current_app._get_current_object())
+    print(f"Sent {sent} queued emails.")
+
+@cli.command("mail_worker")
+def mail_worker():
+    """Run the mail queue workers in the foreground"""
+    mail_queue.start()
+    print("Mail queue workers running, press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mail_queue.stop()
+
+@cli.command("export_receipts")
+@click.option("--since", help="Only trips paid on or after this date (YYYY-MM-DD)")
+@click.option("--output", default="receipts_export", help="Directory to write the PDFs to")
+def export_receipts(since, output):
+    """Generate receipts for paid trips in bulk, e.g. for an accounting export"""
+    query = TripPlan.query.filter(TripPlan.payment_date.isnot(None)).order_by(TripPlan.payment_date)
+    if since:
+        query = query.filter(TripPlan.payment_date >= datetime.strptime(since, '%Y-%m-%d'))
+    exported = export_receipt_files(query.yield_per(100), receipt_storage_dir(current_app), output)
+    print(f"Exported {len(exported)} receipts to {output}.")
+
+BenchAttraction = namedtuple('BenchAttraction', 'id popularity latitude longitude visit_duration opening_hours')
+
+@cli.command("bench_itinerary")
+@click.option("--repeat", default=20, help="Planning runs per trip length")
+def bench_itinerary(repeat):
+    """Time itinerary planning and persistence for 30, 90 and 365-day trips"""
+    start = date(2026, 1, 1)
+    for num_days in (30, 90, 365):
+        attractions = [
+            BenchAttraction(i, i % 10 + 1, 31.6 + (i % 17) * 0.001, 74.9 + (i % 23) * 0.001, 60, "08:00 - 18:00")
+            for i in range(1, num_days * 4 + 1)
+        ]
+        end = start + timedelta(days=num_days - 1)
+
+        began = time.perf_counter()
+        for _ in range(repeat):
+            days = plan_itinerary(start, end, attractions, 'Benchmark', 'standard', 'private')
+        plan_ms = (time.perf_counter() - began) * 1000 / repeat
+
+        # Persist into a throwaway trip id and roll back so no data is kept
+        began = time.perf_counter()
+        persist_itinerary(-1, days)
+        db.session.flush()
+        persist_ms = (time.perf_counter() - began) * 1000
+        db.session.rollback()
+
+        rows = sum(len(day['attractions']) for day in days)
+        print(f"{num_days:>4} days, {rows:>5} attraction rows: plan {plan_ms:8.2f} ms, persist {persist_ms:8.2f} ms")
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed inside the block"""
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+# Loading a trip's itinerary must not scale with the number of days
+ITINERARY_LOAD_MAX_QUERIES = 2
+
+@cli.command("check_itinerary_queries")
+@click.option("--limit", default=50, help="Number of trips to check")
+def check_itinerary_queries(limit):
+    """Fail if loading a stored itinerary issues more than a fixed number of queries"""
+    failures = 0
+    for trip_id, in db.session.query(TripPlan.id).order_by(TripPlan.id.desc()).limit(limit).all():
+        db.session.expire_all()
+        with count_queries() as statements:
+            days = load_itinerary(trip_id)
+            for day in days:
+                for stop in day.schedule:
+                    stop.attraction.name
+        if len(statements) > ITINERARY_LOAD_MAX_QUERIES:
+            failures += 1
+            print(f"Trip {trip_id}: {len(days)} days loaded with {len(statements)} queries")
+    if failures:
+        raise SystemExit(1)
+    print(f"Itinerary loading stays within {ITINERARY_LOAD_MAX_QUERIES} queries.")
+
+# Catalog cards come from denormalized columns, so page size must not change the statement count
+LISTING_MAX_QUERIES = 2
+LISTING_PAGE_SIZES = (9, 30, 100)
+
+@cli.command("check_listing_queries")
+@click.option("--pilgrimages", default=250, help="Scratch pilgrimages to add so every page size fills up")
+def check_listing_queries(pilgrimages):
+    """Fail if listing pages issue more statements for larger page sizes.
+    
+    Scratch pilgrimages are added inside a transaction that is rolled back
+    afterwards.
+    """
+    db.session.add_all([
+        Pilgrimage(name=f"Listing check {i}", location="Nowhere", description="...", featured=i % 3 == 0)
+        for i in range(pilgrimages)
+    ])
+    db.session.flush()
+
+    counts = {}
+    try:
+        for per_page in LISTING_PAGE_SIZES:
+            db.session.expire_all()
+            with count_queries() as statements:
+                first = paginate_pilgrimages(page=1, per_page=per_page)
+                [row.to_dict() for row in first.items]
+            counts[("catalog page 1", per_page)] = len(statements)
+
+            with count_queries() as statements:
+                [row.to_dict() for row in paginate_pilgrimages(per_page=per_page, cursor=first.next_cursor).items]
+            counts[("catalog page 2 (cursor)", per_page)] = len(statements)
+
+            with count_queries() as statements:
+                [row.to_dict() for row in get_featured_pilgrimages(limit=per_page)]
+            counts[("featured", per_page)] = len(statements)
+    finally:
+        db.session.rollback()
+
+    failures = 0
+    for name in dict.fromkeys(name for name, _ in counts):
+        by_size = [counts[(name, per_page)] for per_page in LISTING_PAGE_SIZES]
+        failed = len(set(by_size)) > 1 or max(by_size) > LISTING_MAX_QUERIES
+        sizes = ", ".join(f"{per_page}: {count}" for per_page, count in zip(LISTING_PAGE_SIZES, by_size))
+        print(f"{'FAIL' if failed else 'ok':4} {name}: queries per page size {sizes}")
+        failures += failed
+    if failures:
+        raise SystemExit(1)
+    print(f"Listing pages issue the same number of queries (at most {LISTING_MAX_QUERIES}) for every page size.")
+
+# Forum pages must not scale with the number of categories, posts or comments
+FORUM_PAGE_MAX_QUERIES = 2
+
+@cli.command("check_forum_queries")
+@click.option("--posts", default=3000, help="Scratch posts to add across the categories")
+@click.option("--comments", default=2000, help="Scratch comments to add to one thread")
+def check_forum_queries(posts, comments):
+    """Fail if the forum index, a category page or a thread page issues more than a fixed number of queries.
+    
+    Scratch users, categories, posts and comments are added inside a
+    transaction that is rolled back afterwards.
+    """
+    users = [User(username=f"forum-check-{i}", email=f"forum-check-{i}@example.com") for i in range(20)]
+    categories = [ForumCategory(name=f"Forum check {i}") for i in range(8)]
+    db.session.add_all(users + categories)
+    db.session.flush()
+
+    began = datetime.utcnow()
+    thread_posts = [
+        ForumPost(title=f"Post {i}", content="...", author=users[i % len(users)],
+                  category=categories[i % len(categories)], created_at=began + timedelta(seconds=i // 3))
+        for i in range(posts)
+    ]
+    db.session.add_all(thread_posts)
+    db.session.flush()
+    thread = thread_posts[-1]
+    thread_id, category_id = thread.id, categories[0].id
+    db.session.add_all([
+        ForumComment(content=f"Comment {i}", author=users[i % len(users)], post=thread,
+                     created_at=began + timedelta(seconds=i // 3))
+        for i in range(comments)
+    ])
+    db.session.flush()
+
+    def render_index():
+        index, recent = load_forum_index()
+        for category in index:
+            category.post_count
+            if category.last_post:
+                category.last_post.author.username
+        for post in recent:
+            post.author.username, post.category.name
+
+    def render_category(page):
+        for post in page.items:
+            post.author.username
+
+    def render_thread(post, page):
+        post.author.username, post.category.name
+        for comment in page.items:
+            comment.author.username
+
+    checks = []
+    try:
+        db.session.expire_all()
+        with count_queries() as statements:
+            render_index()
+        checks.append(("forum index", statements))
+
+        category = db.session.get(ForumCategory, category_id)
+        db.session.expire_all()
+        with count_queries() as statements:
+            first = category_posts(category)
+            render_category(first)
+        checks.append(("category page 1", statements))
+
+        db.session.expire_all()
+        with count_queries() as statements:
+            render_category(category_posts(category, cursor=first.next_cursor))
+        checks.append(("category page 2 (cursor)", statements))
+
+        db.session.expire_all()
+        with count_queries() as statements:
+            post, page = load_thread(thread_id)
+            render_thread(post, page)
+        checks.append(("thread page 1", statements))
+
+        db.session.expire_all()
+        with count_queries() as statements:
+            post, page = load_thread(thread_id, cursor=page.next_cursor)
+            render_thread(post, page)
+        checks.append(("thread page 2 (cursor)", statements))
+    finally:
+        db.session.rollback()
+
+    failures = 0
+    for name, statements in checks:
+        status = "FAIL" if len(statements) > FORUM_PAGE_MAX_QUERIES else "ok"
+        print(f"{status:4} {name}: {len(statements)} queries")
+        failures += status == "FAIL"
+    if failures:
+        raise SystemExit(1)
+    print(f"Forum pages stay within {FORUM_PAGE_MAX_QUERIES} queries with {posts} posts and {comments} comments.")
+
+@cli.command("check_query_plans")
+def check_query_plans():
+    """Fail if a hot-path query no longer searches an index (SQLite only)"""
+    results = run_query_plan_checks()
+    if results is None:
+        print("Query plan checks only run against SQLite.")
+        return
+    
+    failed = 0
+    for check, plan, problems in results:
+        status = "FAIL" if problems else "ok"
+        print(f"{status:4} {check.name}")
+        for step in plan:
+            print(f"       {step}")
+        for problem in problems:
+            print(f"       -> {problem}")
+        failed += bool(problems)
+    
+    if failed:
+        print(f"{failed} of {len(results)} hot-path queries regressed.")
+        raise SystemExit(1)
+    print(f"All {len(results)} hot-path queries use an index.")
+
+# Run in a separate process, so none of this process's cache invalidation sees the write
+_OUTSIDE_WRITE = """
+from app import create_app
+from extensions import db
+from models import Pilgrimage, TravelTip
+app = create_app()
+with app.app_context():
+    pilgrimage = db.session.get(Pilgrimage, {id})
+    pilgrimage.name = 'Renamed elsewhere'
+    db.session.add(TravelTip(pilgrimage_id=pilgrimage.id, title='Added elsewhere', content='...'))
+    db.session.commit()
+"""
+
+@cli.command("check_http_cache")
+def check_http_cache():
+    """Fail if a cached API response outlives a write committed by another process.
+    
+    Runs a scratch app with the per-process LRU cache on a temporary SQLite
+    file, warms the cache, changes the database from a separate Python
+    process and then revalidates with the ETags it got before.
+    """
+    from config import Config
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'http_cache.db')}"
+
+        class ScratchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = url
+            TESTING = True
+            CACHE_BACKEND = 'lru'
+            CACHE_ENABLED = True
+
+        app = create_app(ScratchConfig)
+        with app.app_context():
+            pilgrimage = Pilgrimage(name="Before", location="Nowhere", description="...")
+            db.session.add(pilgrimage)
+            db.session.commit()
+            paths = {'/api/pilgrimages': 'Renamed elsewhere',
+                     f'/api/pilgrimages/{pilgrimage.id}/tips': 'Added elsewhere'}
+            script = _OUTSIDE_WRITE.format(id=pilgrimage.id)
+
+        client = app.test_client()
+        etags = {}
+        for path in paths:
+            client.get(path)
+            response = client.get(path)
+            if response.headers.get('X-Cache') != 'HIT':
+                print(f"FAIL {path}: second GET was not served from the cache")
+                raise SystemExit(1)
+            etags[path] = response.headers['ETag']
+
+        result = subprocess.run([sys.executable, '-c', script], cwd=app.root_path, capture_output=True, text=True,
+                                env={**os.environ, 'DATABASE_URL': url})
+        if result.returncode:
+            print(result.stderr)
+            raise SystemExit(1)
+
+        failures = 0
+        for path, expected in paths.items():
+            response = client.get(path, headers={'If-None-Match': etags[path]})
+            problems = []
+            if response.status_code != 200:
+                problems.append(f"status {response.status_code} for the old ETag")
+            elif expected not in response.get_data(as_text=True):
+                problems.append(f"body served from {response.headers.get('X-Cache')} misses the outside write")
+            elif client.get(path, headers={'If-None-Match': response.headers['ETag']}).status_code != 304:
+                problems.append("the new ETag does not revalidate")
+            print(f"{'FAIL' if problems else 'ok':4} {path}")
+            for problem in problems:
+                print(f"       -> {problem}")
+            failures += bool(problems)
+        if failures:
+            raise SystemExit(1)
+        print("Cached API responses follow writes made by other processes.")
+
+def _contention_worker(engine, statements, deadline, stats, lock):
+    """Run statements in one transaction per iteration until deadline, recording latencies and lock errors"""
+    latencies, errors, i = [], 0, 0
+    while time.monotonic() < deadline:
+        i += 1
+        began = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                for sql, params in statements(i):
+                    result = connection.execute(text(sql), params)
+                    if result.returns_rows:
+                        result.fetchall()
+            latencies.append(time.perf_counter() - began)
+        except OperationalError:
+            errors += 1
+    with lock:
+        stats['latencies'] += latencies
+        stats['errors'] += errors
+
+def _run_contention(engine, writers, readers, seconds, trips=100):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE bench_trip (id INTEGER PRIMARY KEY, status TEXT, paid_total REAL)"))
+        connection.execute(text("CREATE TABLE bench_payment (id INTEGER PRIMARY KEY, trip_id INTEGER, amount REAL)"))
+        connection.execute(text("CREATE INDEX ix_bench_payment_trip ON bench_payment (trip_id)"))
+        connection.execute(text("INSERT INTO bench_trip (id, status, paid_total) VALUES (:id, 'pending', 0)"),
+                           [{'id': i} for i in range(1, trips + 1)])
+
+    # A payment: read the trip, record the payment, update the trip
+    def payment(i):
+        trip = {'trip': i % trips + 1}
+        return [
+            ("SELECT status FROM bench_trip WHERE id = :trip", trip),
+            ("INSERT INTO bench_payment (trip_id, amount) VALUES (:trip, 100.0)", trip),
+            ("UPDATE bench_trip SET status = 'paid', paid_total = paid_total + 100.0 WHERE id = :trip", trip),
+        ]
+
+    # A page view: the trip and its payments
+    def page(i):
+        trip = {'trip': i % trips + 1}
+        return [
+            ("SELECT * FROM bench_trip WHERE id = :trip", trip),
+            ("SELECT COUNT(*), SUM(amount) FROM bench_payment WHERE trip_id = :trip", trip),
+        ]
+
+    lock = threading.Lock()
+    results = {'write': {'latencies': [], 'errors': 0}, 'read': {'latencies': [], 'errors': 0}}
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=_contention_worker, args=(engine, payment, deadline, results['write'], lock))
+               for _ in range(writers)]
+    threads += [threading.Thread(target=_contention_worker, args=(engine, page, deadline, results['read'], lock))
+                for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+@cli.command("bench_db_contention")
+@click.option("--writers", default=4, help="Threads running payment-style write transactions")
+@click.option("--readers", default=8, help="Threads running page-style reads")
+@click.option("--seconds", default=5.0, help="Duration of each run")
+@click.option("--profile", "profiles", multiple=True, help="Engine profiles to compare, or baseline for SQLAlchemy defaults")
+def bench_db_contention(writers, readers, seconds, profiles):
+    """Concurrent write/read throughput on a scratch SQLite file, per engine profile"""
+    profiles = profiles or ('baseline', 'development', 'production')
+    for profile in profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            uri = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+            # baseline: SQLAlchemy defaults, as before engine profiles existed
+            engine = create_engine(uri) if profile == 'baseline' else create_configured_engine(uri, profile)
+            try:
+                results = _run_contention(engine, writers, readers, seconds)
+            finally:
+                engine.dispose()
+
+        print(f"{profile}:")
+        for kind in ('write', 'read'):
+            stats = results[kind]
+            done = len(stats['latencies'])
+            print(f"  {kind:5} {done / seconds:9.1f} tx/s  p50 {_percentile(stats['latencies'], 0.5) * 1000:7.2f} ms"
+                  f"  p95 {_percentile(stats['latencies'], 0.95) * 1000:7.2f} ms  locked errors {stats['errors']}")
+
+def _median_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - began)
+    return sorted(timings)[len(timings) // 2]
+
+@cli.command("bench_review_pagination")
+@click.option("--reviews", default=1000000, help="Reviews of the benchmarked pilgrimage")
+@click.option("--per-page", default=20, help="Reviews per page")
+@click.option("--repeat", default=5, help="Timed runs per measurement (the median is reported)")
+def bench_review_pagination(reviews, per_page, repeat):
+    """OFFSET vs keyset page latency and COUNT cost over a scratch SQLite database of N reviews"""
+    from api import REVIEW_KEYSET
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_configured_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", 'production')
+        try:
+            db.metadata.create_all(engine, tables=[User.__table__, Pilgrimage.__table__, Review.__table__])
+            began = time.perf_counter()
+            with engine.begin() as connection:
+                connection.execute(text("INSERT INTO user (id, username, email, unread_notifications) "
+                                        "VALUES (1, 'bench', 'bench@example.com', 0)"))
+                connection.execute(text("INSERT INTO pilgrimage (id, name, location, description) "
+                                        "VALUES (1, 'Bench', 'Bench', 'Bench')"))
+                # Two reviews per second, so the id tie-breaker is exercised
+                connection.execute(text("""
+                    WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :reviews)
+                    INSERT INTO review (user_id, pilgrimage_id, rating, comment, created_at, helpful_votes)
+                    SELECT 1, 1, 1 + n % 5, 'Review ' || n,
+                           strftime('%Y-%m-%d %H:%M:%S', 1577836800 + n / 2, 'unixepoch') || '.000000', 0
+                    FROM seq
+                """), {'reviews': reviews})
+                connection.execute(text("UPDATE pilgrimage SET rating_count = :reviews WHERE id = 1"), {'reviews': reviews})
+                connection.execute(text("ANALYZE"))
+            print(f"Seeded {reviews} reviews in {time.perf_counter() - began:.1f}s")
+
+            with Session(engine) as session:
+                query = session.query(Review).filter(Review.pilgrimage_id == 1)
+                last_page = max((reviews + per_page - 1) // per_page, 1)
+                depths = sorted({p for p in (1, 10, 100, 1000, 10000, 25000, last_page) if p <= last_page})
+
+                print(f"{'page':>8}  {'OFFSET':>10}  {'keyset':>10}")
+                for page in depths:
+                    offset = _median_time(lambda: keyset_paginate(query, REVIEW_KEYSET, page=page, per_page=per_page),
+                                          repeat)
+                    # The cursor a reader on the previous page would follow
+                    cursor = (keyset_paginate(query, REVIEW_KEYSET, page=page - 1, per_page=per_page).next_cursor
+                              if page > 1 else None)
+                    keyset = _median_time(lambda: keyset_paginate(query, REVIEW_KEYSET, cursor=cursor, page=page,
+                                                                  per_page=per_page), repeat)
+                    print(f"{page:>8}  {offset * 1000:>8.2f}ms  {keyset * 1000:>8.2f}ms")
+                    session.expunge_all()
+
+                print("totals:")
+                for label, total in (('COUNT(*)', 'exact'), ('capped estimate', 'estimate'), ('rating_count', reviews)):
+                    elapsed = _median_time(lambda: keyset_paginate(query, REVIEW_KEYSET, per_page=per_page, total=total),
+                                           repeat)
+                    print(f"  page 1 + {label:<16} {elapsed * 1000:8.2f}ms")
+        finally:
+            engine.dispose()
+
+@cli.command("sync_replica")
+def sync_replica():
+    """Copy the primary SQLite database into DATABASE_REPLICA_URL, for trying replica reads locally"""
+    replica = current_app.extensions.get('db_replica')
+    if replica is None:
+        print("DATABASE_REPLICA_URL is not set.")
+        raise SystemExit(1)
+    if db.engine.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        print("sync_replica only copies SQLite files; use the database's own replication elsewhere.")
+        raise SystemExit(1)
+
+    # SQLite's online backup copies a consistent snapshot while the app keeps running
+    source = db.engine.raw_connection()
+    target = replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
+    print(f"Copied {db.engine.url.database} to {replica.url.database}.")
 
 if __name__ == "__main__":
-    cli()
\ No newline at end of file
+    cli()
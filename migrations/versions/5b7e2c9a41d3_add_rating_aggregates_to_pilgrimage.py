@@ -0,0 +1,43 @@
+"""Add denormalized rating aggregates to pilgrimage
+
+Revision ID: 5b7e2c9a41d3
+Revises: c11d970bf810
+Create Date: 2026-10-17 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c9a41d3'
+down_revision = 'c11d970bf810'
+branch_labels = None
+depends_on = None
+
+
+RATING_COLUMNS = ('rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
+
+def upgrade():
+    with op.batch_alter_table('pilgrimage', schema=None) as batch_op:
+        for name in RATING_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing reviews; `flask reconcile_ratings` does the same at runtime
+    op.execute("""
+        UPDATE pilgrimage SET
+            rating_count = (SELECT COUNT(*) FROM review WHERE review.pilgrimage_id = pilgrimage.id),
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM review WHERE review.pilgrimage_id = pilgrimage.id),
+            rating_1 = (SELECT COUNT(*) FROM review WHERE review.pilgrimage_id = pilgrimage.id AND rating <= 1),
+            rating_2 = (SELECT COUNT(*) FROM review WHERE review.pilgrimage_id = pilgrimage.id AND rating = 2),
+            rating_3 = (SELECT COUNT(*) FROM review WHERE review.pilgrimage_id = pilgrimage.id AND rating = 3),
+            rating_4 = (SELECT COUNT(*) FROM review WHERE review.pilgrimage_id = pilgrimage.id AND rating = 4),
+            rating_5 = (SELECT COUNT(*) FROM review WHERE review.pilgrimage_id = pilgrimage.id AND rating >= 5)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('pilgrimage', schema=None) as batch_op:
+        for name in reversed(RATING_COLUMNS):
+            batch_op.drop_column(name)
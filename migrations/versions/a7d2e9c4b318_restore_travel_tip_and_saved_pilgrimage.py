@@ -0,0 +1,62 @@
+"""Restore travel_tip and saved_pilgrimage tables used by the API
+
+Revision ID: a7d2e9c4b318
+Revises: f3a8c6b1d924
+Create Date: 2026-10-17 18:42:05.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2e9c4b318'
+down_revision = 'f3a8c6b1d924'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    # create_app() runs db.create_all() before Alembic, so a new table may already be there, indexes included
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    # Both tables were dropped by c11d970bf810 while their models were missing
+    if not _has_table('travel_tip'):
+        op.create_table('travel_tip',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('pilgrimage_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['pilgrimage_id'], ['pilgrimage.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('travel_tip', schema=None) as batch_op:
+            batch_op.create_index('ix_travel_tip_pilgrimage', ['pilgrimage_id'], unique=False)
+
+    if not _has_table('saved_pilgrimage'):
+        op.create_table('saved_pilgrimage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('pilgrimage_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['pilgrimage_id'], ['pilgrimage.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('saved_pilgrimage', schema=None) as batch_op:
+            batch_op.create_index('ix_saved_pilgrimage_user_pilgrimage', ['user_id', 'pilgrimage_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('saved_pilgrimage', schema=None) as batch_op:
+        batch_op.drop_index('ix_saved_pilgrimage_user_pilgrimage')
+
+    op.drop_table('saved_pilgrimage')
+    with op.batch_alter_table('travel_tip', schema=None) as batch_op:
+        batch_op.drop_index('ix_travel_tip_pilgrimage')
+
+    op.drop_table('travel_tip')
@@ -0,0 +1,30 @@
+"""Make notification.read NOT NULL, defaulting to unread
+
+Revision ID: b6e3d1f8a092
+Revises: d8b3f1e6a524
+Create Date: 2026-10-17 23:41:18.305627
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e3d1f8a092'
+down_revision = 'd8b3f1e6a524'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases that ran e5c1a9d3f702 before it normalized NULLs still have some; their
+    # unread counters already include them, so they become unread (0) here
+    op.execute("UPDATE notification SET read = 0 WHERE read IS NULL")
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.alter_column('read', existing_type=sa.Boolean(), nullable=False, server_default=sa.false())
+
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.alter_column('read', existing_type=sa.Boolean(), nullable=True, server_default=None)
@@ -0,0 +1,44 @@
+"""Add updated_at to pilgrimage and travel_tip for HTTP validators
+
+Revision ID: c4f7b2a9e615
+Revises: a7d2e9c4b318
+Create Date: 2026-10-17 20:16:48.905127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f7b2a9e615'
+down_revision = 'a7d2e9c4b318'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    # travel_tip may have been created by db.create_all() with updated_at already in place
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    with op.batch_alter_table('pilgrimage', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_pilgrimage_updated_at', ['updated_at'], unique=False)
+
+    if not _has_column('travel_tip', 'updated_at'):
+        with op.batch_alter_table('travel_tip', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Rows without a timestamp would never get an ETag
+    op.execute("UPDATE pilgrimage SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+    op.execute("UPDATE travel_tip SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    with op.batch_alter_table('travel_tip', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('pilgrimage', schema=None) as batch_op:
+        batch_op.drop_index('ix_pilgrimage_updated_at')
+        batch_op.drop_column('updated_at')
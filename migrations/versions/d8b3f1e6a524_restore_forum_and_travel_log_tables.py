@@ -0,0 +1,101 @@
+"""Restore forum and travel log tables, with denormalized category stats
+
+Revision ID: d8b3f1e6a524
+Revises: c4f7b2a9e615
+Create Date: 2026-10-17 22:05:37.614290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8b3f1e6a524'
+down_revision = 'c4f7b2a9e615'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    # create_app() runs db.create_all() before Alembic, so a new table may already be there, indexes included
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    # All four were dropped by c11d970bf810 while their models were missing
+    if not _has_table('forum_category'):
+        op.create_table('forum_category',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('icon', sa.String(length=50), nullable=True),
+        sa.Column('post_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_post_id', sa.Integer(), nullable=True),
+        sa.Column('last_post_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if not _has_table('forum_post'):
+        op.create_table('forum_post',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('views', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['forum_category.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('forum_post', schema=None) as batch_op:
+            batch_op.create_index('ix_forum_post_category_created', ['category_id', 'created_at'], unique=False)
+            batch_op.create_index('ix_forum_post_created', ['created_at'], unique=False)
+
+    if not _has_table('forum_comment'):
+        op.create_table('forum_comment',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['post_id'], ['forum_post.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('forum_comment', schema=None) as batch_op:
+            batch_op.create_index('ix_forum_comment_post_created', ['post_id', 'created_at'], unique=False)
+
+    if not _has_table('travel_log'):
+        op.create_table('travel_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('location', sa.String(length=100), nullable=True),
+        sa.Column('images', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('is_public', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('travel_log', schema=None) as batch_op:
+            batch_op.create_index('ix_travel_log_public_created', ['is_public', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('travel_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_travel_log_public_created')
+
+    op.drop_table('travel_log')
+    with op.batch_alter_table('forum_comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_forum_comment_post_created')
+
+    op.drop_table('forum_comment')
+    with op.batch_alter_table('forum_post', schema=None) as batch_op:
+        batch_op.drop_index('ix_forum_post_created')
+        batch_op.drop_index('ix_forum_post_category_created')
+
+    op.drop_table('forum_post')
+    op.drop_table('forum_category')
@@ -0,0 +1,43 @@
+"""Add unread notification counter to user and composite notification index
+
+Revision ID: e5c1a9d3f702
+Revises: b2f6d8e4a137
+Create Date: 2026-10-17 15:08:12.640913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c1a9d3f702'
+down_revision = 'b2f6d8e4a137'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_read_created', ['user_id', 'read', 'created_at'], unique=False)
+
+    # Legacy rows without a read flag are unread; normalize them so every query can test read = 0
+    op.execute("UPDATE notification SET read = 0 WHERE read IS NULL")
+
+    # Backfill from existing notifications; `flask reconcile_notifications` does the same at runtime
+    op.execute("""
+        UPDATE "user" SET unread_notifications = (
+            SELECT COUNT(*) FROM notification
+            WHERE notification.user_id = "user".id AND notification.read = 0
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_user_read_created')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
@@ -1,9 +1,54 @@
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
+from sqlalchemy import case, event, inspect, or_, select
 from datetime import datetime
 import json
 
+RATING_BUCKETS = (1, 2, 3, 4, 5)
+
+# Compact itinerary snapshot stored on TripPlan.itinerary:
+# {"v": 2, "days": [[<DAY_FIELDS...>, [[<STOP_FIELDS...>], ...]], ...]}
+ITINERARY_SNAPSHOT_VERSION = 2
+ITINERARY_DAY_FIELDS = ('day_number', 'date', 'title', 'description', 'accommodation', 'transportation', 'meal_plan')
+ITINERARY_STOP_FIELDS = ('id', 'name', 'start_time', 'duration', 'notes')
+
+def pack_itinerary(days):
+    """Compact, versioned form of a list of day dicts, ready for JSON encoding"""
+    return {
+        'v': ITINERARY_SNAPSHOT_VERSION,
+        'days': [
+            [day[field] for field in ITINERARY_DAY_FIELDS]
+            + [[[stop[field] for field in ITINERARY_STOP_FIELDS] for stop in day['attractions']]]
+            for day in days
+        ]
+    }
+
+def unpack_itinerary(text):
+    """Parse a stored itinerary into a list of day dicts.
+
+    Reads the compact v2 format as well as the older list-of-dicts format.
+    Anything else, including the old {"applied_deal": ...} blobs, yields [].
+    """
+    if not text:
+        return []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    if isinstance(data, list):
+        return data
+    if not isinstance(data, dict) or data.get('v') != ITINERARY_SNAPSHOT_VERSION:
+        return []
+
+    days = []
+    num_fields = len(ITINERARY_DAY_FIELDS)
+    for row in data['days']:
+        day = dict(zip(ITINERARY_DAY_FIELDS, row[:num_fields]))
+        day['attractions'] = [dict(zip(ITINERARY_STOP_FIELDS, stop)) for stop in row[num_fields]]
+        days.append(day)
+    return days
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
@@ -17,12 +62,19 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Maintained by notifications.py and the Notification listeners below
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     bookings = db.relationship('Booking', backref='user', lazy='dynamic')
     trip_plans = db.relationship('TripPlan', backref='user', lazy='dynamic')
     reviews = db.relationship('Review', backref='author', lazy='dynamic')
     notifications = db.relationship('Notification', backref='user', lazy='dynamic')
     refund_requests = db.relationship('RefundRequest', backref='user', lazy='dynamic')
+    saved_pilgrimages = db.relationship('SavedPilgrimage', backref='user', lazy='dynamic')
+    forum_posts = db.relationship('ForumPost', backref='author', lazy='dynamic')
+    forum_comments = db.relationship('ForumComment', backref='author', lazy='dynamic')
+    travel_logs = db.relationship('TravelLog', backref='author', lazy='dynamic')
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -31,7 +83,7 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
     
     def get_unread_notifications_count(self):
-        return Notification.query.filter_by(user_id=self.id, read=False).count()
+        return self.unread_notifications or 0
 
 class Pilgrimage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -48,6 +100,17 @@ class Pilgrimage(db.Model):
     difficulty_level = db.Column(db.String(20), default='moderate')
     featured = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Also bumped by review changes; the HTTP validator of catalog pages (see http_cache.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Denormalized review aggregates, maintained by the Review listeners below
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     bookings = db.relationship('Booking', backref='pilgrimage', lazy='dynamic')
@@ -55,13 +118,28 @@ class Pilgrimage(db.Model):
     reviews = db.relationship('Review', backref='pilgrimage', lazy='dynamic')
     attractions = db.relationship('Attraction', backref='pilgrimage', lazy='dynamic')
     deals = db.relationship('Deal', backref='pilgrimage', lazy='dynamic')
+    travel_tips = db.relationship('TravelTip', backref='pilgrimage', lazy='dynamic')
+    saved_by = db.relationship('SavedPilgrimage', backref='pilgrimage', lazy='dynamic')
+    
+    __table_args__ = (
+        db.Index('ix_pilgrimage_featured', 'featured'),
+        db.Index('ix_pilgrimage_updated_at', 'updated_at'),
+    )
     
     @property
     def average_rating(self):
-        reviews = Review.query.filter_by(pilgrimage_id=self.id).all()
-        if not reviews:
+        if not self.rating_count:
             return 0
-        return sum(review.rating for review in reviews) / len(reviews)
+        return self.rating_sum / self.rating_count
+    
+    @property
+    def reviews_count(self):
+        return self.rating_count or 0
+    
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star rating, keyed 1-5"""
+        return {stars: getattr(self, f'rating_{stars}') or 0 for stars in RATING_BUCKETS}
     
     @property
     def gallery_images(self):
@@ -79,6 +157,10 @@ class Booking(db.Model):
     travel_date = db.Column(db.Date, nullable=False)
     special_requirements = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_booking_user_travel_date', 'user_id', 'travel_date'),
+    )
 
 class TripPlan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -99,6 +181,7 @@ class TripPlan(db.Model):
     payment_id = db.Column(db.String(100))
     status = db.Column(db.String(20), default='planned')  # planned, ongoing, completed, cancelled
     itinerary = db.Column(db.Text)  # JSON string of daily activities
+    itinerary_hash = db.Column(db.String(64))  # sha256 of itinerary, to skip unchanged saves
     
     # Payment fields
     payment_method = db.Column(db.String(50))
@@ -118,15 +201,26 @@ class TripPlan(db.Model):
     # Relationships
     daily_plans = db.relationship('DailyPlan', backref='trip', lazy='dynamic', cascade='all, delete-orphan')
     refund_requests = db.relationship('RefundRequest', backref='trip', lazy='dynamic')
+    applied_deals = db.relationship('AppliedDeal', backref='trip', lazy='dynamic', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_trip_plan_user_start_date', 'user_id', 'start_date'),
+    )
     
     @property
     def itinerary_days(self):
-        if not self.itinerary:
-            return []
-        try:
-            return json.loads(self.itinerary)
-        except:
-            return []
+        """Parsed itinerary, memoized on the instance until the column changes"""
+        cached = self.__dict__.get('_itinerary_cache')
+        if cached is not None and cached[0] is self.itinerary:
+            return cached[1]
+        days = unpack_itinerary(self.itinerary)
+        self._itinerary_cache = (self.itinerary, days)
+        return days
+    
+    @property
+    def applied_deal(self):
+        """Most recently applied deal, or None"""
+        return self.applied_deals.order_by(AppliedDeal.applied_at.desc(), AppliedDeal.id.desc()).first()
 
 class Review(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -138,6 +232,11 @@ class Review(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     helpful_votes = db.Column(db.Integer, default=0)
     
+    __table_args__ = (
+        db.Index('ix_review_pilgrimage_created', 'pilgrimage_id', 'created_at'),
+        db.Index('ix_review_user_pilgrimage', 'user_id', 'pilgrimage_id'),
+    )
+    
     @property
     def review_images(self):
         if not self.images:
@@ -147,14 +246,166 @@ class Review(db.Model):
         except:
             return []
 
+def _rating_bucket(rating):
+    """Clamp a review rating into one of the histogram buckets"""
+    return min(max(int(rating or 0), RATING_BUCKETS[0]), RATING_BUCKETS[-1])
+
+def _apply_rating_delta(connection, pilgrimage_id, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one review from a pilgrimage's aggregates (also bumps updated_at)"""
+    table = Pilgrimage.__table__
+    bucket = table.c[f'rating_{_rating_bucket(rating)}']
+    connection.execute(
+        table.update()
+        .where(table.c.id == pilgrimage_id)
+        .values({
+            table.c.rating_count: table.c.rating_count + sign,
+            table.c.rating_sum: table.c.rating_sum + sign * int(rating or 0),
+            bucket: bucket + sign
+        })
+    )
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    _apply_rating_delta(connection, review.pilgrimage_id, review.rating, 1)
+
+@event.listens_for(Review, 'after_delete')
+def _review_deleted(mapper, connection, review):
+    _apply_rating_delta(connection, review.pilgrimage_id, review.rating, -1)
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    state = inspect(review)
+    rating_history = state.attrs.rating.history
+    pilgrimage_history = state.attrs.pilgrimage_id.history
+    if not rating_history.has_changes() and not pilgrimage_history.has_changes():
+        # Other edits change no aggregate but still change the pilgrimage page
+        table = Pilgrimage.__table__
+        connection.execute(table.update().where(table.c.id == review.pilgrimage_id).values(updated_at=datetime.utcnow()))
+        return
+    
+    old_rating = rating_history.deleted[0] if rating_history.deleted else review.rating
+    old_pilgrimage_id = pilgrimage_history.deleted[0] if pilgrimage_history.deleted else review.pilgrimage_id
+    _apply_rating_delta(connection, old_pilgrimage_id, old_rating, -1)
+    _apply_rating_delta(connection, review.pilgrimage_id, review.rating, 1)
+
+def reconcile_rating_stats():
+    """Recompute every pilgrimage's rating aggregates from the review table.
+    
+    Used to backfill the denormalized columns and to repair drift caused by
+    bulk operations that bypass the ORM listeners. Returns the number of
+    pilgrimages whose stored aggregates were corrected.
+    """
+    def in_bucket(stars):
+        if stars == RATING_BUCKETS[0]:
+            return Review.rating <= stars
+        if stars == RATING_BUCKETS[-1]:
+            return Review.rating >= stars
+        return Review.rating == stars
+    
+    bucket_columns = [
+        db.func.sum(case((in_bucket(stars), 1), else_=0))
+        for stars in RATING_BUCKETS
+    ]
+    rows = db.session.query(
+        Review.pilgrimage_id,
+        db.func.count(Review.id),
+        db.func.coalesce(db.func.sum(Review.rating), 0),
+        *bucket_columns
+    ).group_by(Review.pilgrimage_id).all()
+    actual = {row[0]: tuple(int(value or 0) for value in row[1:]) for row in rows}
+    
+    corrected = 0
+    empty = (0,) * (2 + len(RATING_BUCKETS))
+    for pilgrimage in Pilgrimage.query.all():
+        stats = actual.get(pilgrimage.id, empty)
+        stored = (pilgrimage.rating_count, pilgrimage.rating_sum) + tuple(
+            getattr(pilgrimage, f'rating_{stars}') for stars in RATING_BUCKETS
+        )
+        if stored == stats:
+            continue
+        pilgrimage.rating_count, pilgrimage.rating_sum = stats[0], stats[1]
+        for stars, value in zip(RATING_BUCKETS, stats[2:]):
+            setattr(pilgrimage, f'rating_{stars}', value)
+        corrected += 1
+    
+    db.session.commit()
+    return corrected
+
+class TravelTip(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    pilgrimage_id = db.Column(db.Integer, db.ForeignKey('pilgrimage.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    category = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_travel_tip_pilgrimage', 'pilgrimage_id'),
+    )
+
+class SavedPilgrimage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    pilgrimage_id = db.Column(db.Integer, db.ForeignKey('pilgrimage.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_saved_pilgrimage_user_pilgrimage', 'user_id', 'pilgrimage_id', unique=True),
+    )
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
     message = db.Column(db.Text, nullable=False)
     link = db.Column(db.String(200))
-    read = db.Column(db.Boolean, default=False)
+    read = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Serves the unread badge, the unread feed and the newest-first feed of a user
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'read', 'created_at'),
+    )
+
+def _apply_unread_delta(connection, user_id, delta):
+    """Adjust a user's unread notification counter, never below zero"""
+    table = User.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == user_id)
+        .values({table.c.unread_notifications: case(
+            (table.c.unread_notifications + delta < 0, 0),
+            else_=table.c.unread_notifications + delta
+        )})
+    )
+
+# Notifications written through the ORM; notifications.py adjusts the counter itself for its bulk paths
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, notification):
+    if not notification.read:
+        _apply_unread_delta(connection, notification.user_id, 1)
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, notification):
+    if not notification.read:
+        _apply_unread_delta(connection, notification.user_id, -1)
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, notification):
+    state = inspect(notification)
+    read_history = state.attrs.read.history
+    user_history = state.attrs.user_id.history
+    if not read_history.has_changes() and not user_history.has_changes():
+        return
+    
+    was_read = read_history.deleted[0] if read_history.deleted else notification.read
+    old_user_id = user_history.deleted[0] if user_history.deleted else notification.user_id
+    if not was_read:
+        _apply_unread_delta(connection, old_user_id, -1)
+    if not notification.read:
+        _apply_unread_delta(connection, notification.user_id, 1)
 
 class Attraction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -174,6 +425,10 @@ class Attraction(db.Model):
     
     # Relationships
     daily_plans = db.relationship('DailyPlanAttraction', backref='attraction', lazy='dynamic')
+    
+    __table_args__ = (
+        db.Index('ix_attraction_pilgrimage_popularity', 'pilgrimage_id', 'popularity'),
+    )
 
 class DailyPlan(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -190,6 +445,10 @@ class DailyPlan(db.Model):
     # Relationships
     attractions = db.relationship('DailyPlanAttraction', backref='daily_plan', lazy='dynamic', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_daily_plan_trip_day', 'trip_id', 'day_number'),
+    )
+    
     @property
     def total_duration(self):
         """Calculate total duration of all attractions in minutes"""
@@ -217,6 +476,11 @@ class DailyPlanAttraction(db.Model):
     notes = db.Column(db.Text)
     order = db.Column(db.Integer, default=0)  # Order in the day's schedule
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_daily_plan_attraction_plan_order', 'daily_plan_id', 'order'),
+        db.Index('ix_daily_plan_attraction_attraction', 'attraction_id'),
+    )
 
 class Deal(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -232,10 +496,51 @@ class Deal(db.Model):
     min_days = db.Column(db.Integer, default=1)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_deal_active_validity', 'active', 'valid_from', 'valid_to'),
+    )
+
+class AppliedDeal(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    trip_id = db.Column(db.Integer, db.ForeignKey('trip_plan.id'), nullable=False, index=True)
+    deal_id = db.Column(db.Integer, db.ForeignKey('deal.id'))  # kept nullable so deals can be retired
+    code = db.Column(db.String(20), nullable=False)
+    title = db.Column(db.String(100))
+    discount_percentage = db.Column(db.Float, nullable=False)
+    discount_amount = db.Column(db.Float, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OutboundEmail(db.Model):
+    """Transactional outbox for emails, delivered by the mail_queue workers"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list of addresses
+    sender = db.Column(db.String(120))
+    html_body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_by = db.Column(db.String(40))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_outbound_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    @property
+    def recipient_list(self):
+        try:
+            return json.loads(self.recipients)
+        except:
+            return []
 
 class RefundRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    trip_id = db.Column(db.Integer, db.ForeignKey('trip_plan.id'), nullable=False)
+    trip_id = db.Column(db.Integer, db.ForeignKey('trip_plan.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, processed
@@ -244,5 +549,158 @@ class RefundRequest(db.Model):
     reason = db.Column(db.Text)
     admin_notes = db.Column(db.Text)
 
+class ForumCategory(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    icon = db.Column(db.String(50))
+    
+    # Denormalized forum index stats, maintained by the ForumPost listeners below
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_post_id = db.Column(db.Integer)
+    last_post_at = db.Column(db.DateTime)
+    
+    # Relationships
+    posts = db.relationship('ForumPost', backref='category', lazy='dynamic')
+    last_post = db.relationship('ForumPost', primaryjoin='foreign(ForumCategory.last_post_id) == ForumPost.id',
+                                viewonly=True)
+
+class ForumPost(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('forum_category.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    views = db.Column(db.Integer, default=0)  # written in batches by view_counter.py
+    
+    # Relationships
+    comments = db.relationship('ForumComment', backref='post', lazy='dynamic')
+    
+    __table_args__ = (
+        db.Index('ix_forum_post_category_created', 'category_id', 'created_at'),
+        db.Index('ix_forum_post_created', 'created_at'),
+    )
+
+class ForumComment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('forum_post.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_forum_comment_post_created', 'post_id', 'created_at'),
+    )
+
+class TravelLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    location = db.Column(db.String(100))
+    images = db.Column(db.Text)  # JSON string of image URLs
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_public = db.Column(db.Boolean, default=True)
+    
+    __table_args__ = (
+        db.Index('ix_travel_log_public_created', 'is_public', 'created_at'),
+    )
+    
+    @property
+    def log_images(self):
+        if not self.images:
+            return []
+        try:
+            return json.loads(self.images)
+        except:
+            return []
+    
+    @log_images.setter
+    def log_images(self, urls):
+        self.images = json.dumps(list(urls))
+
+def _latest_post(category_id, column):
+    """Scalar subquery: column of the category's newest post (served by ix_forum_post_category_created)"""
+    posts = ForumPost.__table__
+    return (
+        select(column)
+        .where(posts.c.category_id == category_id)
+        .order_by(posts.c.created_at.desc(), posts.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+def _forum_post_added(connection, category_id, post_id, created_at):
+    table = ForumCategory.__table__
+    # Both CASEs see the row as it was before this UPDATE
+    newer = or_(table.c.last_post_at.is_(None), table.c.last_post_at <= created_at)
+    connection.execute(
+        table.update()
+        .where(table.c.id == category_id)
+        .values({
+            table.c.post_count: table.c.post_count + 1,
+            table.c.last_post_id: case((newer, post_id), else_=table.c.last_post_id),
+            table.c.last_post_at: case((newer, created_at), else_=table.c.last_post_at)
+        })
+    )
+
+def _forum_post_removed(connection, category_id):
+    table = ForumCategory.__table__
+    posts = ForumPost.__table__
+    connection.execute(
+        table.update()
+        .where(table.c.id == category_id)
+        .values({
+            table.c.post_count: table.c.post_count - 1,
+            table.c.last_post_id: _latest_post(category_id, posts.c.id),
+            table.c.last_post_at: _latest_post(category_id, posts.c.created_at)
+        })
+    )
+
+@event.listens_for(ForumPost, 'after_insert')
+def _forum_post_inserted(mapper, connection, post):
+    _forum_post_added(connection, post.category_id, post.id, post.created_at)
+
+@event.listens_for(ForumPost, 'after_delete')
+def _forum_post_deleted(mapper, connection, post):
+    _forum_post_removed(connection, post.category_id)
+
+@event.listens_for(ForumPost, 'after_update')
+def _forum_post_updated(mapper, connection, post):
+    history = inspect(post).attrs.category_id.history
+    if history.deleted and history.deleted[0] != post.category_id:
+        _forum_post_removed(connection, history.deleted[0])
+        _forum_post_added(connection, post.category_id, post.id, post.created_at)
+
+def reconcile_forum_stats():
+    """Recompute every category's post count and last post from forum_post.
+    
+    Backfills the denormalized columns and repairs drift from bulk
+    operations that bypass the ForumPost listeners. Returns the number of
+    categories whose stored stats were corrected.
+    """
+    posts = ForumPost.__table__
+    counts = dict(db.session.query(ForumPost.category_id, db.func.count(ForumPost.id)).group_by(ForumPost.category_id).all())
+    
+    corrected = 0
+    for category in ForumCategory.query.all():
+        latest = db.session.execute(
+            select(posts.c.id, posts.c.created_at)
+            .where(posts.c.category_id == category.id)
+            .order_by(posts.c.created_at.desc(), posts.c.id.desc())
+            .limit(1)
+        ).first()
+        stats = (counts.get(category.id, 0),) + (tuple(latest) if latest else (None, None))
+        if (category.post_count, category.last_post_id, category.last_post_at) == stats:
+            continue
+        category.post_count, category.last_post_id, category.last_post_at = stats
+        corrected += 1
+    
+    db.session.commit()
+    return corrected
+
 print("for git repo")
 print("All models have been properly defined!")
\ No newline at end of file
@@ -0,0 +1,177 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_login import login_required, current_user
+from extensions import db
+from broker import broker, cooperative_waits
+from notifications import (feed, mark_read, notification_to_dict, notifications_since, poll_state, user_channel,
+                           FEED_PAGE_SIZE)
+import json
+import time
+
+notifications_bp = Blueprint('notifications', __name__, url_prefix='/notifications')
+
+@notifications_bp.route('/feed')
+@login_required
+def notification_feed():
+    """Newest-first notifications; pass the returned next_cursor to get the following page"""
+    notifications, next_cursor = feed(
+        current_user.id,
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', FEED_PAGE_SIZE, type=int),
+        unread_only=request.args.get('unread', '0') in ('1', 'true')
+    )
+
+    return jsonify({
+        'notifications': [notification_to_dict(n) for n in notifications],
+        'next_cursor': next_cursor,
+        'unread_count': current_user.get_unread_notifications_count()
+    })
+
+@notifications_bp.route('/unread-count')
+@login_required
+def unread_count():
+    return jsonify({'unread_count': current_user.get_unread_notifications_count()})
+
+@notifications_bp.route('/mark-read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Mark notifications read: {"ids": [...]} for specific ones, {"all": true} for everything"""
+    data = request.get_json(silent=True) or {}
+
+    if data.get('all'):
+        marked = mark_read(current_user.id)
+    else:
+        ids = data.get('ids')
+        if not isinstance(ids, list):
+            return jsonify({'success': False, 'error': 'Provide a list of notification ids or "all": true'}), 400
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Notification ids must be integers'}), 400
+        marked = mark_read(current_user.id, ids)
+
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'marked': marked,
+        'unread_count': current_user.get_unread_notifications_count()
+    })
+
+# Server push: deltas published by notifications.py after each commit
+#
+# A stream or long-poll request waits for deltas. Under a gevent or eventlet
+# worker that wait costs a greenlet; on a sync or threaded server it holds a
+# worker thread, so there the stream is switched off and /poll answers at once
+# and tells the client when to poll again (see NOTIFICATION_PUSH).
+
+def can_hold_requests():
+    """Whether a request may wait for deltas without tying up a worker thread"""
+    return current_app.config.get('NOTIFICATION_PUSH', 'auto') == 'stream' or cooperative_waits()
+
+def stream_enabled():
+    return current_app.config.get('NOTIFICATION_PUSH', 'auto') != 'poll' and can_hold_requests()
+
+@notifications_bp.app_context_processor
+def inject_notification_push():
+    # A callable, so only pages rendering the badge evaluate it
+    return dict(notification_stream_enabled=stream_enabled)
+
+def _sse(delta):
+    notification = delta.get('notification')
+    event_id = f"id: {notification['id']}\n" if notification and notification['id'] else ''
+    return f"{event_id}event: {delta['type']}\ndata: {json.dumps(delta)}\n\n"
+
+def _catch_up(user_id, after_id):
+    """Deltas for notifications a reconnecting client missed"""
+    if not after_id:
+        return []
+    return [
+        {'type': 'notification', 'notification': notification_to_dict(n), 'unread_delta': 0 if n.read else 1}
+        for n in notifications_since(user_id, after_id)
+    ]
+
+@notifications_bp.route('/stream')
+@login_required
+def notification_stream():
+    """Server-Sent Events stream of notification deltas.
+
+    The browser's EventSource reconnects on its own and sends Last-Event-ID,
+    which is used to replay anything missed in between. Streams end after
+    NOTIFICATION_STREAM_MAX_AGE seconds so long-lived connections are
+    recycled. No database session is held while the stream is open.
+    Without a worker that can hold requests cheaply this answers 204, which
+    tells EventSource not to reconnect.
+    """
+    if not stream_enabled():
+        return Response(status=204)
+
+    user_id = current_user.id
+    heartbeat = current_app.config.get('NOTIFICATION_STREAM_HEARTBEAT', 15)
+    max_age = current_app.config.get('NOTIFICATION_STREAM_MAX_AGE', 300)
+
+    # Subscribe before reading the backlog so nothing committed in between is lost
+    subscription = broker.subscribe(user_channel(user_id))
+    try:
+        missed = _catch_up(user_id, request.headers.get('Last-Event-ID', type=int))
+    except Exception:
+        subscription.close()
+        raise
+    replayed = {delta['notification']['id'] for delta in missed}
+    db.session.remove()
+
+    def generate():
+        with subscription:
+            yield f"retry: {heartbeat * 1000}\n\n"
+            for delta in missed:
+                yield _sse(delta)
+            deadline = time.monotonic() + max_age
+            while time.monotonic() < deadline:
+                delta = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    yield _sse({'type': 'resync'})
+                    return
+                if delta is None:
+                    yield ": keep-alive\n\n"
+                elif delta['type'] != 'notification' or delta['notification']['id'] not in replayed:
+                    yield _sse(delta)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also unsubscribe when the client goes away before the stream has started
+    response.call_on_close(subscription.close)
+    return response
+
+@notifications_bp.route('/poll')
+@login_required
+def notification_poll():
+    """Deltas newer than ?after=<notification id>, plus the current unread count and newest id.
+
+    Long-polls for up to ?timeout= seconds when can_hold_requests(); otherwise
+    it answers at once and retry_after says how long the client should wait
+    before polling again.
+    """
+    user_id = current_user.id
+    timeout = 0
+    if can_hold_requests():
+        timeout = min(request.args.get('timeout', 25, type=float),
+                      current_app.config.get('NOTIFICATION_POLL_TIMEOUT', 25))
+
+    with broker.subscribe(user_channel(user_id)) as subscription:
+        deltas = _catch_up(user_id, request.args.get('after', type=int))
+        if not deltas and timeout > 0:
+            db.session.remove()
+            delta = subscription.get(timeout=timeout)
+            if delta is not None:
+                deltas = [delta] + subscription.drain()
+        resync = subscription.overflowed
+
+    unread_count, last_id = poll_state(user_id)
+    return jsonify({
+        'deltas': deltas,
+        'resync': resync,
+        'unread_count': unread_count,
+        'last_id': last_id,
+        'retry_after': 0 if timeout > 0 else current_app.config.get('NOTIFICATION_POLL_INTERVAL', 20)
+    })
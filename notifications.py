@@ -0,0 +1,205 @@
+"""In-app notifications.
+
+Request handlers call notify(), which only records the notification on the
+caller's session. When that transaction commits, every pending notification
+is written in one multi-row insert and each recipient's unread counter is
+bumped once. The counter lives on User.unread_notifications, so the unread
+badge never has to count rows. If the transaction rolls back, the pending
+notifications are dropped with it.
+
+Once the transaction has committed, each new notification and each
+mark-read is also published as a delta on the recipient's broker channel,
+which feeds the notification stream and long-poll endpoints.
+"""
+import base64
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, case, event, func, insert, or_, update
+from sqlalchemy.orm import Session
+
+from broker import broker
+from extensions import db
+from models import Notification, User
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+def notify(user_id, title, message, link=None):
+    """Queue a notification; it is written when the caller's transaction commits"""
+    session = db.session()
+    if not session.in_transaction():
+        # Without an open transaction a rollback fires no events and would not discard the queue
+        session.begin()
+    session.info.setdefault('pending_notifications', []).append({
+        'user_id': user_id,
+        'title': title,
+        'message': message,
+        'link': link,
+        'read': False,
+        'created_at': datetime.utcnow()
+    })
+
+def user_channel(user_id):
+    return f"notifications:{user_id}"
+
+def _queue_delta(session, user_id, event):
+    session.info.setdefault('notification_deltas', []).append((user_id, event))
+
+@event.listens_for(Session, 'before_commit')
+def _write_pending_notifications(session):
+    pending = session.info.pop('pending_notifications', None)
+    if not pending:
+        return
+    stmt = insert(Notification)
+    if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        ids = session.scalars(stmt.returning(Notification.id, sort_by_parameter_order=True), pending).all()
+    else:
+        session.execute(stmt, pending)
+        ids = [None] * len(pending)
+
+    users = User.__table__
+    per_user = Counter(row['user_id'] for row in pending)
+    session.execute(
+        update(users)
+        .where(users.c.id == bindparam('recipient'))
+        .values(unread_notifications=users.c.unread_notifications + bindparam('added')),
+        [{'recipient': user_id, 'added': added} for user_id, added in per_user.items()]
+    )
+
+    for notification_id, row in zip(ids, pending):
+        _queue_delta(session, row['user_id'], {
+            'type': 'notification',
+            'notification': _row_to_dict(notification_id, row),
+            'unread_delta': 1
+        })
+
+@event.listens_for(Session, 'after_commit')
+def _publish_deltas(session):
+    for user_id, delta in session.info.pop('notification_deltas', ()):
+        broker.publish(user_channel(user_id), delta)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_notifications(session, previous_transaction):
+    session.info.pop('pending_notifications', None)
+    session.info.pop('notification_deltas', None)
+
+def mark_read(user_id, notification_ids=None):
+    """Mark the user's notifications read (all of them if no ids are given).
+
+    Runs as two UPDATE statements in the caller's transaction and returns
+    the number of notifications that changed from unread to read.
+    """
+    criteria = [Notification.user_id == user_id, Notification.read == False]
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        criteria.append(Notification.id.in_(notification_ids))
+
+    marked = db.session.execute(
+        update(Notification).where(*criteria).values(read=True),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    if marked:
+        users = User.__table__
+        remaining = 0 if notification_ids is None else case(
+            (users.c.unread_notifications < marked, 0),
+            else_=users.c.unread_notifications - marked
+        )
+        db.session.execute(update(users).where(users.c.id == user_id).values(unread_notifications=remaining))
+        _queue_delta(db.session, user_id, {
+            'type': 'read',
+            'ids': notification_ids,  # None means all of them
+            'unread_delta': -marked
+        })
+    return marked
+
+# Cursor-paginated feed, newest first, keyed on (created_at, id)
+
+def encode_cursor(notification):
+    raw = f"{notification.created_at.isoformat()}|{notification.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def feed(user_id, cursor=None, limit=FEED_PAGE_SIZE, unread_only=False):
+    """One page of the user's notifications and the cursor of the next page (None on the last page)"""
+    limit = min(max(limit, 1), FEED_MAX_PAGE_SIZE)
+    query = Notification.query.filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.read == False)
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, notification_id = position
+        query = query.filter(or_(
+            Notification.created_at < created_at,
+            and_(Notification.created_at == created_at, Notification.id < notification_id)
+        ))
+
+    rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def notifications_since(user_id, after_id, limit=FEED_MAX_PAGE_SIZE):
+    """Notifications newer than after_id, oldest first, for clients catching up after a reconnect"""
+    return Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.id > after_id
+    ).order_by(Notification.id).limit(limit).all()
+
+def poll_state(user_id):
+    """(unread count, newest notification id) read from the database in one query"""
+    latest = db.session.query(func.max(Notification.id)).filter(Notification.user_id == user_id).scalar_subquery()
+    return tuple(db.session.query(User.unread_notifications, latest).filter(User.id == user_id).one())
+
+def _row_to_dict(notification_id, row):
+    return {
+        'id': notification_id,
+        'title': row['title'],
+        'message': row['message'],
+        'link': row['link'],
+        'read': bool(row['read']),
+        'created_at': row['created_at'].isoformat()
+    }
+
+def notification_to_dict(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'link': notification.link,
+        'read': bool(notification.read),
+        'created_at': notification.created_at.isoformat()
+    }
+
+def reconcile_unread_counts():
+    """Recompute every user's unread counter from the notification table.
+
+    Repairs drift caused by writes that bypass both this module and the ORM
+    listeners. Returns the number of users whose counter was corrected.
+    """
+    actual = dict(
+        db.session.query(Notification.user_id, db.func.count(Notification.id))
+        .filter(Notification.read == False)
+        .group_by(Notification.user_id)
+        .all()
+    )
+    corrected = 0
+    for user in User.query.all():
+        count = actual.get(user.id, 0)
+        if user.unread_notifications != count:
+            user.unread_notifications = count
+            corrected += 1
+
+    db.session.commit()
+    return corrected
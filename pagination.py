@@ -0,0 +1,211 @@
+"""Keyset (cursor) pagination.
+
+OFFSET pagination reads and discards every row before the requested page,
+so page 5,000 of a large table costs 5,000 pages of work. A keyset page
+starts from the sort key of the row it continues from, e.g. "created_at
+before X, or equal to X with a lower id". With an index on that key, any
+page costs the same as the first.
+
+Cursors are opaque url-safe strings carrying the boundary row's key,
+the direction and the page number they lead to, so numbered pagers keep
+working. ?page= is still accepted for old links and jumps straight to a
+page with OFFSET; the cursors it hands out continue with keyset reads.
+
+Totals are optional: pass an int you already have (such as a denormalized
+counter), 'exact' for a COUNT(*), or 'estimate' for a COUNT capped at
+PAGINATION_COUNT_CAP rows, which reports the cap as a lower bound.
+"""
+import base64
+import json
+from datetime import date, datetime
+from math import ceil
+
+from flask import abort, current_app, has_app_context
+from sqlalchemy import and_, func, or_
+
+DEFAULT_COUNT_CAP = 10000
+
+class Keyset:
+    """Sort key of a paginated query: columns compared together, all ascending or all descending.
+
+    The last column must be unique (normally the primary key) so that every
+    row has a distinct position.
+    """
+
+    def __init__(self, *columns, descending=False):
+        self.columns = columns
+        self.descending = descending
+
+    def order_by(self, reverse=False):
+        descending = self.descending != reverse
+        return [column.desc() if descending else column.asc() for column in self.columns]
+
+    def values(self, item):
+        return [getattr(item, column.key) for column in self.columns]
+
+    def after(self, values, reverse=False):
+        """Rows strictly past values in sort order (before them when reverse)"""
+        descending = self.descending != reverse
+        past = (lambda column, value: column < value) if descending else (lambda column, value: column > value)
+        at_or_past = (lambda column, value: column <= value) if descending else (lambda column, value: column >= value)
+
+        first, rest = self.columns[0], self.columns[1:]
+        if not rest:
+            return past(first, values[0])
+        tie_breaks = [
+            and_(*[column == value for column, value in zip(self.columns[:i], values[:i])],
+                 past(self.columns[i], values[i]))
+            for i in range(1, len(self.columns))
+        ]
+        # The leading range keeps the first column usable as an index range
+        return and_(at_or_past(first, values[0]), or_(past(first, values[0]), *tie_breaks))
+
+    def encode(self, item, page, direction):
+        key = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in self.values(item)]
+        raw = json.dumps({'k': key, 'd': direction, 'p': page}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """(values, direction, page) from a cursor, or None if it is missing or malformed"""
+        if not cursor:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            key, direction, page = data['k'], data['d'], int(data['p'])
+            if direction not in ('next', 'prev') or len(key) != len(self.columns):
+                return None
+            values = [self._parse(column, value) for column, value in zip(self.columns, key)]
+        except (ValueError, TypeError, KeyError, UnicodeDecodeError):
+            return None
+        return values, direction, max(page, 1)
+
+    @staticmethod
+    def _parse(column, value):
+        python_type = column.type.python_type
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+        return python_type(value)
+
+class KeysetPage:
+    """One page of results; quacks like Flask-SQLAlchemy's Pagination for templates"""
+
+    def __init__(self, items, page, per_page, total=None, total_is_estimate=False,
+                 next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return self.page + (1 if self.has_next else 0)
+        return max(ceil(self.total / self.per_page), self.page) if self.total else 0
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    def iter_pages(self, *, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Page numbers for a numbered pager, None marking a gap (same layout as Pagination)"""
+        pages_end = self.pages + 1
+        if pages_end == 1:
+            return
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start - left_end > 0:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start - mid_end > 0:
+            yield None
+        yield from range(right_start, pages_end)
+
+    def meta(self):
+        """Pagination fields for JSON responses"""
+        return {
+            'page': self.page,
+            'per_page': self.per_page,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate,
+            'pages': self.pages if self.total is not None else None,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor
+        }
+
+def _count(query, total):
+    """(total, is_estimate) for the total argument of keyset_paginate"""
+    if total is None or isinstance(total, int):
+        return total, False
+    counted = query.order_by(None)
+    if total == 'exact':
+        return counted.count(), False
+    if total == 'estimate':
+        cap = current_app.config.get('PAGINATION_COUNT_CAP', DEFAULT_COUNT_CAP) if has_app_context() else DEFAULT_COUNT_CAP
+        # Counting stops after cap rows however large the result is
+        capped = counted.limit(cap).subquery()
+        count = query.session.query(func.count()).select_from(capped).scalar()
+        return count, count >= cap
+    raise ValueError(f"total must be None, an int, 'exact' or 'estimate', not {total!r}")
+
+def keyset_paginate(query, keyset, cursor=None, page=None, per_page=20, total=None, error_out=False):
+    """Page of query ordered by keyset, continuing from cursor or, without one, jumping to page.
+
+    items are whatever query returns (entities or rows); each must expose
+    the keyset columns as attributes. With error_out, an empty page past
+    the first aborts with 404, as Pagination does.
+    """
+    per_page = max(per_page, 1)
+    position = keyset.decode(cursor)
+    reverse = False
+
+    if position is not None:
+        values, direction, page = position
+        reverse = direction == 'prev'
+        rows = (query.filter(keyset.after(values, reverse=reverse))
+                .order_by(*keyset.order_by(reverse=reverse)).limit(per_page + 1).all())
+    else:
+        page = max(page or 1, 1)
+        rows = query.order_by(*keyset.order_by()).offset((page - 1) * per_page).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if reverse:
+        # Fetched backwards from the cursor; "more" means there are earlier pages
+        items.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = page > 1, more
+
+    if error_out and not items and page > 1:
+        abort(404)
+
+    count, is_estimate = _count(query, total)
+    return KeysetPage(
+        items, page, per_page, total=count, total_is_estimate=is_estimate,
+        next_cursor=keyset.encode(items[-1], page + 1, 'next') if items and has_next else None,
+        prev_cursor=keyset.encode(items[0], page - 1, 'prev') if items and has_prev else None
+    )
@@ -1,11 +1,13 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, make_response, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, make_response, abort, send_file
 from flask_login import login_required, current_user
-from models import TripPlan, User, Notification, Booking, RefundRequest
-from extensions import db, mail, csrf
-from flask_mail import Message
+from models import TripPlan, User, Booking, RefundRequest
+from extensions import db, csrf
+from mail_queue import enqueue_email
+from notifications import notify
 import uuid
 from datetime import datetime, timedelta
-from fpdf import FPDF
+from receipts import get_receipt, receipt_storage_dir
+from pricing import quote_trip, apply_price_breakdown
 import os
 
 payment_bp = Blueprint('payment', __name__)
@@ -42,21 +44,14 @@ def checkout(trip_id):
         return redirect(url_for('payment.receipt', trip_id=trip.id))
     
     if not trip.base_price:
-        pilgrimage = trip.pilgrimage
-        price_breakdown = calculate_trip_price(
-            pilgrimage,
+        price_breakdown = quote_trip(
+            trip.pilgrimage,
             trip.num_travelers,
             trip.accommodation_type,
             trip.transportation,
             trip.guide_required
         )
-        trip.base_price = price_breakdown['base_price']
-        trip.accommodation_fee = price_breakdown['accommodation_fee']
-        trip.transportation_fee = price_breakdown['transportation_fee']
-        trip.guide_fee = price_breakdown['guide_fee']
-        trip.tax_amount = price_breakdown['tax_amount']
-        trip.discount_amount = price_breakdown['discount_amount']
-        trip.total_price = price_breakdown['total']
+        apply_price_breakdown(trip, price_breakdown)
         db.session.commit()
     
     dummy_accounts = list(DUMMY_ACCOUNTS.keys())
@@ -92,16 +87,16 @@ def process_payment(trip_id):
         )
         db.session.add(booking)
         
-        notification = Notification(
-            user_id=current_user.id,
-            title='Payment Successful',
-            message=f'Your payment for the trip to {trip.pilgrimage.name} was successful.',
+        notify(
+            current_user.id,
+            'Payment Successful',
+            f'Your payment for the trip to {trip.pilgrimage.name} was successful.',
             link=url_for('payment.receipt', trip_id=trip.id)
         )
-        db.session.add(notification)
         
-        db.session.commit()
+        # Queued in the same transaction; delivered by the mail queue workers
         send_receipt_email(trip)
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -132,69 +127,23 @@ def receipt_pdf(trip_id):
     if trip.user_id != current_user.id:
         abort(403)
     
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Try to use DejaVu font for Unicode support
-    try:
-        pdf.add_font('DejaVu', '', 'DejaVuSans.ttf', uni=True)
-        pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf', uni=True)
-        pdf.set_font('DejaVu', '', 12)
-        use_unicode = True
-    except:
-        pdf.set_font('helvetica', '', 12)
-        use_unicode = False
-    
-    # Header
-    pdf.set_font('DejaVu', 'B', 16) if use_unicode else pdf.set_font('helvetica', 'B', 16)
-    pdf.cell(0, 10, 'Sacred Journeys - Payment Receipt', 0, 1, 'C')
-    pdf.ln(10)
-    
-    # Trip details
-    pdf.set_font('DejaVu', '', 12) if use_unicode else pdf.set_font('helvetica', '', 12)
-    pdf.cell(0, 10, f'Confirmation Code: {trip.confirmation_code}', 0, 1)
-    pdf.cell(0, 10, f'Payment Date: {trip.payment_date.strftime("%b %d, %Y %I:%M %p")}', 0, 1)
-    pdf.ln(10)
-    
-    # Price breakdown
-    pdf.set_font('DejaVu', 'B', 12) if use_unicode else pdf.set_font('helvetica', 'B', 12)
-    pdf.cell(0, 10, 'Payment Details', 0, 1)
-    pdf.set_font('DejaVu', '', 12) if use_unicode else pdf.set_font('helvetica', '', 12)
-    
-    def format_currency(amount):
-        return f"₹{amount:.2f}" if use_unicode else f"Rs.{amount:.2f}"
-    
-    pdf.cell(100, 10, 'Base Price:', 0, 0)
-    pdf.cell(0, 10, format_currency(trip.base_price), 0, 1, 'R')
-    
-    pdf.cell(100, 10, 'Accommodation Fee:', 0, 0)
-    pdf.cell(0, 10, format_currency(trip.accommodation_fee), 0, 1, 'R')
-    
-    pdf.cell(100, 10, 'Transportation Fee:', 0, 0)
-    pdf.cell(0, 10, format_currency(trip.transportation_fee), 0, 1, 'R')
-    
-    pdf.cell(100, 10, 'Guide Fee:', 0, 0)
-    pdf.cell(0, 10, format_currency(trip.guide_fee), 0, 1, 'R')
-    
-    pdf.cell(100, 10, 'Tax (8.5%):', 0, 0)
-    pdf.cell(0, 10, format_currency(trip.tax_amount), 0, 1, 'R')
-    
-    if trip.discount_amount > 0:
-        pdf.cell(100, 10, 'Discount:', 0, 0)
-        pdf.cell(0, 10, format_currency(-trip.discount_amount), 0, 1, 'R')
-    
-    pdf.set_font('DejaVu', 'B', 14) if use_unicode else pdf.set_font('helvetica', 'B', 14)
-    pdf.cell(100, 10, 'Total:', 0, 0)
-    pdf.cell(0, 10, format_currency(trip.total_price), 0, 1, 'R')
-    pdf.ln(15)
-    
-    # Footer
-    pdf.set_font('DejaVu', 'I', 10) if use_unicode else pdf.set_font('helvetica', 'I', 10)
-    pdf.cell(0, 10, 'Thank you for choosing Sacred Journeys!', 0, 1, 'C')
-    
-    response = make_response(pdf.output(dest='S').encode('latin1'))
-    response.headers.set('Content-Disposition', 'attachment', filename=f'receipt_{trip.confirmation_code}.pdf')
-    response.headers.set('Content-Type', 'application/pdf')
+    if not trip.payment_date:
+        abort(404)
+    
+    # Receipts are immutable once paid: render once, then stream the stored file
+    path, key = get_receipt(trip, receipt_storage_dir(current_app))
+    
+    response = send_file(
+        path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'receipt_{trip.confirmation_code}.pdf',
+        conditional=True,
+        etag=key,
+        max_age=current_app.config.get('RECEIPT_MAX_AGE', 86400)
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
     return response
 
 @payment_bp.route('/cancel-trip/<int:trip_id>', methods=['POST'])
@@ -230,16 +179,15 @@ def cancel_trip(trip_id):
         trip.payment_status = 'cancelled'
         trip.cancellation_date = datetime.utcnow()
         
-        notification = Notification(
-            user_id=current_user.id,
-            title='Trip Cancelled',
-            message=f'Your trip to {trip.pilgrimage.name} has been cancelled. Refund pending.',
+        notify(
+            current_user.id,
+            'Trip Cancelled',
+            f'Your trip to {trip.pilgrimage.name} has been cancelled. Refund pending.',
             link=url_for('payment.refund_status', trip_id=trip.id)
         )
-        db.session.add(notification)
         
-        db.session.commit()
         send_cancellation_email(trip, refund_request)
+        db.session.commit()
         
         flash('Trip cancelled successfully. Refund request submitted.', 'success')
     except Exception as e:
@@ -279,16 +227,17 @@ def request_refund(trip_id):
         
         trip.payment_status = 'refund_pending'
         
-        notification = Notification(
-            user_id=current_user.id,
-            title='Refund Requested',
-            message=f'Refund requested for trip to {trip.pilgrimage.name}. Amount: ₹{refund_amount:.2f}',
+        notify(
+            current_user.id,
+            'Refund Requested',
+            f'Refund requested for trip to {trip.pilgrimage.name}. Amount: ₹{refund_amount:.2f}',
             link=url_for('payment.refund_status', trip_id=trip.id)
         )
-        db.session.add(notification)
         
-        db.session.commit()
+        # Flush so the refund request has the id used in the email subject
+        db.session.flush()
         send_refund_request_email(trip, refund_request)
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -328,7 +277,7 @@ def calculate_refund_amount(total_amount, days_until_trip):
         return 0  # No refund for last-minute cancellations
 
 def send_receipt_email(trip):
-    """Send receipt email to the user"""
+    """Queue the receipt email for the user"""
     try:
         user = User.query.get(trip.user_id)
         if not user or not user.email:
@@ -343,22 +292,15 @@ def send_receipt_email(trip):
             user=user
         )
         
-        msg = Message(
-            subject=subject,
-            recipients=[user.email],
-            html=html_body,
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'noreply@sacredjourneys.com')
-        )
-        
-        mail.send(msg)
-        current_app.logger.info(f"Receipt email sent to {user.email}")
+        enqueue_email(subject, [user.email], html_body)
+        current_app.logger.info(f"Receipt email queued for {user.email}")
         return True
     except Exception as e:
-        current_app.logger.error(f"Error sending receipt email: {str(e)}")
+        current_app.logger.error(f"Error queueing receipt email: {str(e)}")
         return False
 
 def send_cancellation_email(trip, refund_request):
-    """Send cancellation confirmation email"""
+    """Queue the cancellation confirmation email"""
     try:
         user = User.query.get(trip.user_id)
         if not user or not user.email:
@@ -379,22 +321,15 @@ def send_cancellation_email(trip, refund_request):
             expected_refund_date=datetime.utcnow() + timedelta(days=7)
         )
         
-        msg = Message(
-            subject=subject,
-            recipients=[user.email],
-            html=html_body,
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'noreply@sacredjourneys.com')
-        )
-        
-        mail.send(msg)
-        current_app.logger.info(f"Cancellation email sent to {user.email}")
+        enqueue_email(subject, [user.email], html_body)
+        current_app.logger.info(f"Cancellation email queued for {user.email}")
         return True
     except Exception as e:
-        current_app.logger.error(f"Error sending cancellation email: {str(e)}")
+        current_app.logger.error(f"Error queueing cancellation email: {str(e)}")
         return False
 
 def send_refund_request_email(trip, refund_request):
-    """Send refund request confirmation email"""
+    """Queue the refund request confirmation email"""
     try:
         user = User.query.get(trip.user_id)
         if not user or not user.email:
@@ -411,58 +346,9 @@ def send_refund_request_email(trip, refund_request):
             expected_refund_date=datetime.utcnow() + timedelta(days=7)
         )
         
-        msg = Message(
-            subject=subject,
-            recipients=[user.email],
-            html=html_body,
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'noreply@sacredjourneys.com')
-        )
-        
-        mail.send(msg)
-        current_app.logger.info(f"Refund request email sent to {user.email}")
+        enqueue_email(subject, [user.email], html_body)
+        current_app.logger.info(f"Refund request email queued for {user.email}")
         return True
     except Exception as e:
-        current_app.logger.error(f"Error sending refund request email: {str(e)}")
+        current_app.logger.error(f"Error queueing refund request email: {str(e)}")
         return False
-
-def calculate_trip_price(pilgrimage, num_travelers, accommodation_type, transportation, guide_required):
-    """Calculate the total price of a trip based on various factors and return price breakdown"""
-    base_price = pilgrimage.price or 100.0
-    
-    accommodation_multipliers = {
-        'budget': 1.0,
-        'standard': 1.5,
-        'luxury': 2.5
-    }
-    
-    transportation_multipliers = {
-        'public': 1.0,
-        'private': 1.8,
-        'guided_tour': 2.2
-    }
-    
-    base_total = base_price * num_travelers
-    accommodation_fee = base_total * (accommodation_multipliers.get(accommodation_type, 1.0) - 1.0)
-    transportation_fee = base_total * (transportation_multipliers.get(transportation, 1.0) - 1.0)
-    guide_fee = 50.0 if guide_required else 0.0
-    
-    subtotal = base_total + accommodation_fee + transportation_fee + guide_fee
-    tax_amount = round(subtotal * 0.085, 2)
-    
-    discount_amount = 0
-    if num_travelers > 3:
-        discount_amount = round(subtotal * 0.05, 2)
-    
-    total = subtotal + tax_amount - discount_amount
-    
-    return {
-        'base_price': base_price,
-        'base_total': base_total,
-        'accommodation_fee': accommodation_fee,
-        'transportation_fee': transportation_fee,
-        'guide_fee': guide_fee,
-        'subtotal': subtotal,
-        'tax_amount': tax_amount,
-        'discount_amount': discount_amount,
-        'total': round(total, 2)
-    }
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""Trip pricing.
+
+Every price rule lives in PRICING_RULES. quote() prices one trip
+configuration. quote_grid() prices every accommodation x transportation
+combination for a pilgrimage at once from a precomputed per-pilgrimage base
+matrix, and quote_batch() prices arbitrary arrays of configurations. Both
+batch paths use NumPy when it is installed and fall back to quote() per
+cell otherwise.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PRICING_RULES = {
+    'default_base_price': 100.0,  # used when a pilgrimage has no price set
+    'accommodation': {
+        'budget': 1.0,
+        'standard': 1.5,
+        'luxury': 2.5
+    },
+    'transportation': {
+        'public': 1.0,
+        'private': 1.8,
+        'guided_tour': 2.2
+    },
+    'guide_fee': 50.0,  # flat, per trip
+    'tax_rate': 0.085,
+    'group_discount': {'min_travelers': 4, 'rate': 0.05}  # on the pre-tax subtotal
+}
+
+ACCOMMODATION_TYPES = tuple(PRICING_RULES['accommodation'])
+TRANSPORTATION_TYPES = tuple(PRICING_RULES['transportation'])
+
+def round_cents(amount):
+    """Round half-up to cents; _round_cents_array() performs the identical float operations"""
+    return math.floor(amount * 100 + 0.5) / 100
+
+def base_price_of(pilgrimage):
+    return pilgrimage.price or PRICING_RULES['default_base_price']
+
+def option_factor(accommodation_type, transportation):
+    """Per-traveler price multiplier of an accommodation/transportation pair.
+
+    The two surcharges are additive: (accommodation - 1) + (transportation - 1) + 1.
+    """
+    rules = PRICING_RULES
+    return rules['accommodation'].get(accommodation_type, 1.0) + rules['transportation'].get(transportation, 1.0) - 1.0
+
+def quote(base_price, num_travelers, accommodation_type, transportation, guide_required):
+    """Price breakdown for one trip configuration"""
+    rules = PRICING_RULES
+    base_total = base_price * num_travelers
+    accommodation_fee = base_total * (rules['accommodation'].get(accommodation_type, 1.0) - 1.0)
+    transportation_fee = base_total * (rules['transportation'].get(transportation, 1.0) - 1.0)
+    guide_fee = rules['guide_fee'] if guide_required else 0.0
+
+    # Same operations, in the same order, as the batch paths, so single and batch quotes agree to the cent
+    subtotal = base_price * option_factor(accommodation_type, transportation) * num_travelers + guide_fee
+    tax_amount = round_cents(subtotal * rules['tax_rate'])
+
+    discount_amount = 0
+    if num_travelers >= rules['group_discount']['min_travelers']:
+        discount_amount = round_cents(subtotal * rules['group_discount']['rate'])
+
+    return {
+        'base_price': base_price,
+        'base_total': base_total,
+        'accommodation_fee': accommodation_fee,
+        'transportation_fee': transportation_fee,
+        'guide_fee': guide_fee,
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'discount_amount': discount_amount,
+        'total': round_cents(subtotal + tax_amount - discount_amount)
+    }
+
+def quote_trip(pilgrimage, num_travelers, accommodation_type, transportation, guide_required):
+    """Price breakdown for a trip to pilgrimage"""
+    return quote(base_price_of(pilgrimage), num_travelers, accommodation_type, transportation, guide_required)
+
+def apply_price_breakdown(trip, breakdown):
+    """Copy a breakdown onto a TripPlan's price fields"""
+    trip.base_price = breakdown['base_price']
+    trip.accommodation_fee = breakdown['accommodation_fee']
+    trip.transportation_fee = breakdown['transportation_fee']
+    trip.guide_fee = breakdown['guide_fee']
+    trip.tax_amount = breakdown['tax_amount']
+    trip.discount_amount = breakdown['discount_amount']
+    trip.total_price = breakdown['total']
+
+def deal_discount(amount, deal):
+    """Discount a deal takes off amount"""
+    return amount * (deal.discount_percentage / 100)
+
+# Batch pricing
+
+def _round_cents_array(amounts):
+    return np.floor(amounts * 100 + 0.5) / 100
+
+def _lookup(table, keys):
+    return np.vectorize(lambda key: table.get(key, 1.0), otypes=[float])(keys)
+
+def _price_arrays(base_prices, num_travelers, accommodation, transportation, guide_fee, per_traveler):
+    """Vectorized quote(): every argument is an array (or scalar) broadcasting to the result shape"""
+    rules = PRICING_RULES
+    base_total = base_prices * num_travelers
+    subtotal = per_traveler * num_travelers + guide_fee
+    tax_amount = _round_cents_array(subtotal * rules['tax_rate'])
+    discount_amount = np.where(
+        num_travelers >= rules['group_discount']['min_travelers'],
+        _round_cents_array(subtotal * rules['group_discount']['rate']),
+        0.0
+    )
+    shape = subtotal.shape
+    return {
+        'base_price': np.broadcast_to(base_prices, shape),
+        'base_total': np.broadcast_to(base_total, shape),
+        'accommodation_fee': np.broadcast_to(base_total * (accommodation - 1.0), shape),
+        'transportation_fee': np.broadcast_to(base_total * (transportation - 1.0), shape),
+        'guide_fee': np.broadcast_to(guide_fee, shape),
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'discount_amount': discount_amount,
+        'total': _round_cents_array(subtotal + tax_amount - discount_amount)
+    }
+
+def quote_batch(base_prices, num_travelers, accommodation_types, transportations, guide_required):
+    """Price many configurations at once.
+
+    Arguments are scalars or broadcastable sequences. Returns a dict of the
+    quote() fields, each as a NumPy array.
+    """
+    if np is None:
+        raise RuntimeError('quote_batch requires NumPy; use quote() per configuration instead')
+    rules = PRICING_RULES
+    base_prices = np.asarray(base_prices, dtype=float)
+    num_travelers = np.asarray(num_travelers, dtype=float)
+    accommodation = _lookup(rules['accommodation'], accommodation_types)
+    transportation = _lookup(rules['transportation'], transportations)
+    guide_fee = np.where(np.asarray(guide_required, dtype=bool), rules['guide_fee'], 0.0)
+    per_traveler = base_prices * (accommodation + transportation - 1.0)
+    return _price_arrays(base_prices, num_travelers, accommodation, transportation, guide_fee, per_traveler)
+
+# pilgrimage id -> (base price, matrix), least recently used first
+_base_matrices = OrderedDict()
+_base_matrices_lock = threading.Lock()
+BASE_MATRIX_CACHE_SIZE = 1024
+
+def _option_vectors():
+    rules = PRICING_RULES
+    accommodation = np.array([rules['accommodation'][a] for a in ACCOMMODATION_TYPES])
+    transportation = np.array([rules['transportation'][t] for t in TRANSPORTATION_TYPES])
+    return accommodation, transportation
+
+def base_matrices(pilgrimages):
+    """Per-traveler pre-tax price of every accommodation x transportation option.
+
+    Returns {pilgrimage_id: read-only array of shape (accommodation,
+    transportation)}. Uncached pilgrimages are computed together in one
+    vectorized step. The cache holds one matrix per pilgrimage, tagged with
+    the price it was built from: a price change replaces it, and the least
+    recently used entries are evicted beyond BASE_MATRIX_CACHE_SIZE.
+    """
+    prices = {p.id: base_price_of(p) for p in pilgrimages}
+    result = {}
+    with _base_matrices_lock:
+        for pilgrimage_id, price in prices.items():
+            entry = _base_matrices.get(pilgrimage_id)
+            if entry is not None and entry[0] == price:
+                _base_matrices.move_to_end(pilgrimage_id)
+                result[pilgrimage_id] = entry[1]
+
+    missing = [pilgrimage_id for pilgrimage_id in prices if pilgrimage_id not in result]
+    if missing:
+        accommodation, transportation = _option_vectors()
+        factors = accommodation[:, None] + transportation[None, :] - 1.0
+        matrices = np.array([prices[pilgrimage_id] for pilgrimage_id in missing])[:, None, None] * factors[None, :, :]
+        with _base_matrices_lock:
+            for pilgrimage_id, matrix in zip(missing, matrices):
+                matrix.setflags(write=False)
+                result[pilgrimage_id] = matrix
+                _base_matrices[pilgrimage_id] = (prices[pilgrimage_id], matrix)
+                _base_matrices.move_to_end(pilgrimage_id)
+            while len(_base_matrices) > BASE_MATRIX_CACHE_SIZE:
+                _base_matrices.popitem(last=False)
+    return result
+
+def quote_grid(pilgrimage, num_travelers, guide_required):
+    """Quotes for every accommodation x transportation combination of a trip.
+
+    Returns {'accommodation': [...], 'transportation': [...], <field>: rows}
+    where each quote() field is a nested list indexed
+    [accommodation][transportation].
+    """
+    grid = {'accommodation': list(ACCOMMODATION_TYPES), 'transportation': list(TRANSPORTATION_TYPES)}
+    if np is None:
+        cells = [
+            [quote_trip(pilgrimage, num_travelers, a, t, guide_required) for t in TRANSPORTATION_TYPES]
+            for a in ACCOMMODATION_TYPES
+        ]
+        for field in cells[0][0]:
+            grid[field] = [[cell[field] for cell in row] for row in cells]
+        return grid
+
+    accommodation, transportation = _option_vectors()
+    prices = _price_arrays(
+        np.float64(base_price_of(pilgrimage)),
+        np.float64(num_travelers),
+        accommodation[:, None],
+        transportation[None, :],
+        PRICING_RULES['guide_fee'] if guide_required else 0.0,
+        base_matrices([pilgrimage])[pilgrimage.id]
+    )
+    for field, values in prices.items():
+        grid[field] = values.tolist()
+    return grid
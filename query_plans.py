@@ -0,0 +1,120 @@
+"""EXPLAIN QUERY PLAN checks for the hot-path queries.
+
+Each check builds the same statement the application issues and asserts
+that SQLite answers it by searching an index on the expected table rather
+than scanning it. Ordered checks also fail if SQLite has to sort the
+result in a temporary B-tree. A check marked limited has no WHERE to
+search with; it passes when SQLite walks an index in the requested order,
+which stops after the LIMIT rows. Run with `flask check_query_plans`, which
+exits non-zero when a query regresses.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+
+from extensions import db
+from forum import recent_posts_query
+from pagination import Keyset
+from models import (AppliedDeal, Attraction, Booking, DailyPlan, DailyPlanAttraction, Deal, ForumComment, ForumPost,
+                    Notification, Pilgrimage, RefundRequest, Review, SavedPilgrimage, TravelTip, TripPlan)
+
+class PlanCheck:
+    __slots__ = ('name', 'table', 'statement', 'ordered', 'limited')
+
+    def __init__(self, name, table, statement, ordered=False, limited=False):
+        self.name = name
+        self.table = table
+        self.statement = statement
+        self.ordered = ordered
+        self.limited = limited
+
+def hot_queries():
+    today = date.today()
+    return [
+        PlanCheck('pilgrimage reviews, newest first', 'review',
+                  select(Review).where(Review.pilgrimage_id == 1).order_by(Review.created_at.desc()), ordered=True),
+        PlanCheck('pilgrimage reviews, keyset page', 'review',
+                  select(Review).where(Review.pilgrimage_id == 1,
+                                       Keyset(Review.created_at, Review.id, descending=True).after([datetime(2026, 1, 1), 100]))
+                  .order_by(Review.created_at.desc(), Review.id.desc()).limit(21), ordered=True),
+        PlanCheck('existing review by user', 'review',
+                  select(Review).where(Review.user_id == 1, Review.pilgrimage_id == 1)),
+        PlanCheck('dashboard review count', 'review',
+                  select(func.count()).select_from(Review).where(Review.user_id == 1)),
+        PlanCheck('dashboard trips page', 'trip_plan',
+                  select(TripPlan).where(TripPlan.user_id == 1)
+                  .order_by(TripPlan.start_date.desc(), TripPlan.id.desc()).limit(10), ordered=True),
+        PlanCheck('dashboard upcoming bookings', 'booking',
+                  select(func.count()).select_from(Booking).where(Booking.user_id == 1, Booking.travel_date > today)),
+        PlanCheck('itinerary days', 'daily_plan',
+                  select(DailyPlan).where(DailyPlan.trip_id == 1).order_by(DailyPlan.day_number), ordered=True),
+        PlanCheck('itinerary stops', 'daily_plan_attraction',
+                  select(DailyPlanAttraction).where(DailyPlanAttraction.daily_plan_id.in_([1, 2, 3]))),
+        PlanCheck('pilgrimage attractions by popularity', 'attraction',
+                  select(Attraction).where(Attraction.pilgrimage_id == 1)
+                  .order_by(Attraction.popularity.desc()), ordered=True),
+        PlanCheck('deal catalog load', 'deal',
+                  select(Deal).where(Deal.active == True, Deal.valid_to >= today)),
+        PlanCheck('unread notification feed', 'notification',
+                  select(Notification).where(Notification.user_id == 1, Notification.read == False)
+                  .order_by(Notification.created_at.desc()).limit(20), ordered=True),
+        PlanCheck('featured pilgrimages', 'pilgrimage',
+                  select(Pilgrimage.id).where(Pilgrimage.featured == True).limit(6)),
+        PlanCheck('applied deals of a trip', 'applied_deal',
+                  select(AppliedDeal).where(AppliedDeal.trip_id == 1)),
+        PlanCheck('refund request of a trip', 'refund_request',
+                  select(RefundRequest).where(RefundRequest.trip_id == 1).limit(1)),
+        PlanCheck('pilgrimage travel tips', 'travel_tip',
+                  select(TravelTip).where(TravelTip.pilgrimage_id == 1)),
+        PlanCheck('forum category posts, keyset page', 'forum_post',
+                  select(ForumPost).where(ForumPost.category_id == 1,
+                                          Keyset(ForumPost.created_at, ForumPost.id, descending=True)
+                                          .after([datetime(2026, 1, 1), 100]))
+                  .order_by(ForumPost.created_at.desc(), ForumPost.id.desc()).limit(11), ordered=True),
+        PlanCheck('recent forum posts', 'forum_post', recent_posts_query().statement, ordered=True, limited=True),
+        PlanCheck('thread comments page', 'forum_comment',
+                  select(ForumComment).where(ForumComment.post_id == 1)
+                  .order_by(ForumComment.created_at, ForumComment.id).limit(21), ordered=True),
+        PlanCheck('saved pilgrimage lookup', 'saved_pilgrimage',
+                  select(SavedPilgrimage).where(SavedPilgrimage.user_id == 1, SavedPilgrimage.pilgrimage_id == 1)),
+    ]
+
+def _driver_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def explain(statement):
+    """SQLite's query plan for statement, one detail string per step"""
+    compiled = statement.compile(db.engine, compile_kwargs={"render_postcompile": True})
+    params = tuple(_driver_value(compiled.params[name]) for name in compiled.positiontup)
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", params).all()
+    return [row[-1] for row in rows]
+
+def problems(check, plan):
+    """Reasons the plan is a regression (empty when it is fine)"""
+    found = []
+    steps = [(step.split()[:2], step) for step in plan]
+    # "SCAN t USING [COVERING] INDEX" still visits every row of t, unless a LIMIT stops the ordered walk
+    index_walks = [step for words, step in steps
+                   if check.limited and words == ['SCAN', check.table] and 'INDEX' in step.split()]
+    found += [f"full scan: {step}" for words, step in steps
+              if words == ['SCAN', check.table] and step not in index_walks]
+    if not index_walks and not any(words == ['SEARCH', check.table] for words, _ in steps):
+        found.append(f"no index search on {check.table}")
+    if check.ordered and any('TEMP B-TREE' in step for step in plan):
+        found.append("sorts in a temporary B-tree")
+    return found
+
+def check_query_plans():
+    """Run every check; returns [(check, plan, problems)] or None when the database is not SQLite"""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    results = []
+    for check in hot_queries():
+        plan = explain(check.statement)
+        results.append((check, plan, problems(check, plan)))
+    return results
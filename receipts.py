@@ -0,0 +1,148 @@
+"""PDF receipt rendering and storage.
+
+A paid trip's receipt never changes, so rendered PDFs are stored on disk
+under a content address derived from the confirmation code and the price
+fields. Repeat downloads are streamed straight from that file, and the
+address doubles as the ETag for conditional requests.
+"""
+import copy
+import hashlib
+import os
+import shutil
+import threading
+
+from fpdf import FPDF
+
+# Bump when RECEIPT_LAYOUT or render_receipt() changes so stored PDFs are regenerated
+RECEIPT_LAYOUT_VERSION = 1
+
+# (label, TripPlan attribute) rows of the payment details table
+RECEIPT_LAYOUT = [
+    ('Base Price:', 'base_price'),
+    ('Accommodation Fee:', 'accommodation_fee'),
+    ('Transportation Fee:', 'transportation_fee'),
+    ('Guide Fee:', 'guide_fee'),
+    ('Tax (8.5%):', 'tax_amount')
+]
+
+PRICE_FIELDS = [field for _, field in RECEIPT_LAYOUT] + ['discount_amount', 'total_price']
+
+_prototype = None
+_prototype_lock = threading.Lock()
+
+def _font_prototype():
+    """Blank document with the receipt fonts registered, built once per process.
+
+    Parsing the TrueType fonts is the expensive part of FPDF setup, so every
+    receipt starts from a copy of this prototype instead of re-registering.
+    """
+    global _prototype
+    if _prototype is None:
+        with _prototype_lock:
+            if _prototype is None:
+                pdf = FPDF()
+                try:
+                    pdf.add_font('DejaVu', '', 'DejaVuSans.ttf', uni=True)
+                    pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf', uni=True)
+                    family = 'DejaVu'
+                except:
+                    family = 'helvetica'
+                _prototype = (pdf, family)
+    return _prototype
+
+def receipt_key(trip):
+    """Content address of a trip's receipt: changes whenever any printed field does"""
+    parts = [str(RECEIPT_LAYOUT_VERSION), trip.confirmation_code or '', trip.payment_date.isoformat() if trip.payment_date else '']
+    parts += [f"{getattr(trip, field) or 0:.2f}" for field in PRICE_FIELDS]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+def render_receipt(trip):
+    """Render the receipt PDF for a trip and return its bytes"""
+    prototype, family = _font_prototype()
+    pdf = copy.deepcopy(prototype)
+    use_unicode = family == 'DejaVu'
+    pdf.add_page()
+
+    def set_font(style, size):
+        # The DejaVu italic face is not registered; fall back to regular
+        if use_unicode and style == 'I':
+            style = ''
+        pdf.set_font(family, style, size)
+
+    def format_currency(amount):
+        return f"₹{amount or 0:.2f}" if use_unicode else f"Rs.{amount or 0:.2f}"
+
+    # Header
+    set_font('B', 16)
+    pdf.cell(0, 10, 'Sacred Journeys - Payment Receipt', 0, 1, 'C')
+    pdf.ln(10)
+
+    # Trip details
+    set_font('', 12)
+    pdf.cell(0, 10, f'Confirmation Code: {trip.confirmation_code}', 0, 1)
+    pdf.cell(0, 10, f'Payment Date: {trip.payment_date.strftime("%b %d, %Y %I:%M %p")}', 0, 1)
+    pdf.ln(10)
+
+    # Price breakdown
+    set_font('B', 12)
+    pdf.cell(0, 10, 'Payment Details', 0, 1)
+    set_font('', 12)
+    for label, field in RECEIPT_LAYOUT:
+        pdf.cell(100, 10, label, 0, 0)
+        pdf.cell(0, 10, format_currency(getattr(trip, field)), 0, 1, 'R')
+
+    if trip.discount_amount and trip.discount_amount > 0:
+        pdf.cell(100, 10, 'Discount:', 0, 0)
+        pdf.cell(0, 10, format_currency(-trip.discount_amount), 0, 1, 'R')
+
+    set_font('B', 14)
+    pdf.cell(100, 10, 'Total:', 0, 0)
+    pdf.cell(0, 10, format_currency(trip.total_price), 0, 1, 'R')
+    pdf.ln(15)
+
+    # Footer
+    set_font('I', 10)
+    pdf.cell(0, 10, 'Thank you for choosing Sacred Journeys!', 0, 1, 'C')
+
+    return pdf.output(dest='S').encode('latin1')
+
+def receipt_storage_dir(app):
+    return os.path.join(app.instance_path, app.config.get('RECEIPT_STORAGE_DIR', 'receipts'))
+
+def receipt_path(storage_dir, key):
+    # Two-level fan-out keeps directories small for large exports
+    return os.path.join(storage_dir, key[:2], f'{key}.pdf')
+
+def get_receipt(trip, storage_dir):
+    """Return (path, key) of the stored receipt, rendering it on first request"""
+    key = receipt_key(trip)
+    path = receipt_path(storage_dir, key)
+    if not os.path.exists(path):
+        data = render_receipt(trip)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path, key
+
+def export_receipts(trips, storage_dir, output_dir):
+    """Render (if needed) and export receipts for many trips, e.g. for accounting.
+
+    Files are hard-linked from storage when possible, so exporting an
+    already rendered receipt copies no data. Returns the exported paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    exported = []
+    for trip in trips:
+        path, _ = get_receipt(trip, storage_dir)
+        target = os.path.join(output_dir, f'receipt_{trip.confirmation_code}.pdf')
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+        exported.append(target)
+    return exported
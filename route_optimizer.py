@@ -0,0 +1,270 @@
+"""Geographic ordering of attractions into daily routes.
+
+Attractions are chained into one short tour (nearest neighbour, improved
+with 2-opt while the time budget allows). The tour is cut into consecutive
+days so that each day covers a compact area. Each day's stops are then
+re-ordered the same way and given start times from visit durations,
+travel estimates and opening hours.
+
+NumPy vectorizes the distance matrices and 2-opt move evaluation when it
+is installed; otherwise the same algorithms run in pure Python.
+"""
+import math
+import re
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+TRAVEL_SPEED_KMH = 25.0  # average urban travel speed between sites
+TRANSFER_BUFFER_MINUTES = 10  # parking, security queues, finding the entrance
+DAY_START_MINUTES = 9 * 60
+DEFAULT_VISIT_MINUTES = 60
+DEFAULT_TIME_BUDGET_MS = 50
+
+# Above this many stops the global tour follows a Hilbert curve instead of
+# nearest neighbour + 2-opt, which need the full distance matrix
+FULL_MATRIX_LIMIT = 300
+
+# Below this many cells NumPy's per-call overhead outweighs vectorization
+VECTORIZE_MIN_CELLS = 64
+
+_HOURS_PATTERN = re.compile(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})')
+
+def parse_opening_hours(opening_hours):
+    """Parse 'HH:MM - HH:MM' into (open, close) minutes after midnight, or None"""
+    match = _HOURS_PATTERN.search(opening_hours or '')
+    if not match:
+        return None
+    open_h, open_m, close_h, close_m = (int(group) for group in match.groups())
+    return open_h * 60 + open_m, close_h * 60 + close_m
+
+def format_minutes(minutes):
+    minutes = min(int(round(minutes)), 23 * 60 + 59)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def travel_minutes(distance_km):
+    return distance_km / TRAVEL_SPEED_KMH * 60 + TRANSFER_BUFFER_MINUTES
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    h = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(max(h, 0.0), 1.0)))
+
+def haversine_matrix(lats_a, lons_a, lats_b, lons_b):
+    """Great-circle distances in km between every point of a and every point of b.
+
+    Returns a NumPy array for large inputs and nested lists otherwise.
+    """
+    if np is not None and len(lats_a) * len(lats_b) >= VECTORIZE_MIN_CELLS:
+        lat_a = np.radians(np.asarray(lats_a, dtype=float))[:, None]
+        lon_a = np.radians(np.asarray(lons_a, dtype=float))[:, None]
+        lat_b = np.radians(np.asarray(lats_b, dtype=float))[None, :]
+        lon_b = np.radians(np.asarray(lons_b, dtype=float))[None, :]
+        h = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    return [
+        [haversine_km(lat1, lon1, lat2, lon2) for lat2, lon2 in zip(lats_b, lons_b)]
+        for lat1, lon1 in zip(lats_a, lons_a)
+    ]
+
+def _vectorized(dist):
+    return np is not None and isinstance(dist, np.ndarray)
+
+def _coordinates(attractions):
+    """Latitude/longitude lists; attractions without coordinates sit at the centroid"""
+    known = [(a.latitude, a.longitude) for a in attractions if a.latitude is not None and a.longitude is not None]
+    if known:
+        centroid = (sum(lat for lat, _ in known) / len(known), sum(lon for _, lon in known) / len(known))
+    else:
+        centroid = (0.0, 0.0)
+    lats, lons = [], []
+    for a in attractions:
+        located = a.latitude is not None and a.longitude is not None
+        lats.append(a.latitude if located else centroid[0])
+        lons.append(a.longitude if located else centroid[1])
+    return lats, lons
+
+def nearest_neighbor_tour(dist, start=0):
+    """Greedy open tour over a full distance matrix"""
+    n = len(dist)
+    if n == 0:
+        return []
+    tour = [start]
+    if _vectorized(dist):
+        visited = np.zeros(n, dtype=bool)
+        visited[start] = True
+        current = start
+        for _ in range(n - 1):
+            row = np.where(visited, np.inf, dist[current])
+            current = int(np.argmin(row))
+            visited[current] = True
+            tour.append(current)
+        return tour
+
+    remaining = set(range(n)) - {start}
+    current = start
+    while remaining:
+        row = dist[current]
+        current = min(remaining, key=row.__getitem__)
+        remaining.discard(current)
+        tour.append(current)
+    return tour
+
+def hilbert_order(lats, lons, start=0, bits=16):
+    """Order points along a Hilbert curve, rotated so the tour begins at start.
+
+    Used for very large sets where a full distance matrix would not fit the
+    time budget: neighbours on the curve are close on the map, and sorting
+    is O(n log n).
+    """
+    n = len(lats)
+    side = (1 << bits) - 1
+    lat_min, lat_max = min(lats), max(lats)
+    lon_min, lon_max = min(lons), max(lons)
+    lat_span = (lat_max - lat_min) or 1.0
+    lon_span = (lon_max - lon_min) or 1.0
+
+    if np is not None:
+        x = ((np.asarray(lons, dtype=float) - lon_min) / lon_span * side).astype(np.int64)
+        y = ((np.asarray(lats, dtype=float) - lat_min) / lat_span * side).astype(np.int64)
+        d = np.zeros(n, dtype=np.int64)
+        s = 1 << (bits - 1)
+        while s > 0:
+            rx = (x & s) > 0
+            ry = (y & s) > 0
+            d += s * s * ((3 * rx) ^ ry)
+            # Rotate the quadrant so the curve stays continuous
+            flip = ~ry & rx
+            x = np.where(flip, side - x, x)
+            y = np.where(flip, side - y, y)
+            swap = ~ry
+            x, y = np.where(swap, y, x), np.where(swap, x, y)
+            s >>= 1
+        order = np.argsort(d, kind='stable').tolist()
+    else:
+        def curve_index(lat, lon):
+            x = int((lon - lon_min) / lon_span * side)
+            y = int((lat - lat_min) / lat_span * side)
+            d = 0
+            s = 1 << (bits - 1)
+            while s > 0:
+                rx = 1 if x & s else 0
+                ry = 1 if y & s else 0
+                d += s * s * ((3 * rx) ^ ry)
+                if not ry:
+                    if rx:
+                        x, y = side - x, side - y
+                    x, y = y, x
+                s >>= 1
+            return d
+        keys = [curve_index(lat, lon) for lat, lon in zip(lats, lons)]
+        order = sorted(range(n), key=keys.__getitem__)
+
+    pivot = order.index(start)
+    return order[pivot:] + order[:pivot]
+
+def two_opt(tour, dist, deadline):
+    """Improve an open tour by reversing segments until no gain or the deadline passes.
+
+    dist is a full distance matrix indexed by the tour's node ids.
+    """
+    tour = list(tour)
+    n = len(tour)
+    if n < 4:
+        return tour
+
+    vectorized = _vectorized(dist)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, n - 1):
+            if time.perf_counter() >= deadline:
+                break
+            a, b = tour[i - 1], tour[i]
+            if vectorized:
+                ks = np.arange(i + 1, n)
+                nodes = np.asarray(tour)
+                c = nodes[ks]
+                # Edge after the segment; the last node has none (open tour)
+                d_next = np.zeros(len(ks))
+                has_next = ks + 1 < n
+                d_next[has_next] = dist[c[has_next], nodes[ks[has_next] + 1]] - dist[b, nodes[ks[has_next] + 1]]
+                gains = dist[a, b] - dist[a, c] + d_next
+                best = int(np.argmax(gains))
+                if gains[best] > 1e-9:
+                    k = int(ks[best])
+                    tour[i:k + 1] = reversed(tour[i:k + 1])
+                    improved = True
+            else:
+                for k in range(i + 1, n):
+                    c = tour[k]
+                    delta = dist[a][c] - dist[a][b]
+                    if k + 1 < n:
+                        d = tour[k + 1]
+                        delta += dist[b][d] - dist[c][d]
+                    if delta < -1e-9:
+                        tour[i:k + 1] = reversed(tour[i:k + 1])
+                        improved = True
+                        break
+    return tour
+
+def order_stops(lats, lons, deadline, start=0):
+    """Short open route over the given points, returned as indexes into them"""
+    n = len(lats)
+    if n <= 2:
+        return list(range(n))
+    if n > FULL_MATRIX_LIMIT:
+        return hilbert_order(lats, lons, start)
+    dist = haversine_matrix(lats, lons, lats, lons)
+    return two_opt(nearest_neighbor_tour(dist, start), dist, deadline)
+
+def schedule_route(stops, lats, lons):
+    """Start times ('HH:MM') from cumulative visit and travel durations"""
+    clock = DAY_START_MINUTES
+    start_times = []
+    for i, attraction in enumerate(stops):
+        if i:
+            clock += travel_minutes(haversine_km(lats[i - 1], lons[i - 1], lats[i], lons[i]))
+        hours = parse_opening_hours(attraction.opening_hours)
+        if hours and clock < hours[0]:
+            clock = hours[0]
+        start_times.append(format_minutes(clock))
+        clock += attraction.visit_duration or DEFAULT_VISIT_MINUTES
+    return start_times
+
+def plan_routes(attractions, capacities, time_budget_ms=DEFAULT_TIME_BUDGET_MS):
+    """Split attractions into compact days and schedule each day.
+
+    attractions expose latitude, longitude, visit_duration and
+    opening_hours; the first one anchors the tour. capacities gives the
+    number of stops per day. Returns, per day, a list of
+    (attraction, start_time) pairs in visiting order.
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000.0
+    attractions = list(attractions)[:sum(capacities)]
+    lats, lons = _coordinates(attractions)
+
+    tour = order_stops(lats, lons, deadline)
+
+    days = []
+    position = 0
+    for capacity in capacities:
+        chunk = tour[position:position + capacity]
+        position += len(chunk)
+
+        chunk_lats = [lats[i] for i in chunk]
+        chunk_lons = [lons[i] for i in chunk]
+        if time.perf_counter() < deadline:
+            local_order = order_stops(chunk_lats, chunk_lons, deadline)
+        else:
+            # Out of budget: the global tour order is already compact
+            local_order = list(range(len(chunk)))
+        stops = [attractions[chunk[i]] for i in local_order]
+        start_times = schedule_route(stops, [chunk_lats[i] for i in local_order], [chunk_lons[i] for i in local_order])
+        days.append(list(zip(stops, start_times)))
+    return days
@@ -3,6 +3,13 @@ from flask_login import login_required, current_user
 from models import Pilgrimage, Review, TripPlan, Booking, Notification
 from forms import BookingForm, TripPlanningForm, ReviewForm, ProfileForm
 from extensions import db
+from db_routing import read_only
+from http_cache import conditional, catalog_state, pilgrimage_state
+from listings import get_featured_pilgrimages, paginate_pilgrimages, listing_query, to_rows
+from search import apply_search
+from pricing import apply_price_breakdown, quote_trip, quote_grid
+from dashboard import (load_dashboard, dashboard_counters, trips_section, bookings_section,
+                       trip_to_dict, booking_entry_to_dict)
 from datetime import datetime
 import uuid
 import json
@@ -15,78 +22,24 @@ def generate_confirmation_code():
     """Generate a unique confirmation code for bookings"""
     return f"SJ-{uuid.uuid4().hex[:8].upper()}"
 
-# Calculate trip price function
-def calculate_trip_price(pilgrimage, num_travelers, accommodation_type, transportation, guide_required):
-    """Calculate the total price of a trip based on various factors and return price breakdown"""
-    # Base price from pilgrimage
-    base_price = pilgrimage.price or 100.0  # Default to 100 if no price set
-    
-    # Accommodation multiplier
-    accommodation_multipliers = {
-        'budget': 1.0,
-        'standard': 1.5,
-        'luxury': 2.5
-    }
-    
-    # Transportation multiplier
-    transportation_multipliers = {
-        'public': 1.0,
-        'private': 1.8,
-        'guided_tour': 2.2
-    }
-    
-    # Calculate individual components
-    base_total = base_price * num_travelers
-    accommodation_fee = base_total * (accommodation_multipliers.get(accommodation_type, 1.0) - 1.0)
-    transportation_fee = base_total * (transportation_multipliers.get(transportation, 1.0) - 1.0)
-    guide_fee = 50.0 if guide_required else 0.0
-    
-    # Calculate tax (8.5%)
-    subtotal = base_total + accommodation_fee + transportation_fee + guide_fee
-    tax_amount = round(subtotal * 0.085, 2)
-    
-    # Apply discount (if any) - for example, 5% for trips with more than 3 travelers
-    discount_amount = 0
-    if num_travelers > 3:
-        discount_amount = round(subtotal * 0.05, 2)
-    
-    # Calculate total
-    total = subtotal + tax_amount - discount_amount
-    
-    # Return price breakdown
-    price_breakdown = {
-        'base_price': base_price,
-        'base_total': base_total,
-        'accommodation_fee': accommodation_fee,
-        'transportation_fee': transportation_fee,
-        'guide_fee': guide_fee,
-        'subtotal': subtotal,
-        'tax_amount': tax_amount,
-        'discount_amount': discount_amount,
-        'total': round(total, 2)
-    }
-    
-    return price_breakdown
-
 @main.route('/')
 def index():
-    # Get featured pilgrimages
-    featured_pilgrimages = Pilgrimage.query.filter_by(featured=True).limit(6).all()
-    
-    # If no featured pilgrimages, get the ones with highest ratings
-    if not featured_pilgrimages:
-        # This is a simple approach - in a real app, you might want to calculate this differently
-        featured_pilgrimages = Pilgrimage.query.limit(6).all()
+    # Get featured pilgrimages (falls back to the first ones if none are featured)
+    featured_pilgrimages = get_featured_pilgrimages(limit=6)
     
     return render_template('index.html', featured_pilgrimages=featured_pilgrimages)
 
 @main.route('/pilgrimages')
+@read_only
+@conditional(catalog_state, html=True)
 def pilgrimages():
     page = request.args.get('page', 1, type=int)
-    pilgrimages = Pilgrimage.query.paginate(page=page, per_page=9)
+    pilgrimages = paginate_pilgrimages(page=page, per_page=9, cursor=request.args.get('cursor'))
     return render_template('pilgrimages.html', pilgrimages=pilgrimages)
 
 @main.route('/pilgrimage/<int:id>', methods=['GET', 'POST'])
+@read_only  # GET only; review submissions go to the primary
+@conditional(pilgrimage_state, html=True)
 def pilgrimage(id):
     pilgrimage = Pilgrimage.query.get_or_404(id)
     form = BookingForm()
@@ -170,7 +123,7 @@ def plan_trip():
         confirmation_code = generate_confirmation_code()
         
         # Calculate price breakdown
-        price_breakdown = calculate_trip_price(
+        price_breakdown = quote_trip(
             pilgrimage,
             form.num_travelers.data,
             form.accommodation_type.data,
@@ -191,15 +144,9 @@ def plan_trip():
             guide_required=form.guide_required.data,
             additional_notes=form.additional_notes.data,
             confirmation_code=confirmation_code,
-            total_price=price_breakdown['total'],
-            payment_status='pending',
-            base_price=price_breakdown['base_price'],
-            accommodation_fee=price_breakdown['accommodation_fee'],
-            transportation_fee=price_breakdown['transportation_fee'],
-            guide_fee=price_breakdown['guide_fee'],
-            tax_amount=price_breakdown['tax_amount'],
-            discount_amount=price_breakdown['discount_amount']
+            payment_status='pending'
         )
+        apply_price_breakdown(trip_plan, price_breakdown)
         
         db.session.add(trip_plan)
         db.session.commit()
@@ -211,7 +158,11 @@ def plan_trip():
         for error in errors:
             flash(f"{getattr(form, field).label.text}: {error}", "danger")
     
-    return render_template('plan_trip.html', form=form)
+    # Live quotes for every accommodation x transportation option of the selected pilgrimage
+    selected = next((p for p in pilgrimages if str(p.id) == str(form.pilgrimage.data)), pilgrimages[0] if pilgrimages else None)
+    quotes = quote_grid(selected, form.num_travelers.data or 1, bool(form.guide_required.data)) if selected else None
+    
+    return render_template('plan_trip.html', form=form, quotes=quotes)
 
 @main.route('/trip_details/<int:trip_id>')
 @login_required
@@ -228,18 +179,42 @@ def trip_details(trip_id):
 @main.route('/dashboard')
 @login_required
 def dashboard():
-    # Get user's bookings and trip plans
-    bookings = Booking.query.filter_by(user_id=current_user.id).all()
-    trip_plans = TripPlan.query.filter_by(user_id=current_user.id).all()
-    
     # Get current date for comparing with travel dates
     now = datetime.now().date()
     
+    # Counters and one page of each section, in a fixed number of queries
+    view = load_dashboard(current_user.id, now,
+                          trips_page=request.args.get('trips_page', 1, type=int),
+                          bookings_page=request.args.get('bookings_page', 1, type=int),
+                          per_page=current_app.config.get('DASHBOARD_PAGE_SIZE', 10))
+    
     return render_template('dashboard.html', 
-                          bookings=bookings, 
-                          trip_plans=trip_plans,
+                          counters=view['counters'],
+                          trips=view['trips'],
+                          bookings=view['bookings'],
                           now=now)
 
+@main.route('/api/dashboard/<section>')
+@login_required
+def dashboard_section(section):
+    """One page of a dashboard section as JSON"""
+    if section not in ('trips', 'bookings'):
+        return jsonify({'error': 'Unknown dashboard section'}), 404
+    
+    now = datetime.now().date()
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config.get('DASHBOARD_PAGE_SIZE', 10)
+    counters = dashboard_counters(current_user.id, now)
+    
+    if section == 'trips':
+        result = trips_section(current_user.id, page, per_page, counters['trips'])
+        items = [trip_to_dict(trip) for trip in result.items]
+    else:
+        result = bookings_section(current_user.id, page, per_page, counters['bookings'] + counters['paid_trips'])
+        items = [booking_entry_to_dict(entry) for entry in result.items]
+    
+    return jsonify({'items': items, 'pagination': result.meta(), 'counters': counters})
+
 @main.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -312,22 +287,21 @@ def search_pilgrimages():
     if not query or len(query) < 3:
         return jsonify([])
     
-    # Search for pilgrimages matching the query
-    pilgrimages = Pilgrimage.query.filter(
-        Pilgrimage.name.ilike(f'%{query}%') | 
-        Pilgrimage.location.ilike(f'%{query}%') |
-        Pilgrimage.description.ilike(f'%{query}%')
-    ).all()
+    # Ranked full-text search over name, location and description
+    limit = current_app.config.get('SEARCH_RESULTS_LIMIT', 20)
+    pilgrimages = to_rows(apply_search(listing_query(), query).limit(limit).all())
     
     # Format results
-    results = [{
-        'id': p.id,
-        'name': p.name,
-        'location': p.location,
-        'image_url': p.image_url,
-        'price': p.price,
-        'average_rating': p.average_rating
-    } for p in pilgrimages]
+    results = [p.to_dict() for p in pilgrimages]
     
     return jsonify(results)
 
+@main.route('/api/quotes')
+@login_required
+def trip_quotes():
+    """Quotes for every accommodation x transportation combination of a pilgrimage"""
+    pilgrimage = Pilgrimage.query.get_or_404(request.args.get('pilgrimage_id', type=int))
+    num_travelers = min(max(request.args.get('num_travelers', 1, type=int), 1), 20)
+    guide_required = request.args.get('guide_required') in ('1', 'true', 'y', 'on')
+    
+    return jsonify(quote_grid(pilgrimage, num_travelers, guide_required))
@@ -0,0 +1,155 @@
+"""Full-text search over the pilgrimage catalog.
+
+On SQLite the catalog is mirrored into an FTS5 table ranked with bm25();
+other databases fall back to a weighted ILIKE match so the search API
+behaves the same everywhere, only slower.
+"""
+import re
+from sqlalchemy import case, column, event, func, inspect, literal_column, or_, table, text
+from extensions import db
+from models import Pilgrimage
+
+FTS_TABLE = 'pilgrimage_fts'
+FTS_COLUMNS = ('name', 'location', 'description')
+
+# bm25() column weights, in FTS_COLUMNS order: a hit in the name outranks
+# a hit in the location, which outranks a hit in the description
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+fts = table(FTS_TABLE, column('rowid'))
+
+# Engine URL -> whether the FTS table exists there
+_fts_available = {}
+
+def _engine_key(bind):
+    engine = getattr(bind, 'engine', bind)
+    return str(engine.url)
+
+def fts_enabled(bind=None):
+    """Return True when the FTS index exists on the given engine/connection"""
+    bind = bind if bind is not None else db.engine
+    key = _engine_key(bind)
+    if key not in _fts_available:
+        if bind.dialect.name != 'sqlite':
+            _fts_available[key] = False
+        elif hasattr(bind, 'connect'):
+            with bind.connect() as connection:
+                _fts_available[key] = _fts_table_exists(connection)
+        else:
+            _fts_available[key] = _fts_table_exists(bind)
+    return _fts_available[key]
+
+def _fts_table_exists(connection):
+    return connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': FTS_TABLE}
+    ).first() is not None
+
+def ensure_search_index():
+    """Create the FTS table if the database supports it and fill it on first use"""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        _fts_available[_engine_key(engine)] = False
+        return False
+
+    with engine.begin() as connection:
+        if not _fts_table_exists(connection):
+            try:
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"{', '.join(FTS_COLUMNS)}, "
+                    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+                ))
+            except Exception:
+                # SQLite was built without FTS5; use the portable fallback
+                _fts_available[_engine_key(engine)] = False
+                return False
+            _rebuild(connection)
+
+    _fts_available[_engine_key(engine)] = True
+    return True
+
+def _rebuild(connection):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    connection.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+        f"SELECT id, {', '.join(FTS_COLUMNS)} FROM pilgrimage"
+    ))
+
+def rebuild_search_index():
+    """Re-index the whole catalog, e.g. after seeding or bulk deletes"""
+    if not ensure_search_index():
+        return False
+    with db.engine.begin() as connection:
+        _rebuild(connection)
+    return True
+
+def _index_row(connection, pilgrimage):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': pilgrimage.id})
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+             f"VALUES (:id, {', '.join(':' + name for name in FTS_COLUMNS)})"),
+        {'id': pilgrimage.id, **{name: getattr(pilgrimage, name) for name in FTS_COLUMNS}}
+    )
+
+@event.listens_for(Pilgrimage, 'after_insert')
+def _pilgrimage_inserted(mapper, connection, pilgrimage):
+    if fts_enabled(connection):
+        _index_row(connection, pilgrimage)
+
+@event.listens_for(Pilgrimage, 'after_update')
+def _pilgrimage_updated(mapper, connection, pilgrimage):
+    if not fts_enabled(connection):
+        return
+    state = inspect(pilgrimage)
+    if any(state.attrs[name].history.has_changes() for name in FTS_COLUMNS):
+        _index_row(connection, pilgrimage)
+
+@event.listens_for(Pilgrimage, 'after_delete')
+def _pilgrimage_deleted(mapper, connection, pilgrimage):
+    if fts_enabled(connection):
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': pilgrimage.id})
+
+def tokenize(query_text):
+    return re.findall(r'\w+', (query_text or '').lower())
+
+def build_match_expression(query_text, columns=None):
+    """Turn user input into an FTS5 MATCH expression with prefix matching.
+
+    Every token must match (implicit AND) and the last one is treated as a
+    prefix so results update while the user is still typing.
+    """
+    tokens = tokenize(query_text)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    expression = ' '.join(terms)
+    if columns:
+        expression = f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+def apply_search(query, query_text, columns=FTS_COLUMNS):
+    """Filter and rank a Pilgrimage query by relevance to query_text"""
+    tokens = tokenize(query_text)
+    if not tokens:
+        return query
+
+    if fts_enabled():
+        match = build_match_expression(query_text, columns if tuple(columns) != FTS_COLUMNS else None)
+        fts_column = literal_column(FTS_TABLE)
+        return query.join(fts, fts.c.rowid == Pilgrimage.id).filter(
+            fts_column.op('MATCH')(match)
+        ).order_by(func.bm25(fts_column, *BM25_WEIGHTS), Pilgrimage.id)
+
+    # Portable fallback: every token must appear in one of the columns, and
+    # rows are ranked by the weights of the columns containing the full query
+    for token in tokens:
+        query = query.filter(or_(*[
+            getattr(Pilgrimage, name).ilike(f'%{token}%') for name in columns
+        ]))
+    weights = dict(zip(FTS_COLUMNS, BM25_WEIGHTS))
+    rank = sum(
+        case((getattr(Pilgrimage, name).ilike(f'%{query_text}%'), weights[name]), else_=0)
+        for name in columns
+    )
+    return query.order_by(rank.desc(), Pilgrimage.id)
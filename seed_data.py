@@ -1,6 +1,7 @@
 from app import create_app
 from extensions import db
 from models import Pilgrimage
+from search import rebuild_search_index
 import os
 import shutil
 import requests
@@ -508,6 +509,9 @@ def seed_pilgrimages():
         db.session.add(pilgrimage)
     
     db.session.commit()
+    
+    # The bulk delete above bypasses the ORM hooks, so re-index from scratch
+    rebuild_search_index()
     print("Database has been refreshed with pilgrimage data.")
 
 if __name__ == '__main__':
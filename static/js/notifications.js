@@ -0,0 +1,60 @@
+// Live unread badge: listens to /notifications/stream when the server can hold
+// it open (data-push="stream"), otherwise polls /notifications/poll
+document.addEventListener("DOMContentLoaded", () => {
+  const badge = document.getElementById("unread-notifications")
+  if (!badge) return
+
+  let unread = parseInt(badge.textContent, 10) || 0
+  let lastId = null
+
+  const render = () => {
+    badge.textContent = unread
+    badge.classList.toggle("d-none", unread <= 0)
+  }
+
+  const apply = (delta) => {
+    if (delta.type === "notification") {
+      lastId = Math.max(lastId || 0, delta.notification.id || 0)
+      unread += delta.unread_delta
+    } else if (delta.type === "read") {
+      unread = delta.ids === null ? 0 : Math.max(unread + delta.unread_delta, 0)
+    }
+    render()
+  }
+
+  const resync = () =>
+    fetch("/notifications/unread-count")
+      .then((response) => response.json())
+      .then((data) => {
+        unread = data.unread_count
+        render()
+      })
+
+  if (badge.dataset.push === "stream" && window.EventSource) {
+    const source = new EventSource("/notifications/stream")
+    source.addEventListener("notification", (e) => apply(JSON.parse(e.data)))
+    source.addEventListener("read", (e) => apply(JSON.parse(e.data)))
+    source.addEventListener("resync", resync)
+    return
+  }
+
+  // Long-polls when the server holds the request (retry_after 0), otherwise
+  // waits retry_after seconds between quick polls
+  const wait = (seconds) => new Promise((resolve) => setTimeout(resolve, seconds * 1000))
+
+  const poll = () => {
+    const after = lastId ? `&after=${lastId}` : ""
+    fetch(`/notifications/poll?timeout=25${after}`)
+      .then((response) => response.json())
+      .then((data) => {
+        data.deltas.forEach(apply)
+        lastId = Math.max(lastId || 0, data.last_id || 0)
+        unread = data.unread_count
+        render()
+        return wait(data.retry_after || 0)
+      })
+      .catch(() => wait(5))
+      .then(poll)
+  }
+  poll()
+})
@@ -0,0 +1,61 @@
+"""Read-side loading of stored itineraries for the planner, print and edit views.
+
+DailyPlan.attractions is a dynamic relationship, so walking it in a template
+costs one query per day plus one lazy load per Attraction. The loaders here
+fetch a trip's days and all of their stops (with attractions) in a fixed
+number of queries and hand the templates pre-grouped, pre-sorted days.
+"""
+from collections import defaultdict
+
+from sqlalchemy.orm import joinedload
+
+from models import DailyPlan, DailyPlanAttraction
+
+class ItineraryDay:
+    """A DailyPlan with its stops already loaded.
+
+    schedule is sorted by start time (timeline views); stops is sorted by
+    the user's chosen order (edit view).
+    """
+    __slots__ = ('plan', 'stops', 'schedule')
+
+    def __init__(self, plan, stops):
+        self.plan = plan
+        self.stops = sorted(stops, key=lambda s: (s.order or 0, s.id))
+        self.schedule = sorted(stops, key=lambda s: (s.start_time or '', s.order or 0, s.id))
+
+    @property
+    def map_points(self):
+        """JSON-ready markers for the day's map"""
+        return [
+            {
+                'name': stop.attraction.name,
+                'start_time': stop.start_time,
+                'lat': stop.attraction.latitude,
+                'lng': stop.attraction.longitude
+            }
+            for stop in self.schedule
+            if stop.attraction.latitude and stop.attraction.longitude
+        ]
+
+def load_day_stops(day_ids):
+    """Stops of many days, with their attractions, in one query; keyed by day id"""
+    grouped = defaultdict(list)
+    if not day_ids:
+        return grouped
+    stops = DailyPlanAttraction.query.options(
+        joinedload(DailyPlanAttraction.attraction)
+    ).filter(DailyPlanAttraction.daily_plan_id.in_(day_ids)).all()
+    for stop in stops:
+        grouped[stop.daily_plan_id].append(stop)
+    return grouped
+
+def load_itinerary(trip_id):
+    """All days of a trip, in day order, in two queries"""
+    plans = DailyPlan.query.filter_by(trip_id=trip_id).order_by(DailyPlan.day_number).all()
+    stops = load_day_stops([plan.id for plan in plans])
+    return [ItineraryDay(plan, stops.get(plan.id, [])) for plan in plans]
+
+def load_day(plan):
+    """A single day with its stops, in one query"""
+    return ItineraryDay(plan, load_day_stops([plan.id]).get(plan.id, []))
@@ -1,7 +1,8 @@
 from flask import Blueprint, jsonify, request, flash, redirect, url_for
 from flask_login import login_required, current_user
-from models import TripPlan, Booking, Notification, User
+from models import TripPlan, Booking, User
 from extensions import db
+from notifications import notify
 from datetime import datetime
 import uuid
 
@@ -23,13 +24,12 @@ def delete_trip(trip_id):
     
     try:
         # Create notification
-        notification = Notification(
-            user_id=current_user.id,
-            title='Trip Deleted',
-            message=f'Your trip to {trip.pilgrimage.name} has been deleted.',
+        notify(
+            current_user.id,
+            'Trip Deleted',
+            f'Your trip to {trip.pilgrimage.name} has been deleted.',
             link=url_for('main.pilgrimages')
         )
-        db.session.add(notification)
         
         # Delete the trip
         db.session.delete(trip)
@@ -52,13 +52,12 @@ def cancel_booking(booking_id):
     
     try:
         # Create notification
-        notification = Notification(
-            user_id=current_user.id,
-            title='Booking Cancelled',
-            message=f'Your booking for {booking.pilgrimage.name} has been cancelled.',
+        notify(
+            current_user.id,
+            'Booking Cancelled',
+            f'Your booking for {booking.pilgrimage.name} has been cancelled.',
             link=url_for('main.pilgrimages')
         )
-        db.session.add(notification)
         
         # Delete the booking
         db.session.delete(booking)
@@ -99,24 +98,22 @@ def refund_request(trip_id):
         trip.refund_requested_at = datetime.utcnow()
         
         # Create notification for user
-        user_notification = Notification(
-            user_id=current_user.id,
-            title='Refund Request Submitted',
-            message=f'Your refund request for the trip to {trip.pilgrimage.name} has been submitted and is being processed.',
+        notify(
+            current_user.id,
+            'Refund Request Submitted',
+            f'Your refund request for the trip to {trip.pilgrimage.name} has been submitted and is being processed.',
             link=url_for('main.trip_details', trip_id=trip.id)
         )
-        db.session.add(user_notification)
         
         # Create notification for admin (assuming admin has user_id=1)
         admin = User.query.filter_by(id=1).first()
         if admin:
-            admin_notification = Notification(
-                user_id=admin.id,
-                title='New Refund Request',
-                message=f'User {current_user.username} has requested a refund for their trip to {trip.pilgrimage.name}.',
+            notify(
+                admin.id,
+                'New Refund Request',
+                f'User {current_user.username} has requested a refund for their trip to {trip.pilgrimage.name}.',
                 link=url_for('main.trip_details', trip_id=trip.id)
             )
-            db.session.add(admin_notification)
         
         db.session.commit()
         
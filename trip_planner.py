@@ -1,9 +1,14 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from models import TripPlan, DailyPlan, DailyPlanAttraction, Attraction, Pilgrimage, Deal, Notification
+from models import TripPlan, DailyPlan, DailyPlanAttraction, Attraction, Pilgrimage, AppliedDeal
 from extensions import db
-from datetime import datetime, timedelta
-import json
+from db_routing import read_only
+from notifications import notify
+from itinerary import plan_for_trip, persist_itinerary, save_day_stops, save_snapshot
+from trip_loader import load_itinerary, load_day
+from deal_catalog import deal_catalog
+from pricing import deal_discount
+from datetime import datetime
 import random
 
 trip_planner_bp = Blueprint('trip_planner', __name__)
@@ -19,12 +24,12 @@ def planner(trip_id):
         flash('You do not have permission to access this trip.', 'danger')
         return redirect(url_for('main.dashboard'))
     
-    # Get or create daily plans
-    daily_plans = DailyPlan.query.filter_by(trip_id=trip.id).order_by(DailyPlan.day_number).all()
+    # Get or create daily plans, with their attractions preloaded
+    days = load_itinerary(trip.id)
     
     # If no daily plans exist, create them
-    if not daily_plans:
-        daily_plans = create_initial_daily_plans(trip)
+    if not days:
+        days = create_initial_daily_plans(trip)
     
     # Get available attractions for this pilgrimage
     attractions = Attraction.query.filter_by(pilgrimage_id=trip.pilgrimage_id).all()
@@ -32,13 +37,12 @@ def planner(trip_id):
     # Get available deals
     deals = get_applicable_deals(trip)
     
-    # Pass DailyPlanAttraction to the template context
     return render_template('trip_planner/planner.html', 
                           trip=trip, 
-                          daily_plans=daily_plans,
+                          days=days,
+                          daily_plans=[day.plan for day in days],
                           attractions=attractions,
-                          deals=deals,
-                          DailyPlanAttraction=DailyPlanAttraction)  # Add this line
+                          deals=deals)
 
 @trip_planner_bp.route('/trip/<int:trip_id>/generate-itinerary', methods=['POST'])
 @login_required
@@ -51,13 +55,6 @@ def generate_itinerary(trip_id):
         flash('You do not have permission to access this trip.', 'danger')
         return redirect(url_for('main.dashboard'))
     
-    # Delete existing daily plans if any
-    DailyPlan.query.filter_by(trip_id=trip.id).delete()
-    db.session.commit()
-    
-    # Create new daily plans
-    daily_plans = create_initial_daily_plans(trip)
-    
     # Get attractions for this pilgrimage
     attractions = Attraction.query.filter_by(pilgrimage_id=trip.pilgrimage_id).all()
     
@@ -66,8 +63,10 @@ def generate_itinerary(trip_id):
         create_dummy_attractions(trip.pilgrimage_id)
         attractions = Attraction.query.filter_by(pilgrimage_id=trip.pilgrimage_id).all()
     
-    # Distribute attractions across days
-    distribute_attractions(daily_plans, attractions)
+    # Plan in memory, then replace the stored itinerary in one transaction
+    days = plan_for_trip(trip, attractions)
+    persist_itinerary(trip.id, days)
+    db.session.commit()
     
     flash('Itinerary has been generated successfully!', 'success')
     return redirect(url_for('trip_planner.planner', trip_id=trip.id))
@@ -92,27 +91,20 @@ def edit_daily_plan(trip_id, day_id):
         daily_plan.transportation = request.form.get('transportation')
         daily_plan.meal_plan = request.form.get('meal_plan')
         
-        # Handle attractions
-        # First, remove all existing attractions
-        DailyPlanAttraction.query.filter_by(daily_plan_id=daily_plan.id).delete()
-        
-        # Add new attractions from form
+        # Apply only the attraction rows that changed
         attraction_ids = request.form.getlist('attractions[]')
         start_times = request.form.getlist('start_times[]')
         notes = request.form.getlist('notes[]')
-        
-        for i, attraction_id in enumerate(attraction_ids):
-            if attraction_id:
-                attraction = Attraction.query.get(attraction_id)
-                if attraction:
-                    plan_attraction = DailyPlanAttraction(
-                        daily_plan_id=daily_plan.id,
-                        attraction_id=attraction_id,
-                        start_time=start_times[i] if i < len(start_times) else "09:00",
-                        notes=notes[i] if i < len(notes) else "",
-                        order=i
-                    )
-                    db.session.add(plan_attraction)
+        submitted = [
+            (
+                attraction_id,
+                start_times[i] if i < len(start_times) else "09:00",
+                notes[i] if i < len(notes) else ""
+            )
+            for i, attraction_id in enumerate(attraction_ids)
+            if attraction_id
+        ]
+        save_day_stops(daily_plan, trip.pilgrimage_id, submitted)
         
         db.session.commit()
         flash('Day plan updated successfully!', 'success')
@@ -124,6 +116,7 @@ def edit_daily_plan(trip_id, day_id):
     return render_template('trip_planner/edit_day.html', 
                           trip=trip, 
                           daily_plan=daily_plan,
+                          day=load_day(daily_plan),
                           attractions=attractions)
 
 @trip_planner_bp.route('/trip/<int:trip_id>/apply-deal', methods=['POST'])
@@ -141,7 +134,7 @@ def apply_deal(trip_id):
         return jsonify({'success': False, 'error': 'No deal code provided'}), 400
     
     # Find the deal
-    deal = Deal.query.filter_by(code=deal_code, active=True).first()
+    deal = deal_catalog.get_by_code(deal_code)
     if not deal:
         return jsonify({'success': False, 'error': 'Invalid or expired deal code'}), 400
     
@@ -162,30 +155,27 @@ def apply_deal(trip_id):
     
     # Apply the discount
     original_price = trip.total_price
-    discount_amount = original_price * (deal.discount_percentage / 100)
+    discount_amount = deal_discount(original_price, deal)
     trip.discount_amount = discount_amount
     trip.total_price = original_price - discount_amount
     
-    # Save the applied deal info
-    trip_deals = json.loads(trip.itinerary or '{}')
-    trip_deals['applied_deal'] = {
-        'code': deal.code,
-        'title': deal.title,
-        'discount_percentage': deal.discount_percentage,
-        'discount_amount': discount_amount
-    }
-    trip.itinerary = json.dumps(trip_deals)
-    
-    db.session.commit()
-    
-    # Create notification
-    notification = Notification(
-        user_id=current_user.id,
-        title='Deal Applied',
-        message=f'The deal "{deal.title}" has been applied to your trip to {trip.pilgrimage.name}, saving you ₹{discount_amount:.2f}!',
+    # Record the applied deal
+    db.session.add(AppliedDeal(
+        trip_id=trip.id,
+        deal_id=deal.id,
+        code=deal.code,
+        title=deal.title,
+        discount_percentage=deal.discount_percentage,
+        discount_amount=discount_amount
+    ))
+    
+    # Create notification, written in the same commit
+    notify(
+        current_user.id,
+        'Deal Applied',
+        f'The deal "{deal.title}" has been applied to your trip to {trip.pilgrimage.name}, saving you ₹{discount_amount:.2f}!',
         link=url_for('trip_planner.planner', trip_id=trip.id)
     )
-    db.session.add(notification)
     db.session.commit()
     
     return jsonify({
@@ -205,46 +195,17 @@ def save_itinerary(trip_id):
     if trip.user_id != current_user.id:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 403
     
-    # Get all daily plans
-    daily_plans = DailyPlan.query.filter_by(trip_id=trip.id).order_by(DailyPlan.day_number).all()
-    
-    # Format the itinerary
-    itinerary = []
-    for plan in daily_plans:
-        day_attractions = []
-        for pa in plan.attractions.order_by(DailyPlanAttraction.order).all():
-            attraction = Attraction.query.get(pa.attraction_id)
-            day_attractions.append({
-                'id': attraction.id,
-                'name': attraction.name,
-                'start_time': pa.start_time,
-                'duration': attraction.visit_duration,
-                'notes': pa.notes
-            })
-        
-        itinerary.append({
-            'day_number': plan.day_number,
-            'date': plan.date.strftime('%Y-%m-%d'),
-            'title': plan.title,
-            'description': plan.description,
-            'accommodation': plan.accommodation,
-            'transportation': plan.transportation,
-            'meal_plan': plan.meal_plan,
-            'attractions': day_attractions
-        })
-    
-    # Save to trip
-    trip.itinerary = json.dumps(itinerary)
-    db.session.commit()
+    # Snapshot the itinerary; an unchanged itinerary is not written again
+    if not save_snapshot(trip):
+        return jsonify({'success': True, 'message': 'Itinerary is already up to date.'})
     
     # Create notification
-    notification = Notification(
-        user_id=current_user.id,
-        title='Itinerary Saved',
-        message=f'Your itinerary for {trip.pilgrimage.name} has been saved successfully.',
+    notify(
+        current_user.id,
+        'Itinerary Saved',
+        f'Your itinerary for {trip.pilgrimage.name} has been saved successfully.',
         link=url_for('trip_planner.planner', trip_id=trip.id)
     )
-    db.session.add(notification)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'Itinerary saved successfully!'})
@@ -260,101 +221,28 @@ def print_itinerary(trip_id):
         flash('You do not have permission to access this trip.', 'danger')
         return redirect(url_for('main.dashboard'))
     
-    # Get daily plans
-    daily_plans = DailyPlan.query.filter_by(trip_id=trip.id).order_by(DailyPlan.day_number).all()
+    # Get daily plans with their attractions preloaded
+    days = load_itinerary(trip.id)
     
     return render_template('trip_planner/print_itinerary.html', 
                           trip=trip, 
-                          daily_plans=daily_plans)
+                          days=days,
+                          now=datetime.now)
 
 @trip_planner_bp.route('/deals')
+@read_only
 def deals():
     """View all available deals"""
-    today = datetime.now().date()
-    active_deals = Deal.query.filter(
-        Deal.active == True,
-        Deal.valid_from <= today,
-        Deal.valid_to >= today
-    ).all()
+    active_deals = deal_catalog.valid_on(datetime.now().date())
     
     return render_template('trip_planner/deals.html', deals=active_deals)
 
 # Helper functions
 def create_initial_daily_plans(trip):
-    """Create initial daily plans for each day of the trip"""
-    daily_plans = []
-    trip_duration = (trip.end_date - trip.start_date).days + 1
-    
-    for day in range(1, trip_duration + 1):
-        date = trip.start_date + timedelta(days=day-1)
-        
-        # Create a title based on the day number
-        if day == 1:
-            title = "Arrival & Orientation"
-        elif day == trip_duration:
-            title = "Farewell & Departure"
-        else:
-            title = f"Day {day} Exploration"
-        
-        daily_plan = DailyPlan(
-            trip_id=trip.id,
-            day_number=day,
-            date=date,
-            title=title,
-            description=f"Explore the wonders of {trip.pilgrimage.name} on day {day} of your journey.",
-            accommodation=trip.accommodation_type.capitalize(),
-            transportation=trip.transportation.replace('_', ' ').capitalize(),
-            meal_plan="Breakfast, Lunch, Dinner"
-        )
-        
-        db.session.add(daily_plan)
-        daily_plans.append(daily_plan)
-    
-    db.session.commit()
-    return daily_plans
-
-def distribute_attractions(daily_plans, attractions):
-    """Distribute attractions across days in a logical manner"""
-    if not attractions:
-        return
-    
-    # Sort attractions by popularity
-    sorted_attractions = sorted(attractions, key=lambda x: x.popularity, reverse=True)
-    
-    # Calculate attractions per day, ensuring top attractions are distributed first
-    attractions_per_day = max(1, min(4, len(sorted_attractions) // len(daily_plans)))
-    
-    # Distribute attractions
-    attraction_index = 0
-    for plan in daily_plans:
-        # Skip some attractions on first and last day
-        max_attractions = attractions_per_day
-        if plan.day_number == 1 or plan.day_number == len(daily_plans):
-            max_attractions = max(1, attractions_per_day - 1)
-        
-        # Add attractions to this day
-        for i in range(min(max_attractions, len(sorted_attractions) - attraction_index)):
-            if attraction_index >= len(sorted_attractions):
-                break
-                
-            attraction = sorted_attractions[attraction_index]
-            
-            # Calculate a reasonable start time between 9 AM and 4 PM
-            hour = 9 + (i * 2) % 7  # Spread between 9 AM and 4 PM
-            minute = (i * 15) % 60  # Vary the minutes
-            start_time = f"{hour:02d}:{minute:02d}"
-            
-            plan_attraction = DailyPlanAttraction(
-                daily_plan_id=plan.id,
-                attraction_id=attraction.id,
-                start_time=start_time,
-                order=i
-            )
-            
-            db.session.add(plan_attraction)
-            attraction_index += 1
-    
+    """Create initial daily plans (without attractions) for each day of the trip"""
+    persist_itinerary(trip.id, plan_for_trip(trip, []))
     db.session.commit()
+    return load_itinerary(trip.id)
 
 def create_dummy_attractions(pilgrimage_id):
     """Create dummy attractions for testing"""
@@ -399,10 +287,6 @@ def create_dummy_attractions(pilgrimage_id):
             'visit_duration': 90,
             'popularity': 7
         },
-        {
-            'name': f"Meditation Garden",
-            'description': f"A peaceful garden perfect for  7"
-        },
         {
             'name': f"Meditation Garden",
             'description': f"A peaceful garden perfect for meditation and spiritual reflection.",
@@ -436,20 +320,5 @@ def get_applicable_deals(trip):
     today = datetime.now().date()
     trip_duration = (trip.end_date - trip.start_date).days
     
-    # Find active deals that match the criteria
-    deals = Deal.query.filter(
-        Deal.active == True,
-        Deal.valid_from <= today,
-        Deal.valid_to >= today,
-        Deal.min_travelers <= trip.num_travelers,
-        Deal.min_days <= trip_duration
-    ).all()
-    
-    # Filter for pilgrimage-specific deals or general deals
-    applicable_deals = [
-        deal for deal in deals 
-        if deal.pilgrimage_id is None or deal.pilgrimage_id == trip.pilgrimage_id
-    ]
-    
-    return applicable_deals
-
+    # Pilgrimage-specific and general deals, served from the in-memory catalog
+    return deal_catalog.applicable(trip.pilgrimage_id, trip.num_travelers, trip_duration, today)
@@ -0,0 +1,181 @@
+"""Buffered view counters.
+
+Counting a page view with `row.views += 1; commit()` turns every read into
+a write transaction, and popular rows serialize on the database write lock.
+view_counter.hit(column, id) only bumps an in-memory counter instead. A
+background thread flushes all pending counts every
+VIEW_COUNTER_FLUSH_INTERVAL seconds, or as soon as VIEW_COUNTER_MAX_PENDING
+views have piled up. Each flush is one statement per table:
+
+    UPDATE forum_post SET views = views + CASE id WHEN 7 THEN 3 WHEN 9 THEN 1 ELSE 0 END
+    WHERE id IN (7, 9)
+
+Every worker process keeps its own buffer and flushes increments rather
+than totals. Increments commute, so any number of processes can flush
+without coordinating, and none of them overwrites another's counts.
+Counts are buffered per app, so a process that builds more than one app
+(say a CLI check against a scratch database) writes each app's views to
+that app's own database. Pending counts are also flushed at interpreter
+exit.
+
+A failed flush puts its counts back to be retried. While the database is
+reachable, a hard crash loses at most one interval (or MAX_PENDING views)
+per process. While flushes keep failing, counts accumulate in memory
+(bounded by the number of distinct rows, not by views), and a crash in
+that window loses all of them.
+"""
+import atexit
+import logging
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import case
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Ids per UPDATE, keeping each statement well under SQLite's bound-parameter limit
+FLUSH_CHUNK_SIZE = 500
+
+class ViewCounter:
+    """Per-process view counts flushed in batches; configure with init_app()"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 10
+        self.max_pending = 1000
+        self._pending = {}  # app -> {"table.column" -> {row id: views not yet written}}
+        self._columns = {}
+        self._pending_hits = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.app is None:
+            # The first app configures the process-wide flusher; later apps only get their own buffer
+            self.app = app
+            self.interval = app.config.get('VIEW_COUNTER_FLUSH_INTERVAL', 10)
+            self.max_pending = app.config.get('VIEW_COUNTER_MAX_PENDING', 1000)
+            atexit.register(self._flush_at_exit)
+        app.extensions['view_counter'] = self
+
+        if app.config.get('VIEW_COUNTER_AUTOSTART', True) and not app.testing:
+            # Start lazily so each forked worker process gets its own flusher
+            @app.before_request
+            def start_view_counter():
+                if self._thread is None:
+                    self.start()
+
+    def hit(self, column, row_id, count=1):
+        """Count views of row_id for an integer column such as ForumPost.views (in the current app)"""
+        app = self._current_app()
+        key = self._key(column)
+        with self._lock:
+            counts = self._pending.setdefault(app, {}).setdefault(key, {})
+            counts[row_id] = counts.get(row_id, 0) + count
+            self._pending_hits += count
+            full = self._pending_hits >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self, column, row_id):
+        """Views of row_id counted by this process (in the current app) but not yet written"""
+        app = self._current_app()
+        key = self._key(column)
+        with self._lock:
+            return self._pending.get(app, {}).get(key, {}).get(row_id, 0)
+
+    def _current_app(self):
+        # Outside an app context (a plain thread, say) counts go to the first app
+        return current_app._get_current_object() if has_app_context() else self.app
+
+    def _key(self, column):
+        # Column objects overload ==, so they are keyed by name rather than used as dict keys
+        column = column.property.columns[0] if hasattr(column, 'property') else column
+        key = f"{column.table.name}.{column.name}"
+        self._columns.setdefault(key, column)
+        return key
+
+    def flush(self):
+        """Write all pending counts; returns the number of views written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_hits = 0
+
+        written = 0
+        for app, tables in pending.items():
+            for key, counts in tables.items():
+                try:
+                    self._write(app, self._columns[key], counts)
+                    written += sum(counts.values())
+                except Exception as e:
+                    logger.error(f"Flushing {len(counts)} view counts of {key} failed, will retry: {e}")
+                    self._restore(app, key, counts)
+        return written
+
+    def _write(self, app, column, counts):
+        table = column.table
+        key = table.primary_key.columns.values()[0]
+        ids = sorted(counts)
+        # A view is not an edit: keep onupdate columns such as updated_at as they are
+        unchanged = {other: other for other in table.columns if other.onupdate is not None and other is not column}
+        with app.app_context(), db.engine.begin() as connection:
+            for start in range(0, len(ids), FLUSH_CHUNK_SIZE):
+                chunk = ids[start:start + FLUSH_CHUNK_SIZE]
+                delta = case({row_id: counts[row_id] for row_id in chunk}, value=key, else_=0)
+                connection.execute(table.update().where(key.in_(chunk)).values({column: column + delta, **unchanged}))
+
+    def _restore(self, app, key, counts):
+        # Memory stays bounded by the number of distinct rows, however long the database is unavailable
+        with self._lock:
+            merged = self._pending.setdefault(app, {}).setdefault(key, {})
+            for row_id, count in counts.items():
+                merged[row_id] = merged.get(row_id, 0) + count
+                self._pending_hits += count
+
+    # Background flushing
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the flusher and write what is still pending"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"View counter flush error: {e}")
+            if self._pending_hits >= self.max_pending:
+                # Still full, so the flush failed; back off instead of retrying on every hit
+                self._stop.wait(self.interval)
+
+    def _flush_at_exit(self):
+        if self.app is None or not self._pending:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"View counter flush at exit failed: {e}")
+
+view_counter = ViewCounter()
@@ -0,0 +1,186 @@
+"""Weather enrichment for pilgrimage pages.
+
+Lookups go through a TTL cache keyed on rounded coordinates. A fresh hit
+is returned as is. A stale hit is returned immediately while a background
+thread refreshes it (stale-while-revalidate); while the provider keeps
+failing, refreshes are retried every WEATHER_ERROR_TTL seconds and the
+reading keeps its original age. Once that age reaches WEATHER_STALE_TTL
+the reading is no longer served: the lookup is handled like a cold miss,
+which waits on the provider (only for the configured connect/read
+timeouts) and returns None if it fails.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+class WeatherProvider:
+    """Source of current weather conditions for a coordinate"""
+
+    def fetch(self, lat, lon):
+        raise NotImplementedError
+
+class OpenWeatherProvider(WeatherProvider):
+    """OpenWeather current-conditions API over a pooled keep-alive session"""
+    URL = 'https://api.openweathermap.org/data/2.5/weather'
+
+    def __init__(self, api_key, connect_timeout=1.0, read_timeout=2.0, pool_size=10):
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, lat, lon):
+        response = self.session.get(
+            self.URL,
+            params={'lat': lat, 'lon': lon, 'appid': self.api_key, 'units': 'metric'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        return {
+            'temperature': data['main']['temp'],
+            'feels_like': data['main']['feels_like'],
+            'description': data['weather'][0]['description'],
+            'icon': data['weather'][0]['icon'],
+            'humidity': data['main']['humidity'],
+            'wind_speed': data['wind']['speed']
+        }
+
+class StaticWeatherProvider(WeatherProvider):
+    """Offline stand-in returning deterministic conditions, for tests and local runs"""
+
+    def fetch(self, lat, lon):
+        # Rough latitude-based temperature so different sites look different
+        temperature = round(30 - abs(lat) * 0.4, 1)
+        return {
+            'temperature': temperature,
+            'feels_like': temperature,
+            'description': 'clear sky',
+            'icon': '01d',
+            'humidity': 50,
+            'wind_speed': 3.0
+        }
+
+PROVIDERS = {
+    'openweather': OpenWeatherProvider,
+    'static': StaticWeatherProvider
+}
+
+class TTLCache:
+    """Thread-safe bounded LRU cache storing (value, stored_at, retry_at) entries"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, stored_at=None, retry_at=None):
+        with self._lock:
+            self._entries[key] = (value, stored_at if stored_at is not None else time.monotonic(), retry_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class WeatherService:
+    """Cached, non-blocking weather lookups; configure with init_app()"""
+
+    def __init__(self, app=None):
+        self.provider = None
+        self.cache = TTLCache()
+        self._executor = None
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        provider_name = config.get('WEATHER_PROVIDER', 'openweather')
+        if provider_name == 'openweather':
+            provider = OpenWeatherProvider(
+                config.get('OPENWEATHER_API_KEY'),
+                connect_timeout=config.get('WEATHER_CONNECT_TIMEOUT', 1.0),
+                read_timeout=config.get('WEATHER_READ_TIMEOUT', 2.0)
+            )
+        else:
+            provider = PROVIDERS[provider_name]()
+
+        self.provider = provider
+        self.ttl = config.get('WEATHER_CACHE_TTL', 600)
+        self.stale_ttl = config.get('WEATHER_STALE_TTL', 3600)
+        self.error_ttl = config.get('WEATHER_ERROR_TTL', 60)
+        self.precision = config.get('WEATHER_COORD_PRECISION', 2)
+        self.cache = TTLCache(config.get('WEATHER_CACHE_SIZE', 1024))
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='weather-refresh')
+        app.extensions['weather'] = self
+
+    def cache_key(self, lat, lon):
+        return (round(lat, self.precision), round(lon, self.precision))
+
+    def get(self, lat, lon):
+        """Return cached conditions for a coordinate, refreshing in the background when stale"""
+        key = self.cache_key(lat, lon)
+        entry = self.cache.get(key)
+        if entry is not None:
+            value, stored_at, retry_at = entry
+            now = time.monotonic()
+            age = now - stored_at
+            ttl = self.ttl if value is not None else self.error_ttl
+            if age < ttl:
+                return value
+            if age < self.stale_ttl:
+                if retry_at is None or now >= retry_at:
+                    self._schedule_refresh(key, value, stored_at)
+                return value
+
+        # Cold miss (or too stale to serve): one bounded synchronous fetch
+        return self._refresh(key)
+
+    def _refresh(self, key, stale_value=None, stale_stored_at=None):
+        try:
+            value = self.provider.fetch(*key)
+        except Exception as e:
+            logger.warning(f"Error fetching weather data for {key}: {e}")
+            if stale_value is not None:
+                # Keep serving the stale value with its original age, so stale_ttl still
+                # expires it, and retry once error_ttl has passed
+                self.cache.set(key, stale_value, stored_at=stale_stored_at,
+                               retry_at=time.monotonic() + self.error_ttl)
+                return stale_value
+            value = None
+        self.cache.set(key, value)
+        return value
+
+    def _schedule_refresh(self, key, stale_value, stale_stored_at):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._refresh(key, stale_value, stale_stored_at)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)